@@ -0,0 +1,59 @@
+"""Benchmark of identity checks (permission per action vs bulk check)
+
+Compares checks with new ``Permission`` for each action (as done by
+original container on each attribute access), interned permissions
+and single bulk check of all actions (e.g. for menu).
+
+Usage: ``python benchmarks/permissions.py [checks] [actions]``
+"""
+import flask_principal
+import sys
+import time
+
+from repocribro.security import Permissions
+
+
+def check_constructed(permissions, identity, names):
+    return any(
+        flask_principal.Permission(
+            *permissions.actions.x_dict.get(name, [])
+        ).allows(identity)
+        for name in names
+    )
+
+
+def check_interned(permissions, identity, names):
+    return any(getattr(permissions.actions, name).allows(identity)
+               for name in names)
+
+
+def check_bulk(permissions, identity, names):
+    return permissions.any_action(*names, identity=identity)
+
+
+def main(checks=20000, actions=10):
+    permissions = Permissions()
+    names = ['manage_action{}'.format(i) for i in range(actions)]
+    for name in names:
+        permissions.register_action(name)
+    identity = flask_principal.Identity(1)
+    for i in range(50):
+        identity.provides.add(flask_principal.ActionNeed(
+            'browse_action{}'.format(i)
+        ))
+    identity.provides.add(flask_principal.ActionNeed(names[-1]))
+    for name, check in (('constructed', check_constructed),
+                        ('interned', check_interned),
+                        ('bulk', check_bulk)):
+        assert check(permissions, identity, names)
+        start = time.perf_counter()
+        for _ in range(checks):
+            check(permissions, identity, names)
+        elapsed = time.perf_counter() - start
+        print('{:>11}: {} checks of {} actions in {:.3f}s '
+              '({:.0f} checks/s)'.format(name, checks, actions, elapsed,
+                                         checks / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,73 @@
+"""Benchmark of resolving privileges of identity (per request)
+
+Compares original resolution (``fnmatch`` of every pattern for every
+action and role), compiled privileges of roles and memoized privileges
+of the whole set of roles.
+
+Usage: ``python benchmarks/privileges.py [requests] [actions]``
+"""
+import fnmatch
+import sys
+import time
+
+from repocribro.models import Role
+from repocribro.security import Permissions
+
+
+def permits_fnmatch(role, privilege):
+    privileges = role.privileges.split(':')
+    if privilege in privileges:
+        return True
+    for priv in privileges:
+        if fnmatch.fnmatch(privilege, priv):
+            return True
+    return False
+
+
+def resolve_fnmatch(permissions, roles):
+    privileges = set()
+    for priv in permissions.all_actions:
+        for role in roles:
+            if permits_fnmatch(role, priv):
+                privileges.add(priv)
+                break
+    return privileges
+
+
+def resolve_compiled(permissions, roles):
+    return {action for action in permissions.all_actions
+            if any(role.permits(action) for role in roles)}
+
+
+def resolve_memoized(permissions, roles):
+    return permissions.resolve_privileges(roles)
+
+
+def main(requests=2000, actions=100):
+    permissions = Permissions()
+    for i in range(actions):
+        permissions.register_action('{}_action{}'.format(
+            ('browse', 'manage', 'search', 'admin')[i % 4], i
+        ))
+    roles = [
+        Role('user', 'search*:logout:manage*:browse*', ''),
+        Role('reviewer', 'browse_?ction1*:admin_action3', ''),
+        Role('anonymous', 'search*:browse*:login', ''),
+    ]
+    expected = resolve_fnmatch(permissions, roles)
+    for name, resolve in (('fnmatch', resolve_fnmatch),
+                          ('compiled', resolve_compiled),
+                          ('memoized', resolve_memoized)):
+        assert resolve(permissions, roles) == expected
+        start = time.perf_counter()
+        for _ in range(requests):
+            resolve(permissions, roles)
+        elapsed = time.perf_counter() - start
+        print('{:>8}: {} requests, {} actions, {} roles in {:.3f}s '
+              '({:.1f} us/request)'.format(name, requests, actions,
+                                           len(roles), elapsed,
+                                           elapsed / requests * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
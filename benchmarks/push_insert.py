@@ -0,0 +1,76 @@
+"""Benchmark of storing pushes with commits (ORM vs bulk insert)
+
+Usage: ``python benchmarks/push_insert.py [pushes] [commits]``
+"""
+import flask
+import sys
+import time
+
+from repocribro.database import db
+from repocribro.models import Push, Repository, User
+
+
+def make_push(push_id, commits):
+    return {
+        'push_id': push_id,
+        'ref': 'refs/heads/master',
+        'head': '{:040x}'.format(push_id),
+        'before': '{:040x}'.format(push_id - 1),
+        'commits': [{
+            'sha': '{:08x}{:032x}'.format(push_id, i),
+            'message': 'Commit #{} of push #{}'.format(i, push_id),
+            'author': {'name': 'Octo Cat', 'email': 'octocat@example.com'},
+            'distinct': True,
+        } for i in range(commits)]
+    }
+
+
+def store_orm(session, push_dict, sender, repo):
+    push = Push.create_from_dict(push_dict, sender, repo)
+    session.add(push)
+    for commit in push.commits:
+        session.add(commit)
+
+
+def store_bulk(session, push_dict, sender, repo):
+    Push.bulk_create_from_dict(session, push_dict, sender, repo)
+
+
+def bench(store, pushes, commits):
+    app = flask.Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        owner = User(1, 'octocat', 'octocat@example.com', '', '', '',
+                     '', '', '', False, None)
+        repo = Repository(1, None, 'octocat/bench', 'bench', 'Python', '',
+                          '', '', False, None, owner,
+                          Repository.VISIBILITY_PUBLIC)
+        db.session.add(repo)
+        db.session.commit()
+        sender = {'login': 'octocat', 'id': 1}
+        data = [make_push(i + 1, commits) for i in range(pushes)]
+
+        start = time.perf_counter()
+        for push_dict in data:
+            store(db.session, push_dict, sender, repo)
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+        db.session.remove()
+        db.drop_all()
+    return elapsed
+
+
+def main(pushes=50, commits=200):
+    total = pushes * commits
+    for name, store in (('orm', store_orm), ('bulk', store_bulk)):
+        elapsed = bench(store, pushes, commits)
+        print('{:>4}: {} pushes, {} commits in {:.3f}s '
+              '({:.0f} commits/s)'.format(name, pushes, total, elapsed,
+                                          total / elapsed))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
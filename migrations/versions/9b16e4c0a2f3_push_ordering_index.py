@@ -0,0 +1,26 @@
+"""Push ordering index with ID tiebreaker
+
+Revision ID: 9b16e4c0a2f3
+Revises: d3a8f61b5e07
+Create Date: 2026-10-18 14:20:13.402167
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b16e4c0a2f3'
+down_revision = 'd3a8f61b5e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_Push_repository_id_timestamp', table_name='Push')
+    op.create_index('ix_Push_repository_id_timestamp', 'Push', ['repository_id', sa.text('timestamp DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Push_repository_id_timestamp', table_name='Push')
+    op.create_index('ix_Push_repository_id_timestamp', 'Push', ['repository_id', sa.text('timestamp DESC')], unique=False)
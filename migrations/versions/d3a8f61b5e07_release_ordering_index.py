@@ -0,0 +1,26 @@
+"""Index of release ordering (drafts ordered by creation)
+
+Revision ID: d3a8f61b5e07
+Revises: 5642c24545a7
+Create Date: 2026-10-18 14:02:51.730418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a8f61b5e07'
+down_revision = '5642c24545a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_Release_repository_id_published_at', table_name='Release')
+    op.create_index('ix_Release_repository_id_published_key', 'Release', ['repository_id', sa.text('coalesce(published_at, created_at) DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Release_repository_id_published_key', table_name='Release')
+    op.create_index('ix_Release_repository_id_published_at', 'Release', ['repository_id', sa.text('published_at DESC')], unique=False)
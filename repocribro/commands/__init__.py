@@ -2,5 +2,10 @@ from .assign_role import assign_role
 from .db_create import db_create
 from .repocheck import repocheck
 from .check_config import check_config
+from .webhook_worker import webhook_worker
+from .reindex import reindex
+from .hook_profiles import hook_profiles
+from .sync_daemon import sync_daemon
 
-__all__ = ['assign_role', 'db_create', 'repocheck', 'check_config']
+__all__ = ['assign_role', 'db_create', 'repocheck', 'check_config',
+           'webhook_worker', 'reindex', 'hook_profiles', 'sync_daemon']
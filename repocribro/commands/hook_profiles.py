@@ -0,0 +1,110 @@
+import click
+import flask
+import flask.cli
+import re
+import requests
+
+#: Regex of single sample in Prometheus text format
+SAMPLE_RE = re.compile(r'^(?P<name>\w+)\{(?P<labels>.*)\} (?P<value>\S+)$')
+#: Regex of single label of sample
+LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+#: Regex of escaped character in label value
+UNESCAPE_RE = re.compile(r'\\(.)')
+
+
+def _parse_hook_profiles(text, prefix='repocribro'):
+    """Read hook profiles from metrics in Prometheus text format
+
+    :param text: Metrics exported by ``/metrics`` of running app
+    :type text: str
+    :param prefix: Prefix of metric names
+    :type prefix: str
+    :return: Extension name, hook name, calls, total and p95 seconds
+    :rtype: list of tuple
+    """
+    fields = {
+        '{}_hook_profile_calls_total'.format(prefix): 0,
+        '{}_hook_profile_seconds_total'.format(prefix): 1,
+        '{}_hook_profile_p95_seconds'.format(prefix): 2,
+    }
+    profiles = {}
+    for line in text.splitlines():
+        match = SAMPLE_RE.match(line)
+        if match is None or match.group('name') not in fields:
+            continue
+        labels = {k: UNESCAPE_RE.sub(r'\1', v)
+                  for k, v in LABEL_RE.findall(match.group('labels'))}
+        key = (labels.get('extension', ''), labels.get('hook', ''))
+        values = profiles.setdefault(key, [0, 0.0, 0.0])
+        values[fields[match.group('name')]] = float(match.group('value'))
+    rows = [(ext_name, hook_name, int(count), total, p95)
+            for (ext_name, hook_name), (count, total, p95)
+            in profiles.items()]
+    return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+def _fetch_hook_profiles(url, token=None):
+    """Get hook profiles of running web application
+
+    :param url: URL of ``/metrics`` of the running app
+    :type url: str
+    :param token: Bearer token for metrics (``METRICS_TOKEN``)
+    :type token: str
+    :return: Extension name, hook name, calls, total and p95 seconds
+    :rtype: list of tuple
+    :raises SystemExit: If metrics can not be retrieved
+    """
+    headers = {}
+    if token:
+        headers['Authorization'] = 'Bearer ' + token
+    try:
+        response = requests.get(url, headers=headers, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print('Could not retrieve metrics from {}: {}'.format(url, e))
+        exit(1)
+    return _parse_hook_profiles(response.text)
+
+
+def _hook_profiles(limit=None, url=None, token=None):
+    if url is None:
+        ext_master = flask.current_app.container.get('ext_master')
+        profiles = ext_master.hook_profiles()
+    else:
+        profiles = _fetch_hook_profiles(url, token)
+    if limit is not None:
+        profiles = profiles[:limit]
+    print('{:<20} {:<36} {:>8} {:>12} {:>10}'.format(
+        'Extension', 'Hook', 'Calls', 'Total [ms]', 'p95 [ms]'
+    ))
+    for ext_name, hook_name, count, total, p95 in profiles:
+        print('{:<20} {:<36} {:>8} {:>12.2f} {:>10.2f}'.format(
+            ext_name, hook_name, count, total * 1000, p95 * 1000
+        ))
+
+
+@click.command()
+@click.option('-n', '--limit', type=int, default=None,
+              help='Number of the slowest hooks to show (default: all)')
+@click.option('-u', '--url', default=None,
+              help='URL of /metrics of running web application')
+@click.option('-t', '--token', default=None,
+              envvar='REPOCRIBRO_METRICS_TOKEN',
+              help='Bearer token for metrics (METRICS_TOKEN)')
+@flask.cli.with_appcontext
+def hook_profiles(limit, url, token):
+    """Dump timing of extension hooks
+
+    Shows calls, cumulative and 95th percentile time of hooks per
+    extension of the running web application (exported at ``/metrics``
+    given by ``--url``), without URL hooks of this process (i.e. hooks
+    of app initialization) are shown.
+
+    :param limit: Number of the slowest hooks to show
+    :type limit: int
+    :param url: URL of ``/metrics`` of running web application
+    :type url: str
+    :param token: Bearer token for metrics
+    :type token: str
+    """
+    _hook_profiles(limit, url, token)
@@ -0,0 +1,29 @@
+import click
+import flask
+import flask.cli
+
+
+def _reindex(model_name=None):
+    from ..models import searchable_models
+    db = flask.current_app.container.get('db')
+    backend = flask.current_app.container.get('search_backend')
+    models = [model for model in searchable_models
+              if model_name is None or model.__name__ == model_name]
+    if len(models) == 0:
+        print('Searchable model not found!')
+        exit(1)
+    print('Rebuilding search index ({})'.format(backend.NAME))
+    for model in models:
+        connection = db.session.connection(clause=model.__table__)
+        count = backend.reindex(connection, model)
+        db.session.commit()
+        print('Indexed {} rows of {}'.format(count, model.__name__))
+
+
+@click.command()
+@click.option('-m', '--model', 'model_name',
+              help='Name of model to be reindexed (default: all)')
+@flask.cli.with_appcontext
+def reindex(model_name):
+    """Rebuild fulltext search index"""
+    _reindex(model_name)
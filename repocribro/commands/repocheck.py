@@ -1,11 +1,60 @@
 import click
+import collections
+import concurrent.futures
+import datetime
 import flask
 import flask.cli
 import iso8601
 import pytz
+import sqlalchemy
+import threading
+import time
 from werkzeug.exceptions import HTTPException
 
 
+#: Snapshot of repository sync state used for fetching (outside DB)
+SyncCursor = collections.namedtuple('SyncCursor', [
+    'event_id', 'event_at', 'since', 'etag', 'metadata_fresh'
+])
+
+
+class RepocheckResult:
+    """Data fetched from GitHub for single repository check
+
+    It is filled by (possibly concurrent) fetching and then consumed
+    by single writer which stores the events to DB.
+
+    :ivar full_name: Full name of the checked repository
+    :ivar gh_repo: Response with GitHub repository data (None if skipped)
+    :ivar events: New events (newest first)
+    :ivar events_ok: If all requested pages of events were received
+    :ivar events_etag: ETag of the first page of events
+    :ivar api_calls: Number of GitHub API requests performed
+    :ivar not_modified: Number of responses served from cache (304)
+    :ivar elapsed: Time spent by fetching (in seconds)
+    """
+
+    def __init__(self, full_name):
+        self.full_name = full_name
+        self.gh_repo = None
+        self.events = []
+        self.events_ok = True
+        self.events_etag = None
+        self.api_calls = 0
+        self.not_modified = 0
+        self.elapsed = 0.0
+
+    def count(self, response):
+        """Count GitHub API request for its response
+
+        :param response: Response from GitHub API
+        :type response: ``repocribro.github.GitHubResponse``
+        """
+        self.api_calls += 1
+        if getattr(response, 'from_cache', False):
+            self.not_modified += 1
+
+
 class RepocheckCommand:
 
     event2webhook = {
@@ -14,38 +63,33 @@ class RepocheckCommand:
         'RepositoryEvent': 'repository',
     }
 
-    def run(self, full_name=None):
+    def run(self, full_name=None, workers=1):
         """Run the repocheck command to check repo(s) new events
 
         Obviously this procedure can check events only on public
         repositories. If name of repository is not specified, then
         procedure will be called on all registered public repositories
-        in DB.
+        in DB. Each repository is checked from its sync state, only
+        events newer than the last processed one are fetched. With
+        more workers, data are fetched from GitHub
+        concurrently but all the DB writes are done by the calling
+        thread.
 
         :param full_name: Name of repository to be checked (if None -> all)
         :type full_name: str
+        :param workers: Number of threads fetching from GitHub
+        :type workers: int
         :raises SystemExit: If repository with given full_name does not exist
         """
         from ..models import Repository
-        self.db = flask.current_app.container.get('db')
-        self.gh_api = flask.current_app.container.get('gh_api')
-
-        ext_master = flask.current_app.container.get('ext_master')
-
-        hooks_list = ext_master.call('get_gh_event_processors', default={})
-        self.hooks = {}
-        for ext_hooks in hooks_list:
-            for hook_event in ext_hooks:
-                if hook_event not in self.hooks:
-                    self.hooks[hook_event] = []
-                self.hooks[hook_event].extend(ext_hooks[hook_event])
+        self._setup()
 
         repos = []
         if full_name is None:
             print('Performing repository check on all public repositories')
-            repos = self.db.session.query(Repository).filter_by(
-                private=False
-            ).all()
+            repos = self.db.session.query(Repository).options(
+                sqlalchemy.orm.joinedload(Repository.sync_state)
+            ).filter_by(private=False).all()
         else:
             print('Performing repository check on repository '+full_name)
             repo = self.db.session.query(Repository).filter_by(
@@ -55,8 +99,48 @@ class RepocheckCommand:
                 print('Repository not found!')
                 exit(1)
             repos.append(repo)
-        for repo in repos:
-            self._do_check(repo)
+
+        start = time.perf_counter()
+        if workers > 1:
+            self._check_concurrent(repos, workers)
+        else:
+            for repo in repos:
+                self._do_check(repo)
+        self._print_summary(len(repos), time.perf_counter() - start)
+
+    def _setup(self):
+        """Get services used for checking from the app container"""
+        self.container = flask.current_app.container
+        self.db = self.container.get('db')
+        self.gh_api = self.container.get('gh_api')
+        self.metadata_ttl = self.container.get('config').getint(
+            'github', 'repocheck_metadata_ttl', fallback=3600
+        )
+        self.local = threading.local()
+        self.stats = RepocheckResult(None)
+        self.hooks = self.container.get('gh_events').processors('event')
+
+    def _check_concurrent(self, repos, workers):
+        """Check repositories with fetching on pool of threads
+
+        :param repos: Repositories to be checked
+        :type repos: list of ``repocribro.models.Repository``
+        :param workers: Number of threads fetching from GitHub
+        :type workers: int
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(self._fetch, repo.full_name,
+                            self._cursor(repo)): repo
+            for repo in repos
+        }
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                self._store(futures[future], future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
 
     def _do_check(self, repo):
         """Perform single repository check for new events
@@ -65,42 +149,182 @@ class RepocheckCommand:
         :type repo: ``repocribro.models.Repository``
 
         :raises SystemExit: if GitHub API request fails
+        """
+        self._store(repo, self._fetch(repo.full_name, self._cursor(repo)))
+
+    def _cursor(self, repo):
+        """Make snapshot of sync state of the repository
+
+        Events older than ``last_event`` are skipped only if it is newer
+        than the cursor (i.e. events were received via webhook since).
+
+        :param repo: Repository to be checked
+        :type repo: ``repocribro.models.Repository``
+        :return: Snapshot of the sync state
+        :rtype: ``repocribro.commands.repocheck.SyncCursor``
+        """
+        state = repo.sync_state
+        if state is None:
+            return SyncCursor(None, None, repo.last_event, None, False)
+        since = repo.last_event
+        if state.event_at is not None and since is not None and \
+                since <= state.event_at:
+            since = None
+        return SyncCursor(state.event_id, state.event_at, since,
+                          state.events_etag,
+                          state.metadata_fresh(self.metadata_ttl))
+
+    def _get_gh_api(self):
+        """Get GitHub API client for current thread
 
-        .. todo:: handle pagination of GitHub events
+        :return: GitHub API client
+        :rtype: ``repocribro.github.GitHubAPI``
         """
-        gh_repo = self.gh_api.get('/repos/{}'.format(repo.full_name))
-        if not gh_repo.is_ok:
-            print('GitHub doesn\'t know about that repo: {} ({})'.format(
-                gh_repo.data['message'],
-                'Maybe it is private...'
-            ))
-            exit(3)
-        gh_events = self.gh_api.get('/repos/{}/events'.format(repo.full_name))
-        if not gh_events.is_ok:
+        if threading.current_thread() is threading.main_thread():
+            return self.gh_api
+        if not hasattr(self.local, 'gh_api'):
+            self.local.gh_api = self.container.get('gh_api')
+        return self.local.gh_api
+
+    def _fetch(self, full_name, cursor):
+        """Fetch repository and its new events from GitHub
+
+        Repository itself is verified only if it was not verified
+        recently. First page of events is requested conditionally with
+        ETag of the feed and pages of events are requested (newest
+        first) only until the cursor is reached. It does not touch DB
+        so it can be run on worker thread.
+
+        :param full_name: Full name of repository to be checked
+        :type full_name: str
+        :param cursor: Snapshot of sync state of the repository
+        :type cursor: ``repocribro.commands.repocheck.SyncCursor``
+        :return: Fetched data from GitHub
+        :rtype: ``repocribro.commands.repocheck.RepocheckResult``
+        """
+        start = time.perf_counter()
+        gh_api = self._get_gh_api()
+        result = RepocheckResult(full_name)
+        if not cursor.metadata_fresh:
+            result.gh_repo = gh_api.get('/repos/{}'.format(full_name))
+            result.count(result.gh_repo)
+        if result.gh_repo is None or result.gh_repo.is_ok:
+            pages = gh_api.iter_pages('/repos/{}/events'.format(full_name),
+                                      etag=cursor.etag)
+            for gh_events in pages:
+                result.count(gh_events)
+                if gh_events.not_modified:
+                    break
+                if not gh_events.is_ok:
+                    result.events_ok = False
+                    break
+                if result.events_etag is None:
+                    result.events_etag = \
+                        gh_events.response.headers.get('ETag', '')
+                if not self._collect_events(result, gh_events.data, cursor):
+                    break
+            pages.close()
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _utc(value):
+        return None if value is None else pytz.utc.localize(value)
+
+    def _collect_events(self, result, events, cursor):
+        """Collect new events from page of events (newest first)
+
+        Collecting stops at the event of cursor or, if it is not in the
+        feed anymore, at the first older event.
+
+        :param result: Result where new events are collected
+        :type result: ``repocribro.commands.repocheck.RepocheckResult``
+        :param events: GitHub events data
+        :type events: list of dict
+        :param cursor: Snapshot of sync state of the repository
+        :type cursor: ``repocribro.commands.repocheck.SyncCursor``
+        :return: If all events were new (next page should be checked)
+        :rtype: bool
+        """
+        event_at = self._utc(cursor.event_at)
+        since = self._utc(cursor.since)
+        for event in events:
+            created_at = iso8601.parse_date(event['created_at'])
+            if str(event['id']) == cursor.event_id or \
+                    (event_at is not None and created_at < event_at) or \
+                    (since is not None and created_at <= since):
+                return False
+            result.events.append(event)
+        return True
+
+    def _store(self, repo, result):
+        """Process fetched events of the repository and store them
+
+        :param repo: Checked repository
+        :type repo: ``repocribro.models.Repository``
+        :param result: Data fetched from GitHub
+        :type result: ``repocribro.commands.repocheck.RepocheckResult``
+        :return: Number of new events (None if they were not received)
+        :rtype: int
+
+        :raises SystemExit: if GitHub API request fails
+        """
+        from ..models import RepositorySyncState
+        self.stats.api_calls += result.api_calls
+        self.stats.not_modified += result.not_modified
+        if result.gh_repo is not None and not result.gh_repo.is_ok:
+            self._repo_missing(repo, result)
+            return None
+        if not result.events_ok:
             print('GitHub doesn\'t returned events for: {}'.format(
                 repo.full_name
             ))
-            return
-        for event in gh_events.data:
-            new = self._process_event(repo, event)
-            if not new:
-                break
-        repo.events_updated()
+            return None
+        state = RepositorySyncState.of(self.db.session, repo)
+        if result.gh_repo is not None:
+            state.metadata_at = datetime.datetime.utcnow()
+        if result.events:
+            for event in reversed(result.events):
+                self._process_event(repo, event)
+            newest = result.events[0]
+            newest_at = iso8601.parse_date(newest['created_at']).astimezone(
+                pytz.utc
+            ).replace(tzinfo=None)
+            state.advance(newest['id'], newest_at, result.events_etag)
+            repo.events_updated(newest_at)
+        else:
+            state.advance(etag=result.events_etag)
         self.db.session.commit()
+        print('Checked {} in {:.3f}s ({} new events, {} API calls)'.format(
+            repo.full_name, result.elapsed,
+            len(result.events), result.api_calls
+        ))
+        return len(result.events)
+
+    def _repo_missing(self, repo, result):
+        """Handle repository which is not available at GitHub
+
+        :param repo: Checked repository
+        :type repo: ``repocribro.models.Repository``
+        :param result: Data fetched from GitHub
+        :type result: ``repocribro.commands.repocheck.RepocheckResult``
+
+        :raises SystemExit: always (check cannot continue)
+        """
+        print('GitHub doesn\'t know about that repo: {} ({})'.format(
+            result.gh_repo.data['message'],
+            'Maybe it is private...'
+        ))
+        exit(3)
 
     def _process_event(self, repo, event):
-        """Process potentially new event for repository
+        """Process new event for repository
 
         :param repo: Repository related to event
         :type repo: ``repocribro.models.Repository``
         :param event: GitHub event data
         :type event: dict
-        :return: If the event was new or already registered before
-        :rtype: bool
         """
-        last = pytz.utc.localize(repo.last_event)
-        if iso8601.parse_date(event['created_at']) <= last:
-            return False
         hook_type = self.event2webhook.get(event['type'], 'uknown')
         for event_processor in self.hooks.get(hook_type, []):
             try:
@@ -112,17 +336,42 @@ class RepocheckCommand:
                 ))
             except HTTPException:
                 print('Error while processing #{}'.format(event['id']))
-        return True
+
+    def _print_summary(self, repos_count, elapsed):
+        """Print throughput summary of the check
+
+        :param repos_count: Number of checked repositories
+        :type repos_count: int
+        :param elapsed: Duration of the check (in seconds)
+        :type elapsed: float
+        """
+        rate = repos_count / elapsed if elapsed > 0 else 0.0
+        print('Checked {} repositories in {:.3f}s ({:.2f} repos/s), '
+              '{} API calls, {} not modified (304)'.format(
+                  repos_count, elapsed, rate,
+                  self.stats.api_calls, self.stats.not_modified
+              ))
+        rate_limiter = getattr(self.gh_api, 'rate_limiter', None)
+        if rate_limiter is None:
+            return
+        for scope, state in rate_limiter.state().items():
+            print('GitHub rate limit [{}]: {}/{} remaining, reset at {}, '
+                  '{} queued'.format(
+                      scope, state['remaining'], state['limit'],
+                      state['reset'], state['queued']
+                  ))
 
 
-def _repocheck(full_name=None):
+def _repocheck(full_name=None, workers=1):
     cmd = RepocheckCommand()
-    cmd.run(full_name)
+    cmd.run(full_name, workers)
 
 
 @click.command()
 @click.option('-n', '--name', 'full_name')
+@click.option('-w', '--workers', default=1, type=int,
+              help='Number of threads fetching from GitHub')
 @flask.cli.with_appcontext
-def repocheck(full_name):
+def repocheck(full_name, workers):
     """Check procedure of repository events"""
-    _repocheck(full_name)
+    _repocheck(full_name, workers)
@@ -0,0 +1,360 @@
+import calendar
+import click
+import flask
+import flask.cli
+import heapq
+import signal
+import sqlalchemy
+import threading
+import time
+
+from .repocheck import RepocheckCommand
+
+
+class SyncSchedule:
+    """Priority queue of repositories ordered by time of next check
+
+    Interval of each repository adapts to its activity, after check
+    with new events it is reset to ``min_interval``, otherwise (or
+    when check failed) it is multiplied by ``backoff`` up to
+    ``max_interval``. Removed entries are left in the heap and skipped
+    when popped.
+
+    :ivar entries: Due time (None when being checked) and interval by ID
+    """
+
+    def __init__(self, min_interval=300.0, max_interval=21600.0,
+                 backoff=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.heap = []
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, repo_id):
+        return repo_id in self.entries
+
+    def add(self, repo_id, due, interval=None):
+        """Schedule check of repository
+
+        :param repo_id: ID of repository
+        :type repo_id: int
+        :param due: Time of the check (timestamp)
+        :type due: float
+        :param interval: Actual interval (``min_interval`` if None)
+        :type interval: float
+        """
+        if interval is None:
+            interval = self.min_interval
+        self.entries[repo_id] = [due, interval]
+        heapq.heappush(self.heap, (due, repo_id))
+
+    def remove(self, repo_id):
+        """Stop checking the repository
+
+        :param repo_id: ID of repository
+        :type repo_id: int
+        """
+        self.entries.pop(repo_id, None)
+
+    def pop_due(self, now, limit=None):
+        """Take repositories which should be checked now
+
+        :param now: Actual time (timestamp)
+        :type now: float
+        :param limit: Maximal number of taken repositories
+        :type limit: int
+        :return: IDs of repositories (the most overdue first)
+        :rtype: list of int
+        """
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            if limit is not None and len(due) >= limit:
+                break
+            time_due, repo_id = heapq.heappop(self.heap)
+            entry = self.entries.get(repo_id, None)
+            if entry is None or entry[0] != time_due:
+                continue  # removed or rescheduled
+            entry[0] = None
+            due.append(repo_id)
+        return due
+
+    def next_due(self):
+        """Time of the next scheduled check
+
+        :return: Timestamp (None if nothing is scheduled)
+        :rtype: float
+        """
+        while self.heap:
+            time_due, repo_id = self.heap[0]
+            entry = self.entries.get(repo_id, None)
+            if entry is not None and entry[0] == time_due:
+                return time_due
+            heapq.heappop(self.heap)
+        return None
+
+    def reschedule(self, repo_id, now, new_events):
+        """Schedule next check according to result of the last one
+
+        :param repo_id: ID of checked repository
+        :type repo_id: int
+        :param now: Actual time (timestamp)
+        :type now: float
+        :param new_events: Number of new events (None if check failed)
+        :type new_events: int
+        :return: Interval until the next check (None if not taken)
+        :rtype: float
+        """
+        entry = self.entries.get(repo_id, None)
+        if entry is None or entry[0] is not None:
+            return None
+        if new_events:
+            interval = self.min_interval
+        else:
+            interval = min(self.max_interval, entry[1] * self.backoff)
+        self.add(repo_id, now + interval, interval)
+        return interval
+
+
+class SyncDaemonCommand(RepocheckCommand):
+    """Long-running repocheck with adaptive schedule of repositories"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.stopping = threading.Event()
+
+    def run(self, min_interval=300.0, max_interval=21600.0, workers=1,
+            reserve=0.5, refresh=300.0, once=False):
+        """Check public repositories for new events continuously
+
+        Repositories are checked when they are due (according to the
+        last sync), active ones more often than dormant. When rate
+        limit quota of GitHub drops to ``reserve``, checks are postponed
+        until reset. List of repositories is reloaded from DB after
+        ``refresh`` seconds. It stops after finishing current checks
+        on SIGTERM (or SIGINT), checks waiting for rate limit are
+        interrupted.
+
+        :param min_interval: Seconds between checks of active repository
+        :type min_interval: float
+        :param max_interval: Seconds between checks of dormant repository
+        :type max_interval: float
+        :param workers: Number of threads fetching from GitHub
+        :type workers: int
+        :param reserve: Fraction of rate limit quota left for others
+        :type reserve: float
+        :param refresh: Seconds between reloads of repositories
+        :type refresh: float
+        :param once: Stop when no repository is due
+        :type once: bool
+        """
+        self._setup()
+        self.schedule = SyncSchedule(min_interval, max_interval)
+        self.checks = 0
+        self.new_events = 0
+        handlers = self._install_signals()
+        rate_limiter = getattr(self.gh_api, 'rate_limiter', None)
+        if rate_limiter is not None:
+            limiter_sleep = rate_limiter.sleep
+            rate_limiter.sleep = self._sleep
+        print('Sync daemon started (intervals {:.0f}-{:.0f}s)'.format(
+            min_interval, max_interval
+        ))
+        try:
+            self._loop(workers, reserve, refresh, once)
+        finally:
+            self._restore_signals(handlers)
+            if rate_limiter is not None:
+                rate_limiter.sleep = limiter_sleep
+        print('Sync daemon stopped after {} checks ({} new events, '
+              '{} API calls, {} not modified)'.format(
+                  self.checks, self.new_events,
+                  self.stats.api_calls, self.stats.not_modified
+              ))
+
+    def _loop(self, workers, reserve, refresh, once):
+        """Main loop of the daemon (until stopped)
+
+        :param workers: Number of threads fetching from GitHub
+        :type workers: int
+        :param reserve: Fraction of rate limit quota left for others
+        :type reserve: float
+        :param refresh: Seconds between reloads of repositories
+        :type refresh: float
+        :param once: Stop when no repository is due
+        :type once: bool
+        """
+        refresh_at = 0.0
+        while not self.stopping.is_set():
+            now = self.clock()
+            if now >= refresh_at:
+                self._refresh(now)
+                refresh_at = now + refresh
+            delay = self.gh_api.rate_budget_delay(reserve)
+            if delay > 0:
+                print('GitHub rate limit budget spent, waiting '
+                      '{:.0f}s'.format(delay))
+                self.stopping.wait(delay)
+                continue
+            due = self.schedule.pop_due(now, max(workers, 1))
+            if len(due) > 0:
+                self._check(due, workers)
+                continue
+            if once:
+                break
+            next_due = self.schedule.next_due()
+            wait = refresh_at - now
+            if next_due is not None:
+                wait = min(wait, next_due - now)
+            self.stopping.wait(max(wait, 0.0))
+
+    def _refresh(self, now):
+        """Synchronize schedule with public repositories in DB
+
+        New repositories are due after interval since their last sync
+        (immediately if never synced).
+
+        :param now: Actual time (timestamp)
+        :type now: float
+        """
+        from ..models import Repository, RepositorySyncState
+        rows = self.db.session.query(
+            Repository.id, RepositorySyncState.synced_at
+        ).outerjoin(RepositorySyncState).filter(
+            Repository.private == False  # noqa: E712
+        ).all()
+        self.db.session.commit()
+        ids = set()
+        for repo_id, synced_at in rows:
+            ids.add(repo_id)
+            if repo_id in self.schedule:
+                continue
+            due = now
+            if synced_at is not None:
+                due = calendar.timegm(synced_at.utctimetuple()) + \
+                    self.schedule.min_interval
+            self.schedule.add(repo_id, due)
+        for repo_id in list(self.schedule.entries):
+            if repo_id not in ids:
+                self.schedule.remove(repo_id)
+
+    def _check(self, repo_ids, workers):
+        """Check due repositories and schedule their next checks
+
+        Errors are reported and the repositories are backed off, so
+        single broken check does not stop the daemon.
+
+        :param repo_ids: IDs of due repositories
+        :type repo_ids: list of int
+        :param workers: Number of threads fetching from GitHub
+        :type workers: int
+        """
+        from ..models import Repository
+        repos = self.db.session.query(Repository).options(
+            sqlalchemy.orm.joinedload(Repository.sync_state)
+        ).filter(Repository.id.in_(repo_ids)).all()
+        self.pending = set(repo_ids)
+        for repo_id in self.pending - set(repo.id for repo in repos):
+            self.schedule.remove(repo_id)
+        try:
+            if workers > 1 and len(repos) > 1:
+                self._check_concurrent(repos, workers)
+            else:
+                for repo in repos:
+                    self._do_check(repo)
+        except Exception as e:
+            self.db.session.rollback()
+            print('Error while checking repositories: {}'.format(e))
+        for repo_id in self.pending:
+            self.schedule.reschedule(repo_id, self.clock(), None)
+
+    def _store(self, repo, result):
+        """Store fetched events and schedule next check of repository
+
+        :param repo: Checked repository
+        :type repo: ``repocribro.models.Repository``
+        :param result: Data fetched from GitHub
+        :type result: ``repocribro.commands.repocheck.RepocheckResult``
+        :return: Number of new events (None if they were not received)
+        :rtype: int
+        """
+        new_events = super()._store(repo, result)
+        self.checks += 1
+        self.new_events += new_events or 0
+        self.pending.discard(repo.id)
+        self.schedule.reschedule(repo.id, self.clock(), new_events)
+        return new_events
+
+    def _repo_missing(self, repo, result):
+        """Report repository not available at GitHub (and continue)
+
+        :param repo: Checked repository
+        :type repo: ``repocribro.models.Repository``
+        :param result: Data fetched from GitHub
+        :type result: ``repocribro.commands.repocheck.RepocheckResult``
+        """
+        print('GitHub doesn\'t know about repo {}: {}'.format(
+            repo.full_name, result.gh_repo.data.get('message', '')
+        ))
+
+    def _sleep(self, delay):
+        """Sleep of rate limiter interrupted when the daemon is stopping
+
+        :param delay: Seconds to sleep
+        :type delay: float
+        :raises InterruptedError: If daemon was stopped while sleeping
+        """
+        if self.stopping.wait(delay):
+            raise InterruptedError('Sync daemon is stopping')
+
+    def stop(self, *args):
+        """Stop the daemon after finishing actual checks"""
+        if not self.stopping.is_set():
+            print('Stopping sync daemon...')
+        self.stopping.set()
+
+    def _install_signals(self):
+        """Stop gracefully on SIGTERM and SIGINT (main thread only)
+
+        :return: Original handlers of signals
+        :rtype: dict
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+        handlers = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            handlers[signum] = signal.signal(signum, self.stop)
+        return handlers
+
+    @staticmethod
+    def _restore_signals(handlers):
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+
+def _sync_daemon(min_interval=300.0, max_interval=21600.0, workers=1,
+                 reserve=0.5, refresh=300.0, once=False):
+    cmd = SyncDaemonCommand()
+    cmd.run(min_interval, max_interval, workers, reserve, refresh, once)
+
+
+@click.command()
+@click.option('--min-interval', default=300.0, type=float,
+              help='Seconds between checks of active repository')
+@click.option('--max-interval', default=21600.0, type=float,
+              help='Seconds between checks of dormant repository')
+@click.option('-w', '--workers', default=1, type=int,
+              help='Number of threads fetching from GitHub')
+@click.option('-r', '--reserve', default=0.5, type=float,
+              help='Fraction of GitHub rate limit left for web app')
+@click.option('--refresh', default=300.0, type=float,
+              help='Seconds between reloads of repositories from DB')
+@click.option('--once', is_flag=True, default=False,
+              help='Stop when no repository is due')
+@flask.cli.with_appcontext
+def sync_daemon(min_interval, max_interval, workers, reserve, refresh, once):
+    """Continuously check repositories for new events"""
+    _sync_daemon(min_interval, max_interval, workers, reserve, refresh, once)
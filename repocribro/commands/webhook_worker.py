@@ -0,0 +1,133 @@
+import click
+import flask
+import flask.cli
+import json
+import time
+
+
+class WebhookWorkerCommand:
+    """Worker draining the queue of webhook deliveries in batches"""
+
+    def run(self, batch_size=100, interval=1.0, once=False):
+        """Process queued webhook deliveries
+
+        Each batch is committed at once, if that fails, deliveries
+        of the batch are processed and committed one by one so the
+        broken delivery does not block the others. Only processed
+        deliveries are acknowledged, failed ones stay in the queue
+        until they are dead-lettered.
+
+        :param batch_size: Maximal number of deliveries in one batch
+        :type batch_size: int
+        :param interval: Seconds to wait when the queue is empty
+        :type interval: float
+        :param once: Stop when the queue is empty
+        :type once: bool
+        :raises SystemExit: If webhook queue is not configured
+        """
+        self.db = flask.current_app.container.get('db')
+        self.config = flask.current_app.container.get('config')
+        self.queue = flask.current_app.container.get('webhook_queue')
+        gh_events = flask.current_app.container.get('gh_events')
+        if self.queue is None:
+            print('Webhook queue is not configured!')
+            exit(1)
+        self.hooks = gh_events.processors('webhook')
+
+        while True:
+            batch = self.queue.peek(batch_size)
+            if len(batch) == 0:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+            done, failures = self._process_batch(batch)
+            self.queue.ack(done)
+            dead = self.queue.fail(failures)
+            if dead > 0:
+                print('Moved {} deliveries to dead-letter table'.format(dead))
+            self._prune()
+
+    def _process_batch(self, batch):
+        """Process batch of deliveries within single transaction
+
+        :param batch: Deliveries (queue ID, delivery ID, event, payload)
+        :type batch: list of tuple
+        :return: Queue IDs of processed deliveries and errors of failed
+        :rtype: tuple of (list of int, dict of int: str)
+        """
+        done, failures = [], {}
+        try:
+            for item in batch:
+                self._process_delivery(*item)
+            self.db.session.commit()
+            print('Processed batch of {} deliveries'.format(len(batch)))
+            done = [item[0] for item in batch]
+        except Exception as e:
+            self.db.session.rollback()
+            print('Batch failed ({}), processing one by one'.format(e))
+            for item in batch:
+                try:
+                    self._process_delivery(*item)
+                    self.db.session.commit()
+                    done.append(item[0])
+                except Exception as e:
+                    self.db.session.rollback()
+                    failures[item[0]] = repr(e)
+                    print('Error while processing delivery {}: {}'.format(
+                        item[1], e
+                    ))
+        return done, failures
+
+    def _prune(self):
+        """Prune deliveries log according to retention policy"""
+        from ..controllers.webhooks import prune_gh_deliveries
+        pruned = prune_gh_deliveries(self.db, self.config)
+        self.db.session.commit()
+        if pruned > 0:
+            print('Pruned {} old deliveries from log'.format(pruned))
+
+    def _process_delivery(self, queue_id, delivery_id, event, payload):
+        """Run processors for single delivery (without commit)
+
+        Already processed deliveries (redeliveries) are skipped.
+
+        :param queue_id: ID of delivery within queue
+        :type queue_id: int
+        :param delivery_id: GitHub delivery ID
+        :type delivery_id: str
+        :param event: GitHub event name
+        :type event: str
+        :param payload: Raw payload of delivery
+        :type payload: bytes
+        """
+        from ..controllers.webhooks import process_gh_webhook
+        from ..models import WebhookDelivery
+        if not WebhookDelivery.register(self.db.session, delivery_id, event):
+            print('Skipping duplicate delivery {}'.format(delivery_id))
+            return
+        data = json.loads(payload.decode('utf-8'))
+        repo = process_gh_webhook(self.db, self.hooks, event, data,
+                                  delivery_id)
+        if repo is None:
+            print('Skipping delivery {} of unknown repository'.format(
+                delivery_id
+            ))
+
+
+def _webhook_worker(batch_size=100, interval=1.0, once=False):
+    cmd = WebhookWorkerCommand()
+    cmd.run(batch_size, interval, once)
+
+
+@click.command()
+@click.option('-b', '--batch-size', default=100, type=int,
+              help='Maximal number of deliveries committed at once')
+@click.option('-i', '--interval', default=1.0, type=float,
+              help='Seconds to wait when the queue is empty')
+@click.option('--once', is_flag=True, default=False,
+              help='Stop when the queue is empty')
+@flask.cli.with_appcontext
+def webhook_worker(batch_size, interval, once):
+    """Process queued GitHub webhook deliveries"""
+    _webhook_worker(batch_size, interval, once)
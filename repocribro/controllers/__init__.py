@@ -3,14 +3,16 @@ from .auth import auth
 from .core import core
 from .errors import errors
 from .manage import manage
+from .metrics import metrics
 from .rest_api import rest_api
 from .webhooks import webhooks
 
 all_blueprints = [
-    admin, auth, core, errors, manage, rest_api, webhooks
+    admin, auth, core, errors, manage, metrics, rest_api, webhooks
 ]
 
 __all__ = [
     'all_blueprints',
-    'admin', 'auth', 'core', 'errors', 'manage', 'rest_api', 'webhooks'
+    'admin', 'auth', 'core', 'errors', 'manage', 'metrics', 'rest_api',
+    'webhooks'
 ]
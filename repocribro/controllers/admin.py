@@ -2,7 +2,8 @@ import flask
 import sqlalchemy
 
 from ..models import User, Role, Repository, Anonymous
-from ..security import permissions, reload_anonymous_role
+from ..security import permissions, reload_anonymous_role, \
+    invalidate_account
 
 #: Admin controller blueprint
 admin = flask.Blueprint('admin', __name__, url_prefix='/admin')
@@ -51,11 +52,13 @@ def account_ban(login):
     if user.user_account.active and ban:
         user.user_account.active = False
         db.session.commit()
+        invalidate_account(user.user_account)
         flask.flash('User account {} has been disabled.'.format(login),
                     'success')
     elif not user.user_account.active and unban:
         user.user_account.active = True
         db.session.commit()
+        invalidate_account(user.user_account)
         flask.flash('User account {} has been enabled.'.format(login),
                     'success')
     else:
@@ -74,6 +77,7 @@ def account_delete(login):
     user = db.session.query(User).filter_by(login=login).first()
     if user is None:
         flask.abort(404)
+    invalidate_account(user.user_account)
     db.session.delete(user.user_account)
     db.session.commit()
     flask.flash('User account {} with the all related data'
@@ -189,6 +193,7 @@ def role_edit(name):
                                             name=role.name))
     try:
         db.session.commit()
+        invalidate_account(role=role)
         if name == Anonymous.rolename:
             reload_anonymous_role(flask.current_app, db)
     except sqlalchemy.exc.IntegrityError as e:
@@ -209,6 +214,7 @@ def role_delete(name):
     role = db.session.query(Role).filter_by(name=name).first()
     if role is None:
         flask.abort(404)
+    invalidate_account(role=role)
     db.session.delete(role)
     db.session.commit()
     flask.flash('Role {} with the all related data has '
@@ -266,6 +272,7 @@ def role_assignment_add(name):
     else:
         role.user_accounts.append(account)
         db.session.commit()
+        invalidate_account(account)
         flask.flash('Role {} assigned to user {}'.format(name, login),
                     'success')
     return flask.redirect(flask.url_for('admin.role_detail', name=name))
@@ -289,6 +296,7 @@ def role_assignment_remove(name):
     else:
         role.user_accounts.remove(account)
         db.session.commit()
+        invalidate_account(account)
         flask.flash('Role {} removed from user {}'.format(name, login),
                     'success')
     return flask.redirect(flask.url_for('admin.role_detail', name=name))
@@ -1,6 +1,7 @@
 import flask
 import flask_login
 
+from ..http_cache import conditional_response, owner_validators
 from ..models import User, Organization, Repository
 from ..security import permissions
 
@@ -8,6 +9,38 @@ from ..security import permissions
 core = flask.Blueprint('core', __name__, url_prefix='')
 
 
+def render_tabbed(template, tabs_dict, **context):
+    """Render view with tabs (or only content of the active tab)
+
+    Inactive lazy tabs are not rendered, they are fetched via XHR
+    from the same URL with ``tab`` and ``fragment`` query parameters.
+
+    :param template: Template of the view
+    :type template: str
+    :param tabs_dict: Tabs of the view
+    :type tabs_dict: dict of str: ``repocribro.extending.helpers.ViewTab``
+    :param context: Context for the template
+    :return: Rendered view or content of the tab
+    :rtype: str
+    """
+    tabs = sorted(tabs_dict.values())
+    active_tab = flask.request.args.get('tab', tabs[0].id)
+    if flask.request.args.get('fragment', None) is not None:
+        if active_tab not in tabs_dict:
+            flask.abort(404)
+        return tabs_dict[active_tab].content
+
+    view_args = flask.request.view_args or {}
+    for tab in tabs:
+        if tab.lazy and tab.fragment_url is None:
+            tab.fragment_url = flask.url_for(
+                flask.request.endpoint, tab=tab.id, fragment=1, **view_args
+            )
+    return flask.render_template(
+        template, tabs=tabs, active_tab=active_tab, **context
+    )
+
+
 @core.route('/')
 @permissions.actions.browse.require(403)
 def index():
@@ -27,7 +60,10 @@ def index():
 def search(query=''):
     """Search page (GET handler)
 
-    .. todo:: more attrs, limits & pages
+    Results are paginated, ``tab`` and ``page`` query parameters
+    select the page of results to be shown.
+
+    .. todo:: more attrs
     """
     ext_master = flask.current_app.container.get('ext_master')
 
@@ -62,15 +98,13 @@ def user_detail(login):
                     'We redirected you but be careful next time!', 'notice')
         return flask.redirect(flask.url_for('core.org_detail', login=login))
 
-    tabs = {}
-    ext_master.call('view_core_user_detail_tabs',
-                    user=user, tabs_dict=tabs)
-    tabs = sorted(tabs.values())
-    active_tab = flask.request.args.get('tab', tabs[0].id)
+    def render():
+        tabs = {}
+        ext_master.call('view_core_user_detail_tabs',
+                        user=user, tabs_dict=tabs)
+        return render_tabbed('core/user.html', tabs, user=user)
 
-    return flask.render_template(
-        'core/user.html', user=user, tabs=tabs, active_tab=active_tab
-    )
+    return conditional_response(render, *owner_validators(db, user))
 
 
 @core.route('/org/<login>')
@@ -91,15 +125,14 @@ def org_detail(login):
         flask.flash('Oy! You wanted to access organization, but it\'s  auser.'
                     'We redirected you but be careful next time!', 'notice')
         return flask.redirect(flask.url_for('core.user_detail', login=login))
-    tabs = {}
-    ext_master.call('view_core_org_detail_tabs',
-                    org=org, tabs_dict=tabs)
-    tabs = sorted(tabs.values())
-    active_tab = flask.request.args.get('tab', tabs[0].id)
 
-    return flask.render_template(
-        'core/org.html', org=org, tabs=tabs, active_tab=active_tab
-    )
+    def render():
+        tabs = {}
+        ext_master.call('view_core_org_detail_tabs',
+                        org=org, tabs_dict=tabs)
+        return render_tabbed('core/org.html', tabs, org=org)
+
+    return conditional_response(render, *owner_validators(db, org))
 
 
 @core.route('/repo/<login>')
@@ -113,6 +146,9 @@ def repo_redir(login):
 def repo_detail_common(db, ext_master, repo, has_secret=False):
     """Repo detail (for GET handlers)
 
+    Page is not rendered when client has its current version (304),
+    it changes only with repo (incl. its events) or its owner.
+
     .. todo:: implement 410 (repo deleted/archived/renamed)
     """
     if repo is None:
@@ -120,15 +156,16 @@ def repo_detail_common(db, ext_master, repo, has_secret=False):
     if not flask_login.current_user.sees_repo(repo, has_secret):
         flask.abort(404)
 
-    tabs = {}
-    ext_master.call('view_core_repo_detail_tabs',
-                    repo=repo, tabs_dict=tabs)
-    tabs = sorted(tabs.values())
-    active_tab = flask.request.args.get('tab', tabs[0].id)
+    def render():
+        tabs = {}
+        ext_master.call('view_core_repo_detail_tabs',
+                        repo=repo, tabs_dict=tabs)
+        return render_tabbed('core/repo.html', tabs, repo=repo)
 
-    return flask.render_template(
-        'core/repo.html', repo=repo, tabs=tabs, active_tab=active_tab
-    )
+    validators = (repo.id, repo.revision, str(repo.last_event),
+                  repo.owner.id, repo.owner.revision)
+    return conditional_response(render, validators, repo.last_event,
+                                public=repo.is_public)
 
 
 @core.route('/repo/<login>/<reponame>')
@@ -1,5 +1,7 @@
 import flask
 
+from ..github import RateLimitExceeded
+
 #: Errors controller blueprint
 errors = flask.Blueprint('errors', __name__)
 
@@ -32,3 +34,11 @@ def err_internal(error):
 def err_internal(error):
     """Error handler for HTTP 501 - Not Implemented"""
     return flask.render_template('error/501.html'), 501
+
+
+@errors.app_errorhandler(RateLimitExceeded)
+def err_rate_limit(error):
+    """Error handler for exceeded GitHub rate limit (HTTP 503)"""
+    return flask.render_template('error/503.html'), 503, {
+        'Retry-After': str(int(error.delay) + 1)
+    }
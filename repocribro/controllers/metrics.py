@@ -0,0 +1,28 @@
+import flask
+import hmac
+
+#: Metrics controller blueprint
+metrics = flask.Blueprint('metrics', __name__)
+
+#: Content type of Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@metrics.route('/metrics')
+def prometheus():
+    """Metrics of requests in Prometheus format
+
+    Available only when instrumentation is enabled, if
+    ``METRICS_TOKEN`` is set it must be sent as bearer token.
+    """
+    instrumentation = flask.current_app.container.get('instrumentation')
+    if instrumentation is None or not instrumentation.enabled:
+        flask.abort(404)
+    config = flask.current_app.container.get('config')
+    token = config.get('repocribro-core', 'metrics_token', fallback='')
+    if token != '':
+        authorization = flask.request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization, 'Bearer ' + token):
+            flask.abort(401)
+    return flask.Response(instrumentation.prometheus(),
+                          content_type=PROMETHEUS_CONTENT_TYPE)
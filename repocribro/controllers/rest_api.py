@@ -1,10 +1,21 @@
 """REST API controller
 
+Responses with single object are conditional (``ETag`` and
+``Last-Modified``) with ``Cache-Control`` for shared caches.
+Collections are paginated by keyset, page is selected by ``after``
+cursor and ``per_page`` arguments and links to other pages are sent
+in ``Link`` header (like GitHub API does). When client accepts
+``application/x-ndjson``, whole collection is streamed instead (one
+JSON object per line).
+
 .. todo:: refactor significantly with permissions
-.. todo:: pagination of resources
 """
+import collections
 import flask
+import itertools
 
+from ..extending.helpers import KeysetPagination
+from ..http_cache import conditional_response
 from ..models import User, Repository, Release, \
                      Organization, Push, Commit
 
@@ -14,16 +25,250 @@ rest_api = flask.Blueprint('api', __name__, url_prefix='/api')
 
 #: DEFAULT PAGE SIZE
 PAGE_SIZE = 20
+#: Maximal page size requested by client
+MAX_PAGE_SIZE = 100
+#: Number of rows fetched at once when streaming collection
+STREAM_BATCH_SIZE = 100
+#: Media type of streamed collections (JSON object per line)
+NDJSON_MIMETYPE = 'application/x-ndjson'
+#: Searchable models by their type name
+SEARCH_TYPES = collections.OrderedDict([
+    ('repo', Repository),
+    ('user', User),
+    ('org', Organization),
+    ('push', Push),
+    ('commit', Commit),
+    ('release', Release),
+])
+
+
+def collection_url(**kwargs):
+    """Make external URL of current collection with given arguments
+
+    :param kwargs: Query arguments (e.g. cursor and page size)
+    :return: URL of the collection
+    :rtype: str
+    """
+    return flask.url_for(flask.request.endpoint, _external=True,
+                         **flask.request.view_args, **kwargs)
+
+
+def link_header(links):
+    """Make value of ``Link`` header
+
+    :param links: Relation types and URLs
+    :type links: list of (str, str)
+    :return: Value of the header
+    :rtype: str
+    """
+    return ', '.join('<{}>; rel="{}"'.format(url, rel) for rel, url in links)
+
+
+def stream_collection(db_query, keys, cursor=None):
+    """Stream collection as NDJSON response
+
+    Rows are fetched in batches from server-side cursor (where
+    supported by the database driver) and serialized one by one,
+    so the whole collection is never held in memory.
+
+    :param db_query: Query of the collection
+    :type db_query: ``sqlalchemy.orm.query.Query``
+    :param keys: Key columns (last one should be unique)
+    :type keys: list of ``sqlalchemy.Column``
+    :param cursor: Cursor where to start (or None)
+    :type cursor: str
+    :return: Streamed response
+    :rtype: ``flask.Response``
+    """
+    db_query = KeysetPagination.seek(db_query, keys, cursor).yield_per(
+        STREAM_BATCH_SIZE
+    )
+
+    def generate():
+        for item in db_query:
+            yield flask.json.dumps(item.to_dict()) + '\n'
+
+    return flask.Response(flask.stream_with_context(generate()),
+                          mimetype=NDJSON_MIMETYPE)
+
+
+def repo_response(obj, repo):
+    """Make conditional response with object of repository
+
+    Objects of repository are changed only together with the repository
+    (its events), so its revision and last event are used as validators.
+
+    :param obj: Serializable object (repository or its part)
+    :type obj: ``repocribro.models.SerializableMixin``
+    :param repo: Repository of the object
+    :type repo: ``repocribro.models.Repository``
+    :return: JSON response (or 304)
+    :rtype: ``flask.Response``
+    """
+    validators = (type(obj).__name__, obj.id, repo.id, repo.revision,
+                  str(repo.last_event))
+    return conditional_response(lambda: flask.jsonify(obj.to_dict()),
+                                validators, repo.last_event)
+
+
+def collection_response(db_query, keys):
+    """Make response with (page of) collection of serializable objects
+
+    :param db_query: Query of the collection
+    :type db_query: ``sqlalchemy.orm.query.Query``
+    :param keys: Key columns (last one should be unique)
+    :type keys: list of ``sqlalchemy.Column``
+    :return: JSON response with page and ``Link`` header or NDJSON stream
+    :rtype: ``flask.Response``
+    """
+    args = flask.request.args
+    cursor = args.get('after', None)
+    mimetype = flask.request.accept_mimetypes.best_match(
+        ['application/json', NDJSON_MIMETYPE]
+    )
+    if mimetype == NDJSON_MIMETYPE:
+        return stream_collection(db_query, keys, cursor)
+
+    per_page = min(args.get('per_page', PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    page = KeysetPagination(db_query, keys, cursor, per_page)
+    links = []
+    if page.next_cursor is not None:
+        links.append(('next', collection_url(after=page.next_cursor,
+                                             per_page=page.per_page)))
+    links.append(('first', collection_url(per_page=page.per_page)))
+
+    response = flask.jsonify([item.to_dict() for item in page.items])
+    response.headers['Link'] = link_header(links)
+    return response
+
+
+def public_query(db, model, *entities):
+    """Query objects of model which are public (in public repositories)
+
+    :param db: Database with the objects
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param model: Searchable model
+    :type model: ``repocribro.models.SearchableMixin``
+    :param entities: Entities to be queried (model if not given)
+    :return: Query of public objects
+    :rtype: ``sqlalchemy.orm.query.Query``
+    """
+    db_query = db.session.query(*(entities or [model]))
+    if model is Commit:
+        db_query = db_query.join(Push, Commit.push_id == Push.id)
+        model = Push
+    if model in (Push, Release):
+        db_query = db_query.join(
+            Repository, model.repository_id == Repository.id
+        )
+    if model in (Push, Release, Repository):
+        db_query = db_query.filter(
+            Repository.visibility_type == Repository.VISIBILITY_PUBLIC
+        )
+    return db_query
+
 
+def search_ranking(db, query, types, offset, limit):
+    """Search objects of given types and get page of ranked IDs
 
+    Each type is ranked by search backend, results of different types
+    are interleaved by their rank (the best of each type first).
+
+    :param db: Database with the objects
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param query: Fulltext query
+    :type query: str
+    :param types: Names of types to be searched
+    :type types: list of str
+    :param offset: Number of results to be skipped
+    :type offset: int
+    :param limit: Maximal number of results
+    :type limit: int
+    :return: Results (type name and ID) and offset of next page
+             (or None)
+    :rtype: (list of tuple, int)
+    """
+    ranked = []
+    for type_name in types:
+        model = SEARCH_TYPES[type_name]
+        ids = model.fulltext_query(
+            query, public_query(db, model, model.id)
+        ).limit(offset + limit + 1).all()
+        ranked.append([(type_name, row[0]) for row in ids])
+    merged = [result for rank_results in
+              itertools.zip_longest(*ranked) for result in rank_results
+              if result is not None]
+    page = merged[offset:offset + limit]
+    next_offset = offset + limit if len(merged) > offset + limit else None
+    return page, next_offset
+
+
+def search_page(db, page, types):
+    """Load and serialize ranked page of search results
+
+    :param db: Database with the objects
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param page: Results (type name and ID) in order of rank
+    :type page: list of tuple
+    :param types: Names of searched types
+    :type types: list of str
+    :return: Serialized results
+    :rtype: list of dict
+    """
+    objects = {}
+    for type_name in types:
+        ids = [row_id for res_type, row_id in page if res_type == type_name]
+        if len(ids) > 0:
+            model = SEARCH_TYPES[type_name]
+            for obj in db.session.query(model).filter(model.id.in_(ids)):
+                objects[(type_name, obj.id)] = obj
+    return [dict(objects[result].to_dict(), type=result[0])
+            for result in page if result in objects]
+
+
+@rest_api.route('/search', defaults={'query': None})
 @rest_api.route('/search/<query>')
 def search(query):
-    """Search searchable objects by query
+    """Search public searchable objects by query (most relevant first)
 
-    .. todo:: implement search within all searchable models
+    Query can be given also as ``q`` argument, types of objects can
+    be filtered by ``type`` argument (comma-separated), page size is
+    set by ``limit`` argument. Rankings of pages are cached until the
+    searchable data are changed, objects are always loaded fresh.
     """
-    flask.abort(501)
-    return flask.jsonify({})
+    db = flask.current_app.container.get('db')
+    cache = flask.current_app.container.get('search_cache')
+    args = flask.request.args
+    query = (query or args.get('q', '')).strip()
+    types = [t for t in args.get('type', '').split(',') if t != '']
+    types = types or list(SEARCH_TYPES)
+    if query == '' or any(t not in SEARCH_TYPES for t in types):
+        flask.abort(400)
+    limit = max(1, min(args.get('limit', PAGE_SIZE, type=int),
+                       MAX_PAGE_SIZE))
+    offset = max(0, args.get('after', 0, type=int))
+
+    key = (query, tuple(types), offset, limit)
+    result = cache.get(key)
+    if result is None:
+        generation = cache.generation
+        result = search_ranking(db, query, types, offset, limit)
+        cache.set(key, result, generation)
+    page, next_offset = result
+    items = search_page(db, page, types)
+
+    url_args = dict(q=query, type=','.join(types), limit=limit)
+    links = []
+    if next_offset is not None:
+        links.append(('next', flask.url_for(
+            'api.search', _external=True, after=next_offset, **url_args
+        )))
+    links.append(('first', flask.url_for(
+        'api.search', _external=True, **url_args
+    )))
+    response = flask.jsonify(items)
+    response.headers['Link'] = link_header(links)
+    return response
 
 
 @rest_api.route('/user/<login>')
@@ -33,7 +278,8 @@ def get_user(login):
     user = db.session.query(User).filter_by(login=login).first()
     if user is None:
         flask.abort(404)
-    return flask.jsonify(user.to_dict())
+    return conditional_response(lambda: flask.jsonify(user.to_dict()),
+                                ('User', user.id, user.revision))
 
 
 @rest_api.route('/org/<login>')
@@ -43,7 +289,18 @@ def get_org(login):
     org = db.session.query(Organization).filter_by(login=login).first()
     if org is None:
         flask.abort(404)
-    return flask.jsonify(org.to_dict())
+    return conditional_response(lambda: flask.jsonify(org.to_dict()),
+                                ('Organization', org.id, org.revision))
+
+
+@rest_api.route('/repos')
+def get_repos():
+    """GET public Repositories (newest first)"""
+    db = flask.current_app.container.get('db')
+    db_query = db.session.query(Repository).filter_by(
+        visibility_type=Repository.VISIBILITY_PUBLIC
+    )
+    return collection_response(db_query, [Repository.id])
 
 
 @rest_api.route('/repo/<int:repo_id>')
@@ -53,7 +310,7 @@ def get_repo(repo_id):
     repo = db.session.query(Repository).get(repo_id)
     if repo is None or not repo.is_public:
         flask.abort(404)
-    return flask.jsonify(repo.to_dict())
+    return repo_response(repo, repo)
 
 
 @rest_api.route('/repo/<login>/<reponame>')
@@ -65,7 +322,28 @@ def get_repo_by_name(login, reponame):
     ).first()
     if repo is None or not repo.is_public:
         flask.abort(404)
-    return flask.jsonify(repo.to_dict())
+    return repo_response(repo, repo)
+
+
+@rest_api.route('/repo/<int:repo_id>/pushes')
+def get_repo_pushes(repo_id):
+    """GET Pushes of Repository (public) by ID (newest first)"""
+    db = flask.current_app.container.get('db')
+    repo = db.session.query(Repository).get(repo_id)
+    if repo is None or not repo.is_public:
+        flask.abort(404)
+    return collection_response(repo.pushes_query, [Push.timestamp, Push.id])
+
+
+@rest_api.route('/repo/<int:repo_id>/releases')
+def get_repo_releases(repo_id):
+    """GET Releases of Repository (public) by ID (newest first)"""
+    db = flask.current_app.container.get('db')
+    repo = db.session.query(Repository).get(repo_id)
+    if repo is None or not repo.is_public:
+        flask.abort(404)
+    return collection_response(repo.releases_query,
+                               [Release.published_key, Release.id])
 
 
 @rest_api.route('/push/<int:push_id>')
@@ -75,7 +353,18 @@ def get_push(push_id):
     push = db.session.query(Push).get(push_id)
     if push is None or not push.repository.is_public:
         flask.abort(404)
-    return flask.jsonify(push.to_dict())
+    return repo_response(push, push.repository)
+
+
+@rest_api.route('/push/<int:push_id>/commits')
+def get_push_commits(push_id):
+    """GET Commits of Push (of public repo) by ID"""
+    db = flask.current_app.container.get('db')
+    push = db.session.query(Push).get(push_id)
+    if push is None or not push.repository.is_public:
+        flask.abort(404)
+    db_query = db.session.query(Commit).filter_by(push_id=push.id)
+    return collection_response(db_query, [Commit.id])
 
 
 @rest_api.route('/commit/<int:commit_id>')
@@ -85,7 +374,7 @@ def get_commit(commit_id):
     commit = db.session.query(Commit).get(commit_id)
     if commit is None or not commit.push.repository.is_public:
         flask.abort(404)
-    return flask.jsonify(commit.to_dict())
+    return repo_response(commit, commit.push.repository)
 
 
 @rest_api.route('/release/<int:release_id>')
@@ -95,4 +384,4 @@ def get_release(release_id):
     release = db.session.query(Release).get(release_id)
     if release is None or not release.repository.is_public:
         flask.abort(404)
-    return flask.jsonify(release.to_dict())
+    return repo_response(release, release.repository)
@@ -1,24 +1,179 @@
 import flask
+import random
+import sqlalchemy.exc
 
-from ..models import Repository
+from ..fragment_cache import fragment_scope
+from ..models import Repository, WebhookDelivery
 
 webhooks = flask.Blueprint('webhooks', __name__, url_prefix='/webhook/github')
 
+#: Probability of pruning the deliveries log within single request
+PRUNE_PROBABILITY = 0.01
+
+
+def prune_gh_deliveries(db, config):
+    """Prune deliveries log according to retention policy
+
+    :param db: Database where deliveries log is stored
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param config: Configuration of the application
+    :type config: ``repocribro.config.Config``
+    :return: Number of deleted records
+    :rtype: int
+    """
+    retention = config.getint('github', 'webhooks_log_retention',
+                              fallback=30)
+    return WebhookDelivery.prune(db.session, retention)
+
+
+def process_gh_webhook(db, hooks, event, data, delivery_id):
+    """Run processors for (verified) webhook delivery
+
+    Changes are not committed, caller is responsible for that.
+    Cached fragments of the repository and its owner are invalidated.
+
+    :param db: Database where data are stored
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param hooks: Processors for each event
+    :type hooks: dict of str: tuple of function
+    :param event: GitHub event name
+    :type event: str
+    :param data: Payload of the delivery
+    :type data: dict
+    :param delivery_id: GitHub delivery ID
+    :type delivery_id: str
+    :return: Repository of the delivery (None if not registered)
+    :rtype: ``repocribro.models.Repository``
+    """
+    repo = db.session.query(Repository).filter_by(
+        github_id=data['repository']['id']
+    ).first()
+    if repo is None:
+        return None
+
+    for event_processor in hooks.get(event, []):
+        event_processor(db=db, repo=repo, data=data, delivery_id=delivery_id)
+
+    repo.events_updated()
+    fragment_cache = flask.current_app.container.get('fragment_cache')
+    fragment_cache.invalidate(fragment_scope(repo))
+    fragment_cache.invalidate(fragment_scope(repo.owner))
+    return repo
+
+
+def process_gh_webhook_group(db, hooks, repo_id, deliveries):
+    """Run processors for (verified) deliveries of single repository
+
+    Deliveries are processed in order of receiving, already processed
+    deliveries (redeliveries) are skipped. Repository is updated and
+    its cached fragments are invalidated only once for the group.
+    Changes are not committed, caller is responsible for that.
+
+    :param db: Database where data are stored
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param hooks: Processors for each event
+    :type hooks: dict of str: tuple of function
+    :param repo_id: GitHub ID of the repository
+    :type repo_id: int
+    :param deliveries: Deliveries (delivery ID, event, payload)
+    :type deliveries: list of tuple
+    :return: Number of processed deliveries (None if repo not registered)
+    :rtype: int
+    """
+    repo = db.session.query(Repository).filter_by(github_id=repo_id).first()
+    if repo is None:
+        return None
+
+    processed = 0
+    for delivery_id, event, data in deliveries:
+        if not WebhookDelivery.register(db.session, delivery_id, event):
+            continue
+        for event_processor in hooks.get(event, []):
+            event_processor(db=db, repo=repo, data=data,
+                            delivery_id=delivery_id)
+        processed += 1
+
+    if processed > 0:
+        repo.events_updated()
+        fragment_cache = flask.current_app.container.get('fragment_cache')
+        fragment_cache.invalidate(fragment_scope(repo))
+        fragment_cache.invalidate(fragment_scope(repo.owner))
+    return processed
+
+
+def make_group_processor(app):
+    """Make function processing coalesced deliveries of repository
+
+    Each group is processed and committed in single transaction (within
+    app context, so it can be called from background thread).
+
+    :param app: Application processing the deliveries
+    :type app: ``repocribro.repocribro.Repocribro``
+    :return: Function taking repository GitHub ID and its deliveries
+    :rtype: callable
+    """
+    def process(repo_id, deliveries):
+        if not flask.has_app_context():
+            with app.app_context():
+                return process(repo_id, deliveries)
+        db = app.container.get('db')
+        gh_events = app.container.get('gh_events')
+        hooks = {event: gh_events.processors('webhook', event)
+                 for event in set(d[1] for d in deliveries)}
+        try:
+            processed = process_gh_webhook_group(db, hooks, repo_id,
+                                                 deliveries)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Processing of {} webhook deliveries '
+                                 'failed'.format(len(deliveries)))
+            raise
+        return processed
+    return process
+
+
+def make_delivery_pruner(app):
+    """Make function pruning deliveries log in its own transaction
+
+    :param app: Application storing the deliveries log
+    :type app: ``repocribro.repocribro.Repocribro``
+    :return: Function returning number of deleted records
+    :rtype: callable
+    """
+    def prune():
+        if not flask.has_app_context():
+            with app.app_context():
+                return prune()
+        db = app.container.get('db')
+        try:
+            pruned = prune_gh_deliveries(db, app.container.get('config'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Pruning of webhook deliveries failed')
+            raise
+        return pruned
+    return prune
+
 
 @webhooks.route('', methods=['POST'])
 def gh_webhook():
-    """Point for GitHub webhook msgs (POST handler)"""
+    """Point for GitHub webhook msgs (POST handler)
+
+    If webhook queue is configured, verified deliveries are just stored
+    to the queue (for ``webhook_worker`` command) and 202 is returned.
+    With coalescing, deliveries are grouped by repository and processed
+    later (202), when too many of them are pending, 503 is returned.
+    Already processed deliveries (redeliveries) are ignored, also
+    when the same delivery is processed concurrently.
+    """
     db = flask.current_app.container.get('db')
-    ext_master = flask.current_app.container.get('ext_master')
+    config = flask.current_app.container.get('config')
+    gh_events = flask.current_app.container.get('gh_events')
     gh_api = flask.current_app.container.get('gh_api')
-
-    hooks_list = ext_master.call('get_gh_webhook_processors', default={})
-    hooks = {}
-    for ext_hooks in hooks_list:
-        for hook_event in ext_hooks:
-            if hook_event not in hooks:
-                hooks[hook_event] = []
-            hooks[hook_event].extend(ext_hooks[hook_event])
+    queue = flask.current_app.container.get('webhook_queue')
+    coalescer = flask.current_app.container.get('webhook_coalescer')
 
     headers = flask.request.headers
     agent = headers.get('User-Agent', '')
@@ -34,15 +189,31 @@ def gh_webhook():
     if not gh_api.webhook_verify_signature(flask.request.data, signature):
         flask.abort(404)
 
-    repo = db.session.query(Repository).filter_by(
-        github_id=data['repository']['id']
-    ).first()
-    if repo is None:
-        flask.abort(404)
-
-    for event_processor in hooks.get(event, []):
-        event_processor(db=db, repo=repo, data=data, delivery_id=delivery_id)
+    if queue is not None:
+        queue.push(delivery_id, event, flask.request.data)
+        return '', 202
+    if coalescer is not None:
+        if not coalescer.push(data['repository']['id'], delivery_id,
+                              event, data):
+            return '', 503, {'Retry-After': str(coalescer.retry_after)}
+        return '', 202
 
-    repo.events_updated()
-    db.session.commit()
+    try:
+        if not WebhookDelivery.register(db.session, delivery_id, event):
+            return ''
+        hooks = {event: gh_events.processors('webhook', event)}
+        if process_gh_webhook(db, hooks, event, data, delivery_id) is None:
+            flask.abort(404)
+        if random.random() < PRUNE_PROBABILITY:
+            prune_gh_deliveries(db, config)
+        db.session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        db.session.rollback()
+        if not delivery_id or not WebhookDelivery.registered(db.session,
+                                                             delivery_id):
+            raise
+        # concurrent duplicate delivery registered by another worker
+        flask.current_app.logger.info(
+            'Delivery {} was already processed'.format(delivery_id)
+        )
     return ''
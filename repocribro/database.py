@@ -1,6 +1,75 @@
+import flask
 import flask_sqlalchemy
+import sqlalchemy
 
 
 # TODO: find a way how get rid of this
 #: Standard way how to initialize SQLALchemy DB
 db = flask_sqlalchemy.SQLAlchemy()
+
+
+class QueryCounter:
+    """Counter of SQL statements executed by the engine
+
+    Can be used as context manager, statements are counted only
+    within the ``with`` block.
+
+    :ivar engine: Engine which statements are counted
+    :ivar count: Number of executed statements
+    :ivar statements: Executed statements (if recorded)
+    """
+
+    def __init__(self, engine, record=False):
+        self.engine = engine
+        self.count = 0
+        self.record = record
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, *args):
+        self.count += 1
+        if self.record:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        sqlalchemy.event.listen(self.engine, 'before_cursor_execute',
+                                self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sqlalchemy.event.remove(self.engine, 'before_cursor_execute',
+                                self._before_cursor_execute)
+
+
+def count_request_queries(conn, cursor, statement, *args):
+    """Count SQL statement to the current request (if any)"""
+    if flask.has_request_context():
+        flask.g.query_count = flask.g.get('query_count', 0) + 1
+
+
+def init_query_counting(app, engine):
+    """Count SQL statements of each request and warn over the budget
+
+    Number of statements is stored in ``flask.g.query_count``, if
+    it exceeds ``QUERY_BUDGET`` of ``repocribro-core`` (0 is off),
+    warning with the endpoint is logged.
+
+    :param app: Application which requests are counted
+    :type app: ``repocribro.repocribro.Repocribro``
+    :param engine: Engine which statements are counted
+    :type engine: ``sqlalchemy.engine.Engine``
+    """
+    config = app.container.get('config')
+    budget = config.getint('repocribro-core', 'query_budget', fallback=0)
+    if not sqlalchemy.event.contains(engine, 'before_cursor_execute',
+                                     count_request_queries):
+        sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                                count_request_queries)
+
+    @app.after_request
+    def check_query_budget(response):
+        count = flask.g.get('query_count', 0)
+        if 0 < budget < count:
+            app.logger.warning('Request to {} executed {} queries '
+                               '(budget {})'.format(flask.request.endpoint,
+                                                    count, budget))
+        return response
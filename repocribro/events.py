@@ -0,0 +1,114 @@
+import bisect
+import threading
+
+
+class EventRegistry:
+    """Registry of processors of GitHub webhooks and events
+
+    Processors are collected from extensions once (not for each
+    delivery) and kept ordered by ``PRIORITY`` of extension which
+    provides them. Registry is invalidated when extensions are
+    reloaded and collected again on next use, processors registered
+    directly by :meth:`register` are kept and added again.
+
+    :ivar ext_master: Master of extensions providing processors
+    :ivar registry: Processors (priority, order, function) by kind and event
+    :ivar registered: Directly registered (kind, event, processor, priority)
+    """
+
+    #: Kinds of processors and hooks of extensions providing them
+    KINDS = {
+        'webhook': 'get_gh_webhook_processors',
+        'event': 'get_gh_event_processors',
+    }
+
+    def __init__(self, ext_master=None):
+        self.ext_master = ext_master
+        self.registry = None
+        self.registered = []
+        self.counter = 0
+        self.lock = threading.RLock()
+        if ext_master is not None:
+            ext_master.reload_callbacks.append(self.invalidate)
+
+    def _check_kind(self, kind):
+        if kind not in self.KINDS:
+            raise ValueError('Unknown kind of processors: {}'.format(kind))
+
+    def register(self, kind, event, processor, priority=1000):
+        """Register processor of GitHub webhooks or events
+
+        :param kind: Kind of processor (``webhook`` or ``event``)
+        :type kind: str
+        :param event: Name of GitHub event (e.g. ``push``)
+        :type event: str
+        :param processor: Function processing the event
+        :type processor: callable
+        :param priority: Priority (lower will be called sooner)
+        :type priority: int
+        :raises ValueError: If kind is unknown
+        :raises TypeError: If processor is not callable
+        """
+        self._check_kind(kind)
+        if not callable(processor):
+            raise TypeError('Processor of {} {} is not callable'.format(
+                kind, event
+            ))
+        with self.lock:
+            if self.registry is None:
+                self.reload()
+            self.registered.append((kind, event, processor, priority))
+            self._add(kind, event, processor, priority)
+
+    def _add(self, kind, event, processor, priority):
+        self.counter += 1
+        processors = self.registry[kind].setdefault(event, [])
+        bisect.insort(processors, (priority, self.counter, processor))
+
+    def reload(self):
+        """Collect processors from all extensions (ordered by priority)
+
+        Directly registered processors are added after processors
+        of extensions (with the same priority).
+        """
+        with self.lock:
+            self.registry = {kind: {} for kind in self.KINDS}
+            if self.ext_master is not None:
+                for ext in self.ext_master.exts:
+                    for kind, hook_name in self.KINDS.items():
+                        provided = ext.call(hook_name, {}) or {}
+                        for event, processors in provided.items():
+                            for processor in processors:
+                                self._add(kind, event, processor,
+                                          ext.PRIORITY)
+            for kind, event, processor, priority in self.registered:
+                self._add(kind, event, processor, priority)
+
+    def invalidate(self):
+        """Forget collected processors (e.g. when extensions reload)
+
+        Directly registered processors are not forgotten.
+        """
+        with self.lock:
+            self.registry = None
+
+    def processors(self, kind, event=None):
+        """Get registered processors
+
+        :param kind: Kind of processors (``webhook`` or ``event``)
+        :type kind: str
+        :param event: Name of GitHub event (None for all events)
+        :type event: str
+        :return: Processors of the event or processors of all events
+        :rtype: tuple of callable or dict of str: tuple of callable
+        :raises ValueError: If kind is unknown
+        """
+        self._check_kind(kind)
+        with self.lock:
+            if self.registry is None:
+                self.reload()
+            registered = self.registry[kind]
+            if event is not None:
+                return tuple(p[2] for p in registered.get(event, []))
+            return {e: tuple(p[2] for p in processors)
+                    for e, processors in registered.items()}
@@ -1,11 +1,22 @@
+import atexit
 import flask
 import flask_login
 import flask_migrate
+import sqlalchemy
 
 from .extending import Extension
-from .extending.helpers import ViewTab, Badge
-from .models import Push, Release, Repository, Role, Anonymous, UserAccount
-from .github import GitHubAPI
+from .extending.helpers import ViewTab, Badge, Pagination, \
+    KeysetPagination
+from .models import Push, Release, Repository, Role, Anonymous, \
+    UserAccount, SearchableMixin
+from .github import GitHubAPI, RateLimiter, make_response_cache
+from .fragment_cache import fragment_scope, make_fragment_cache, \
+    viewer_role
+from .http_cache import owner_validators
+from .instrumentation import Instrumentation, init_instrumentation
+from .search import make_search_backend, SearchResultsCache
+from .webhook_coalescer import WebhookCoalescer
+from .webhook_queue import WebhookQueue
 
 
 def gh_webhook_push(db, repo, data, delivery_id):
@@ -13,10 +24,7 @@ def gh_webhook_push(db, repo, data, delivery_id):
 
     .. todo:: deal with limit of commits in webhook msg (20)
     """
-    push = Push.create_from_dict(data['push'], data['sender'], repo)
-    db.session.add(push)
-    for commit in push.commits:
-        db.session.add(commit)
+    Push.bulk_create_from_dict(db.session, data['push'], data['sender'], repo)
 
 
 def gh_webhook_release(db, repo, data, delivery_id):
@@ -60,10 +68,7 @@ def gh_event_push(db, repo, payload, actor):
     :param actor: Actor doing the event
     :type actor: dict
     """
-    push = Push.create_from_dict(payload, actor, repo)
-    db.session.add(push)
-    for commit in push.commits:
-        db.session.add(commit)
+    Push.bulk_create_from_dict(db.session, payload, actor, repo)
 
 
 def gh_event_release(db, repo, payload, actor):
@@ -112,11 +117,168 @@ def gh_event_repository(db, repo, payload, actor):
         repo.visibility_type = Repository.VISIBILITY_PRIVATE
 
 
-def make_githup_api_factory(cfg):
+def make_github_cache(cfg):
+    """Create shared cache for GitHub API responses from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: GitHub response cache (or None if disabled)
+    :rtype: ``repocribro.github.GitHubResponseCache``
+    """
+    return make_response_cache(
+        cfg.get('github', 'cache', fallback='memory'),
+        cfg.getint('github', 'cache_size', fallback=1000)
+    )
+
+
+def make_github_rate_limiter(cfg):
+    """Create shared rate limit scheduler for GitHub API from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: GitHub rate limit scheduler (or None if disabled)
+    :rtype: ``repocribro.github.RateLimiter``
+    """
+    if not cfg.getboolean('github', 'rate_limit', fallback=True):
+        return None
+    return RateLimiter(
+        pace_below=cfg.getfloat('github', 'rate_limit_pace_below',
+                                fallback=0.2),
+        max_retries=cfg.getint('github', 'rate_limit_retries', fallback=3),
+        max_wait=cfg.getfloat('github', 'rate_limit_max_wait', fallback=5.0)
+    )
+
+
+def make_webhook_queue(cfg):
+    """Create queue for incoming webhook deliveries from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: Webhook queue (or None if deliveries are processed directly)
+    :rtype: ``repocribro.webhook_queue.WebhookQueue``
+    """
+    path = cfg.get('github', 'webhooks_queue', fallback='')
+    if path == '':
+        return None
+    return WebhookQueue(
+        path,
+        max_attempts=cfg.getint('github', 'webhooks_queue_attempts',
+                                fallback=3)
+    )
+
+
+def make_webhook_coalescer(cfg, app):
+    """Create coalescing stage for incoming webhook deliveries from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :param app: Application processing the deliveries
+    :type app: ``repocribro.repocribro.Repocribro``
+    :return: Webhook coalescer (or None if deliveries are processed directly)
+    :rtype: ``repocribro.webhook_coalescer.WebhookCoalescer``
+    """
+    from .controllers.webhooks import (make_delivery_pruner,
+                                       make_group_processor)
+    window = cfg.getfloat('github', 'webhooks_coalesce_window', fallback=0.0)
+    if window <= 0:
+        return None
+    coalescer = WebhookCoalescer(
+        make_group_processor(app), window,
+        cfg.getint('github', 'webhooks_max_pending', fallback=1000),
+        cfg.getint('github', 'webhooks_retry_after', fallback=5),
+        prune=make_delivery_pruner(app),
+        prune_every=cfg.getint('github', 'webhooks_prune_every',
+                               fallback=100)
+    )
+    atexit.register(coalescer.stop)
+    return coalescer
+
+
+def make_search(cfg):
+    """Create fulltext search backend from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: Search backend
+    :rtype: ``repocribro.search.SearchBackend``
+    """
+    return make_search_backend(
+        cfg.get('repocribro-core', 'search', fallback='auto'),
+        cfg.get('flask', 'sqlalchemy_database_uri', fallback='sqlite://'),
+        cfg.getint('repocribro-core', 'search_max_results',
+                   fallback=1000) or None
+    )
+
+
+def make_search_cache(cfg):
+    """Create cache of search results from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: Search results cache
+    :rtype: ``repocribro.search.SearchResultsCache``
+    """
+    return SearchResultsCache(
+        cfg.getint('repocribro-core', 'search_cache_size', fallback=1000),
+        cfg.getint('repocribro-core', 'search_cache_ttl', fallback=60)
+    )
+
+
+def make_tabs_cache(cfg):
+    """Create cache of rendered tabs (fragments) from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: Fragment cache
+    :rtype: ``repocribro.fragment_cache.FragmentCache``
+    """
+    return make_fragment_cache(
+        cfg.get('repocribro-core', 'fragment_cache', fallback='memory'),
+        cfg.getint('repocribro-core', 'fragment_cache_size', fallback=1000),
+        cfg.getint('repocribro-core', 'fragment_cache_ttl', fallback=300)
+    )
+
+
+def make_account_cache(cfg):
+    """Create cache of security data of user accounts from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: Account cache
+    :rtype: ``repocribro.security.AccountCache``
+    """
+    from .security import AccountCache
+    return AccountCache(
+        cfg.getint('repocribro-core', 'account_cache_size', fallback=1000),
+        cfg.getint('repocribro-core', 'account_cache_ttl', fallback=30)
+    )
+
+
+def make_instrumentation(cfg):
+    """Create collector of requests timing from config
+
+    :param cfg: Configuration of the application
+    :type cfg: ``configparser.ConfigParser``
+    :return: Instrumentation (disabled by default)
+    :rtype: ``repocribro.instrumentation.Instrumentation``
+    """
+    return Instrumentation(
+        cfg.getboolean('repocribro-core', 'instrumentation', fallback=False)
+    )
+
+
+def make_githup_api_factory(cfg, cache=None, rate_limiter=None,
+                            instrumentation=None):
     """Simple factory for making the GitHub API client factory
 
     :param cfg: Configuration of the application
     :type cfg: ``configparser.ConfigParser``
+    :param cache: Cache shared by all created clients
+    :type cache: ``repocribro.github.GitHubResponseCache``
+    :param rate_limiter: Rate limit scheduler shared by all created clients
+    :type rate_limiter: ``repocribro.github.RateLimiter``
+    :param instrumentation: Collector of API calls timing
+    :type instrumentation: ``repocribro.instrumentation.Instrumentation``
     :return: GitHub API client factory
     :rtype: ``function``
     """
@@ -127,7 +289,10 @@ def make_githup_api_factory(cfg):
             cfg.get('github', 'client_secret'),
             cfg.get('github', 'webhooks_secret'),
             session=session,
-            token=token
+            token=token,
+            cache=cache,
+            rate_limiter=rate_limiter,
+            instrumentation=instrumentation
         )
 
     return github_api_factory
@@ -228,8 +393,19 @@ class CoreExtension(Extension):
 
     def init_business(self):
         """Init business layer (other extensions, what is needed)"""
+        from .database import init_query_counting
         from .security import init_login_manager, reload_anonymous_role
 
+        engine = self.db.get_engine(self.app)
+        init_query_counting(self.app, engine)
+        instrumentation = make_instrumentation(
+            self.app.container.get('config')
+        )
+        self.app.container.set_singleton('instrumentation', instrumentation)
+        init_instrumentation(self.app, engine, instrumentation)
+        if instrumentation.enabled:
+            self.master.instrumentation = instrumentation
+            instrumentation.register_collector(self.master)
         reload_anonymous_role(self.app, self.db)
         login_manager, principals = init_login_manager(self.db)
         login_manager.init_app(self.app)
@@ -238,8 +414,35 @@ class CoreExtension(Extension):
     def init_container(self):
         """Init service DI container of the app"""
         config = self.app.container.get('config')
+        gh_cache = make_github_cache(config)
+        gh_rate_limiter = make_github_rate_limiter(config)
+        self.app.container.set_singleton('gh_cache', gh_cache)
+        self.app.container.set_singleton('gh_rate_limiter', gh_rate_limiter)
+        self.app.container.set_singleton('webhook_queue',
+                                         make_webhook_queue(config))
+        webhook_coalescer = make_webhook_coalescer(config, self.app)
+        self.app.container.set_singleton('webhook_coalescer',
+                                         webhook_coalescer)
+        if webhook_coalescer is not None:
+            self.app.container.get('instrumentation').register_collector(
+                webhook_coalescer
+            )
+        search_backend = make_search(config)
+        SearchableMixin.search_backend = search_backend
+        self.app.container.set_singleton('search_backend', search_backend)
+        search_cache = make_search_cache(config)
+        SearchableMixin.search_cache = search_cache
+        self.app.container.set_singleton('search_cache', search_cache)
+        self.app.container.set_singleton('fragment_cache',
+                                         make_tabs_cache(config))
+        self.app.container.set_singleton('account_cache',
+                                         make_account_cache(config))
         self.app.container.set_factory(
-            'gh_api', make_githup_api_factory(config)
+            'gh_api',
+            make_githup_api_factory(
+                config, gh_cache, gh_rate_limiter,
+                self.app.container.get('instrumentation')
+            )
         )
         with self.app.test_request_context():
             self.app.jinja_env.globals.update(
@@ -256,47 +459,113 @@ class CoreExtension(Extension):
                 repocribro_core_navbar_style=config.get(
                     'repocribro-core', 'navbar_style',
                     fallback='dark'
-                ).lower()
+                ).lower(),
+                permissions=self.app.container.get('permissions')
             )
 
     def view_core_search_tabs(self, query, tabs_dict):
         """Prepare tabs for search view of core controller
 
+        Only the page of active tab is loaded and rendered, other
+        tabs get just count of results.
+
         :param query: Fulltext query for the search
         :type query: str
         :param tabs_dict: Target dictionary for tabs
         :type tabs_dict: dict of str: ``repocribro.extending.helpers.ViewTab``
         """
         from .models import User, Organization, Repository
-        if query == '':
-            users = self.db.session.query(User).all()
-            orgs = self.db.session.query(Organization).all()
-            repos = self.db.session.query(Repository).all()
-        else:
-            users = User.fulltext_query(
-                query, self.db.session.query(User)
-            ).all()
-            orgs = Organization.fulltext_query(
-                query, self.db.session.query(Organization)
-            ).all()
-            repos = Repository.fulltext_query(
-                query, self.db.session.query(Repository)
-            ).all()
+        config = self.app.container.get('config')
+        per_page = config.getint('repocribro-core', 'page_size', fallback=20)
+        active_tab = flask.request.args.get('tab', 'repositories')
+        page = flask.request.args.get('page', 1, type=int)
+
+        tabs = [
+            ('repositories', 'Repositories', 'repo', Repository,
+             'core/search/repos_tab.html'),
+            ('users', 'Users', 'person', User,
+             'core/search/users_tab.html'),
+            ('orgs', 'Organizations', 'organization', Organization,
+             'core/search/orgs_tab.html'),
+        ]
+        for priority, tab in enumerate(tabs):
+            tab_id, name, octicon, model, template = tab
+            db_query = self.db.session.query(model)
+            if model is Repository:
+                db_query = db_query.filter(
+                    flask_login.current_user.sees_repos_filter()
+                ).options(*Repository.listing_options())
+            if query == '':
+                db_query = db_query.order_by(model.id)
+            else:
+                db_query = model.fulltext_query(query, db_query)
+
+            if tab_id == active_tab:
+                results = Pagination(db_query, page, per_page)
+                content = flask.render_template(
+                    template, results=results, query=query, tab=tab_id
+                )
+                count = results.total
+            else:
+                content = ''
+                count = db_query.order_by(None).count()
+            tabs_dict[tab_id] = ViewTab(
+                tab_id, name, priority, content, octicon=octicon,
+                badge=Badge(count),
+                url=flask.url_for('core.search', query=query, tab=tab_id)
+            )
 
-        tabs_dict['repositories'] = ViewTab(
-            'repositories', 'Repositories', 0,
-            flask.render_template('core/search/repos_tab.html', repos=repos),
-            octicon='repo', badge=Badge(len(repos))
-        )
-        tabs_dict['users'] = ViewTab(
-            'users', 'Users', 1,
-            flask.render_template('core/search/users_tab.html', users=users),
-            octicon='person', badge=Badge(len(users))
+    def cached_fragment(self, obj, key, render):
+        """Get fragment showing the object from cache or render it
+
+        Key is prefixed with endpoint of the request, so the same
+        fragment key used by different views does not collide.
+
+        :param obj: Object shown in the fragment (scope of fragment)
+        :param key: Name of the fragment, version of the object, viewer
+                    role and all other values the fragment depends on
+        :type key: tuple
+        :param render: Function rendering the fragment
+        :type render: callable
+        :return: Rendered fragment
+        :rtype: str
+        """
+        cache = self.app.container.get('fragment_cache')
+        endpoint = None
+        if flask.has_request_context():
+            endpoint = flask.request.endpoint
+        return cache.fetch(fragment_scope(obj),
+                           (endpoint, obj.id) + tuple(key), render)
+
+    def render_fragment(self, obj, key, template, **context):
+        """Render template showing the object via fragment cache
+
+        :param obj: Object shown in the fragment (scope of fragment)
+        :param key: Version of the object, viewer role and all other
+                    values which the fragment depends on
+        :type key: tuple
+        :param template: Name of the template
+        :type template: str
+        :param context: Context for the template
+        :return: Rendered fragment
+        :rtype: str
+        """
+        return self.cached_fragment(
+            obj, (template,) + tuple(key),
+            lambda: flask.render_template(template, **context)
         )
-        tabs_dict['orgs'] = ViewTab(
-            'orgs', 'Organizations', 2,
-            flask.render_template('core/search/orgs_tab.html', orgs=orgs),
-            octicon='organization', badge=Badge(len(orgs))
+
+    def owner_repositories(self, owner):
+        """Query repositories of owner visible for current user
+
+        :param owner: Owner of repositories
+        :type owner: ``repocribro.models.RepositoryOwner``
+        :return: Query of repositories
+        :rtype: ``sqlalchemy.orm.query.Query``
+        """
+        return self.db.session.query(Repository).filter(
+            Repository.owner_id == owner.id,
+            flask_login.current_user.sees_repos_filter()
         )
 
     def view_core_user_detail_tabs(self, user, tabs_dict):
@@ -307,17 +576,24 @@ class CoreExtension(Extension):
         :param tabs_dict: Target dictionary for tabs
         :type tabs_dict: dict of str: ``repocribro.extending.helpers.ViewTab``
         """
+        key = owner_validators(self.db, user)[0] + viewer_role(user)
         tabs_dict['details'] = ViewTab(
             'details', 'Details', 0,
-            flask.render_template('core/user/details_tab.html', user=user),
+            lambda: self.render_fragment(
+                user, key, 'core/user/details_tab.html', user=user
+            ),
             octicon='person'
         )
+        repos = self.owner_repositories(user)
         tabs_dict['repositories'] = ViewTab(
             'repositories', 'Repositories', 1,
-            flask.render_template(
-                'core/repo_owner/repositories_tab.html', owner=user
+            lambda: self.render_fragment(
+                user, key, 'core/repo_owner/repositories_tab.html',
+                owner=user, repositories=repos.options(
+                    sqlalchemy.orm.undefer_group('counts')
+                ).order_by(Repository.id)
             ),
-            octicon='repo', badge=Badge(len(user.repositories))
+            octicon='repo', badge=Badge(repos.count())
         )
 
     def view_core_org_detail_tabs(self, org, tabs_dict):
@@ -328,41 +604,90 @@ class CoreExtension(Extension):
         :param tabs_dict: Target dictionary for tabs
         :type tabs_dict: dict of str: ``repocribro.extending.helpers.ViewTab``
         """
+        key = owner_validators(self.db, org)[0] + viewer_role(org)
         tabs_dict['details'] = ViewTab(
             'details', 'Details', 0,
-            flask.render_template('core/org/details_tab.html', org=org),
+            lambda: self.render_fragment(
+                org, key, 'core/org/details_tab.html', org=org
+            ),
             octicon='person'
         )
+        repos = self.owner_repositories(org)
         tabs_dict['repositories'] = ViewTab(
             'repositories', 'Repositories', 1,
-            flask.render_template(
-                'core/repo_owner/repositories_tab.html', owner=org
+            lambda: self.render_fragment(
+                org, key, 'core/repo_owner/repositories_tab.html',
+                owner=org, repositories=repos.options(
+                    sqlalchemy.orm.undefer_group('counts')
+                ).order_by(Repository.id)
             ),
-            octicon='repo', badge=Badge(len(org.repositories))
+            octicon='repo', badge=Badge(repos.count())
         )
 
     def view_core_repo_detail_tabs(self, repo, tabs_dict):
         """Prepare tabs for repo detail view of core controller
 
+        Releases and updates (pushes) are paginated by keyset, the
+        ``after`` query parameter is cursor within the active tab.
+
         :param repo: Repository which details should be shown
         :type repo: ``repocribro.models.Repository``
         :param tabs_dict: Target dictionary for tabs
         :type tabs_dict: dict of str: ``repocribro.extending.helpers.ViewTab``
         """
+        config = self.app.container.get('config')
+        per_page = config.getint('repocribro-core', 'page_size', fallback=20)
+        active_tab = flask.request.args.get('tab', None)
+        view_args = flask.request.view_args or {}
+        key = (repo.revision, str(repo.last_event), repo.owner.revision,
+               per_page) + viewer_role(repo.owner)
+
+        def cursor(tab_id):
+            if tab_id != active_tab:
+                return None
+            return flask.request.args.get('after', None)
+
+        def releases():
+            results = KeysetPagination(
+                repo.releases_query, [Release.published_key, Release.id],
+                cursor('releases'), per_page
+            )
+            return flask.render_template(
+                'core/repo/releases_tab.html', repo=repo, results=results,
+                link_args=dict(view_args, tab='releases')
+            )
+
+        def updates():
+            results = KeysetPagination(
+                repo.pushes_query.options(
+                    sqlalchemy.orm.selectinload(Push.commits)
+                ), [Push.timestamp, Push.id], cursor('updates'), per_page
+            )
+            return flask.render_template(
+                'core/repo/updates_tab.html', repo=repo, results=results,
+                link_args=dict(view_args, tab='updates')
+            )
+
         tabs_dict['details'] = ViewTab(
             'details', 'Details', 0,
-            flask.render_template('core/repo/details_tab.html', repo=repo),
+            lambda: self.render_fragment(
+                repo, key, 'core/repo/details_tab.html', repo=repo
+            ),
             octicon='repo'
         )
         tabs_dict['releases'] = ViewTab(
             'releases', 'Releases', 1,
-            flask.render_template('core/repo/releases_tab.html', repo=repo),
-            octicon='tag', badge=Badge(len(repo.releases))
+            lambda: self.cached_fragment(
+                repo, ('releases', cursor('releases')) + key, releases
+            ),
+            octicon='tag', badge=Badge(repo.releases_query.count())
         )
         tabs_dict['updates'] = ViewTab(
             'updates', 'Updates', 2,
-            flask.render_template('core/repo/updates_tab.html', repo=repo),
-            octicon='git-commit', badge=Badge(len(repo.pushes))
+            lambda: self.cached_fragment(
+                repo, ('updates', cursor('updates')) + key, updates
+            ),
+            octicon='git-commit', badge=Badge(repo.pushes_query.count())
         )
 
     def view_admin_index_tabs(self, tabs_dict):
@@ -371,12 +696,23 @@ class CoreExtension(Extension):
         :param tabs_dict: Target dictionary for tabs
         :type tabs_dict: dict of str: ``repocribro.extending.helpers.ViewTab``
         """
-        from .models import Repository, Role, UserAccount
-        accounts = self.db.session.query(UserAccount).all()
-        roles = self.db.session.query(Role).all()
-        repos = self.db.session.query(Repository).all()
+        from .models import User
+        accounts = self.db.session.query(UserAccount).options(
+            sqlalchemy.orm.selectinload(UserAccount.roles),
+            sqlalchemy.orm.selectinload(UserAccount.github_user).selectinload(
+                User.repositories
+            )
+        ).all()
+        roles = self.db.session.query(Role).options(
+            sqlalchemy.orm.selectinload(Role.user_accounts)
+        ).all()
+        repos = self.db.session.query(Repository).options(
+            *Repository.listing_options()
+        ).all()
         exts = [e for e in self.master.call('view_admin_extensions', None)
                 if e is not None]
+        rate_limiter = self.app.container.get('gh_rate_limiter')
+        rate_limits = {} if rate_limiter is None else rate_limiter.state()
 
         tabs_dict['users'] = ViewTab(
             'users', 'Users', 0,
@@ -395,9 +731,16 @@ class CoreExtension(Extension):
         )
         tabs_dict['extensions'] = ViewTab(
             'extensions', 'Extensions', 3,
-            flask.render_template('admin/tabs/exts.html', exts=exts),
+            flask.render_template('admin/tabs/exts.html', exts=exts,
+                                  hook_profiles=self.master.hook_profiles()),
             octicon='code', badge=Badge(len(exts))
         )
+        tabs_dict['github'] = ViewTab(
+            'github', 'GitHub', 4,
+            flask.render_template('admin/tabs/github.html',
+                                  rate_limits=rate_limits),
+            octicon='mark-github'
+        )
 
     def view_manage_dashboard_tabs(self, tabs_dict):
         """Prepare tabs for dashboard view of manage controller
@@ -407,8 +750,13 @@ class CoreExtension(Extension):
 
         .. todo: Rework displaying organizations (allow update/delete)
         """
-        repos = flask_login.current_user.github_user.repositories
-        org_repos = flask_login.current_user.github_user.org_repositories
+        user = flask_login.current_user.github_user
+        repos = self.db.session.query(Repository).with_parent(
+            user, 'repositories'
+        ).options(sqlalchemy.orm.undefer_group('counts')).all()
+        org_repos = self.db.session.query(Repository).with_parent(
+            user, 'org_repositories'
+        ).options(*Repository.listing_options()).all()
 
         tabs_dict['repositories'] = ViewTab(
             'repositories', 'Repositories', 0,
@@ -430,7 +778,7 @@ class CoreExtension(Extension):
             'profile', 'Profile', 2,
             flask.render_template(
                 'manage/dashboard/profile_tab.html',
-                user=flask_login.current_user.github_user
+                user=user
             ),
             octicon='person'
         )
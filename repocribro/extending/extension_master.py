@@ -1,7 +1,51 @@
+import collections
 import pkg_resources
 import sys
+import threading
+import time
 
 from .extension import Extension
+from ..instrumentation import format_labels
+
+
+class HookProfile:
+    """Timing profile of single hook of single extension
+
+    :ivar count: Number of calls
+    :ivar total: Cumulative time of calls (in seconds)
+    :ivar recent: Durations of the most recent calls (for percentiles)
+    """
+
+    #: Number of recent calls used for percentiles
+    WINDOW = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.recent = collections.deque(maxlen=self.WINDOW)
+
+    def record(self, duration):
+        """Record duration of the call
+
+        :param duration: Duration of the call in seconds
+        :type duration: float
+        """
+        self.count += 1
+        self.total += duration
+        self.recent.append(duration)
+
+    @property
+    def p95(self):
+        """95th percentile of recent durations (in seconds)
+
+        :return: Duration of call slower than 95 % of recent calls
+        :rtype: float
+        """
+        if len(self.recent) == 0:
+            return 0.0
+        durations = sorted(self.recent)
+        return durations[min(len(durations) - 1,
+                             int(len(durations) * 0.95))]
 
 
 #: TODO: make shared some service container
@@ -10,6 +54,13 @@ class ExtensionsMaster:
 
     Extension master finds and holds all the **repocribro** extensions
     and is used for calling operations on them and collecting the results.
+    Hook operations of extensions are looked up once (dispatch table) and
+    each call is profiled per extension and hook.
+
+    :ivar instrumentation: Collector of hooks timing (if set)
+    :ivar reload_callbacks: Functions called when dispatch table is rebuilt
+    :ivar dispatch: Operations (or None) of extensions by hook name
+    :ivar profiles: Timing profiles by (extension name, hook name)
     """
 
     #: String used for looking up the extensions
@@ -40,6 +91,7 @@ class ExtensionsMaster:
         .. todo:: There might be some problem with ordering of extensions
         """
         entry_points = self._collect_extensions()
+        self.instrumentation = None
         self.exts = []
         for ep in entry_points:
             ext_maker = ep.load()
@@ -51,6 +103,110 @@ class ExtensionsMaster:
             else:
                 self.exts.append(e)
         self.exts.sort(key=lambda e: e.PRIORITY)
+        self.profiles = {}
+        self.profiles_lock = threading.Lock()
+        self.reload_callbacks = []
+        self.build_dispatch()
+
+    def build_dispatch(self):
+        """Prepare dispatch table with hook operations of all extensions
+
+        Table contains all public callable attributes of extensions,
+        other hooks are looked up when called for the first time. It
+        must be rebuilt when extensions are changed (reloaded), then
+        all ``reload_callbacks`` are called.
+        """
+        hook_names = set()
+        for ext in self.exts:
+            hook_names.update(name for name in dir(ext)
+                              if not name.startswith('_'))
+        self.dispatch = {}
+        for hook_name in hook_names:
+            self._lookup(hook_name)
+        for callback in self.reload_callbacks:
+            callback()
+
+    def _lookup(self, hook_name):
+        """Find operations of hook within extensions
+
+        :param hook_name: Name of hook
+        :type hook_name: str
+        :return: Pairs of extension and operation (None if missing)
+        :rtype: list of tuple
+        """
+        operations = []
+        for ext in self.exts:
+            operation = getattr(ext, hook_name, None)
+            operations.append((ext, operation if callable(operation)
+                               else None))
+        self.dispatch[hook_name] = operations
+        return operations
+
+    def _record(self, ext, hook_name, duration):
+        key = (ext.NAME, hook_name)
+        with self.profiles_lock:
+            profile = self.profiles.get(key, None)
+            if profile is None:
+                profile = self.profiles[key] = HookProfile()
+            profile.record(duration)
+
+    def _call(self, hook_name, default, *args, **kwargs):
+        operations = self.dispatch.get(hook_name, None)
+        if operations is None:
+            operations = self._lookup(hook_name)
+        results = []
+        for ext, operation in operations:
+            if operation is None:
+                results.append(default)
+                continue
+            start = time.perf_counter()
+            try:
+                results.append(operation(*args, **kwargs))
+            finally:
+                self._record(ext, hook_name, time.perf_counter() - start)
+        return results
+
+    def hook_profiles(self):
+        """Timing profiles of hooks sorted by cumulative time
+
+        :return: Extension name, hook name, calls, total and p95 seconds
+        :rtype: list of tuple
+        """
+        with self.profiles_lock:
+            rows = [(ext_name, hook_name, profile.count, profile.total,
+                     profile.p95)
+                    for (ext_name, hook_name), profile
+                    in self.profiles.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def prometheus(self, prefix='repocribro'):
+        """Export timing profiles of hooks in Prometheus text format
+
+        Makes profiles of the running application available to other
+        processes (e.g. ``hook_profiles`` command) via ``/metrics``.
+
+        :param prefix: Prefix of metric names
+        :type prefix: str
+        :return: Metrics in Prometheus exposition format
+        :rtype: str
+        """
+        rows = self.hook_profiles()
+        metrics = [
+            ('hook_profile_calls_total', 'counter', 2, '{}'),
+            ('hook_profile_seconds_total', 'counter', 3, '{:.6f}'),
+            ('hook_profile_p95_seconds', 'gauge', 4, '{:.6f}'),
+        ]
+        lines = []
+        for name, kind, index, value_format in metrics:
+            name = '{}_{}'.format(prefix, name)
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for row in rows:
+                labels = format_labels([('extension', row[0]),
+                                        ('hook', row[1])])
+                lines.append('{}{{{}}} {}'.format(
+                    name, labels, value_format.format(row[index])
+                ))
+        return '\n'.join(lines) + '\n'
 
     def call(self, hook_name, default=None, *args, **kwargs):
         """Call the hook on all extensions registered
@@ -62,5 +218,7 @@ class ExtensionsMaster:
         :param kwargs: Keywords args to be passed to the hook operation
         :return: Result of the operation on the requested hook
         """
-        return [ext.call(hook_name, default, *args, **kwargs)
-                for ext in self.exts]
+        if self.instrumentation is None:
+            return self._call(hook_name, default, *args, **kwargs)
+        with self.instrumentation.timed('hook', hook_name):
+            return self._call(hook_name, default, *args, **kwargs)
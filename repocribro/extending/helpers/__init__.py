@@ -1,3 +1,5 @@
-from .views import ViewTab, Badge, ExtensionView
+from .views import ViewTab, Badge, Pagination, KeysetPagination, \
+    ExtensionView
 
-__all__ = ['ViewTab', 'Badge', 'ExtensionView']
+__all__ = ['ViewTab', 'Badge', 'Pagination', 'KeysetPagination',
+           'ExtensionView']
@@ -1,16 +1,45 @@
+import base64
+import datetime
+import iso8601
 import jinja2
+import json
+import math
+import sqlalchemy
 
 
 class ViewTab:
-    """Tab for the tabbed view at pages"""
+    """Tab for the tabbed view at pages
+
+    Tab with URL is not rendered in advance, it is loaded
+    via its URL when it is not the active one.
+
+    Content can be also callable (lazy tab), then it is rendered
+    at first access only. Inactive lazy tab with ``fragment_url``
+    is fetched from it when shown (via XHR).
+    """
     def __init__(self, id, name, priority=100, content='',
-                 octicon=None, badge=None):
+                 octicon=None, badge=None, url=None, fragment_url=None):
         self.id = id
         self.name = name
-        self.content = jinja2.Markup(content)
+        self.lazy = callable(content)
+        self.content = content
         self.priority = priority
         self.octicon = octicon
         self.badge = badge
+        self.url = url
+        self.fragment_url = fragment_url
+
+    @property
+    def content(self):
+        """Content of the tab (rendered if lazy)"""
+        if callable(self._content):
+            self._content = jinja2.Markup(self._content())
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content if callable(content) \
+            else jinja2.Markup(content)
 
     def __lt__(self, other):
         return self.priority < other.priority
@@ -22,6 +51,125 @@ class Badge:
         self.content = content
 
 
+class Pagination:
+    """Single page of DB query results for paginated views"""
+    def __init__(self, db_query, page=1, per_page=20):
+        self.per_page = max(1, per_page)
+        self.total = db_query.order_by(None).count()
+        self.pages = max(1, math.ceil(self.total / self.per_page))
+        self.page = min(max(1, page), self.pages)
+        self.items = db_query.limit(self.per_page).offset(
+            (self.page - 1) * self.per_page
+        ).all()
+
+
+class KeysetPagination:
+    """Single page of DB query results paginated by keyset (seek method)
+
+    Rows are ordered descending by the key columns (last one should be
+    unique) and page starts right after the row given by cursor, so it
+    does not need to skip any rows unlike offset pagination. Key columns
+    must not be NULL (use ``column_property`` with ``coalesce`` for
+    nullable ones), such rows would be never matched after the cursor.
+    """
+    def __init__(self, db_query, keys, cursor=None, per_page=20):
+        self.keys = keys
+        self.per_page = max(1, per_page)
+        self.cursor = cursor
+        items = self.seek(db_query, keys, cursor).limit(
+            self.per_page + 1
+        ).all()
+        self.items = items[:self.per_page]
+        self.next_cursor = None
+        if len(items) > self.per_page:
+            self.next_cursor = self.encode(keys, self.items[-1])
+
+    @staticmethod
+    def seek(db_query, keys, cursor=None):
+        """Order query by keys and skip rows up to the cursor
+
+        :param db_query: Query to be paginated
+        :type db_query: ``sqlalchemy.orm.query.Query``
+        :param keys: Key columns (last one should be unique)
+        :type keys: list of ``sqlalchemy.Column``
+        :param cursor: Cursor from URL (or None)
+        :type cursor: str
+        :return: Ordered query starting after the cursor
+        :rtype: ``sqlalchemy.orm.query.Query``
+        """
+        values = KeysetPagination.decode(keys, cursor)
+        if values is not None:
+            db_query = db_query.filter(KeysetPagination.after(keys, values))
+        return db_query.order_by(*[key.desc() for key in keys])
+
+    @staticmethod
+    def after(keys, values):
+        """Make condition for rows after the given key values
+
+        :param keys: Key columns (ordered descending)
+        :type keys: list of ``sqlalchemy.Column``
+        :param values: Values of the key columns
+        :type values: list
+        :return: Condition for the DB query
+        :rtype: ``sqlalchemy.sql.ClauseElement``
+        """
+        if len(keys) == 1:
+            return keys[0] < values[0]
+        return sqlalchemy.or_(
+            keys[0] < values[0],
+            sqlalchemy.and_(keys[0] == values[0],
+                            KeysetPagination.after(keys[1:], values[1:]))
+        )
+
+    @staticmethod
+    def encode(keys, item):
+        """Encode cursor pointing to given item
+
+        :param keys: Key columns
+        :type keys: list of ``sqlalchemy.Column``
+        :param item: Item (row) of the page
+        :return: Cursor for URL
+        :rtype: str
+        """
+        values = []
+        for key in keys:
+            value = getattr(item, key.key)
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            values.append(value)
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode('utf-8')
+        ).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode(keys, cursor):
+        """Decode key values from the cursor
+
+        :param keys: Key columns
+        :type keys: list of ``sqlalchemy.Column``
+        :param cursor: Cursor from URL (or None)
+        :type cursor: str
+        :return: Values of key columns (None if cursor is not valid)
+        :rtype: list or None
+        """
+        if not cursor:
+            return None
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(
+                (cursor + padding).encode('ascii')
+            ).decode('utf-8'))
+            if len(values) != len(keys):
+                return None
+            return [
+                iso8601.parse_date(value, default_timezone=None)
+                if isinstance(key.type, sqlalchemy.DateTime) and value
+                else value for key, value in zip(keys, values)
+            ]
+        except (ValueError, TypeError, UnicodeError, iso8601.ParseError):
+            return None
+
+
 class ExtensionView:
     """View object for extensions"""
     def __init__(self, name, category, author,
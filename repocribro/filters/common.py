@@ -1,3 +1,4 @@
+import datetime
 import jinja2
 
 
@@ -52,10 +53,24 @@ def flash_class(category):
     return category
 
 
+def timestamp(value):
+    """Convert UNIX timestamp to human-readable (UTC) date and time
+
+    :param value: UNIX timestamp
+    :type value: float
+    :return: Date and time as text
+    :rtype: str
+    """
+    return datetime.datetime.utcfromtimestamp(value).strftime(
+        '%Y-%m-%d %H:%M:%S UTC'
+    )
+
+
 #: Container with all common filters with their names in views
 common_filters = {
     'yes_no': yes_no,
     'email_link': email_link,
     'ext_link': ext_link,
-    'flash_class': flash_class
+    'flash_class': flash_class,
+    'timestamp': timestamp
 }
@@ -0,0 +1,291 @@
+import collections
+import flask_login
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+
+def fragment_scope(obj):
+    """Get scope of fragments of the object (for invalidation)
+
+    :param obj: Object shown in fragments (e.g. repository)
+    :return: Scope name
+    :rtype: str
+    """
+    return '{}:{}'.format(type(obj).__name__, obj.id)
+
+
+def viewer_role(owner=None):
+    """Get role of current user for keys of fragments
+
+    Fragments may differ for roles and for the owner of shown
+    data (e.g. private repositories), but not for other users.
+
+    :param owner: Owner of the shown data (if relevant)
+    :type owner: ``repocribro.models.RepositoryOwner``
+    :return: Role names and if user is the owner
+    :rtype: tuple
+    """
+    user = flask_login.current_user
+    is_owner = owner is not None and user.is_authenticated and \
+        user.github_user is not None and \
+        user.github_user.github_id == owner.github_id
+    return tuple(sorted(user.rolenames)), is_owner
+
+
+class FragmentCache:
+    """Generic cache of rendered page fragments (no caching)
+
+    Fragments are stored under key (tuple of template, object ID,
+    version, viewer role, ...) within scope of the object, so all
+    fragments of the object can be invalidated at once. Subclasses
+    can implement any backend by overriding :meth:`get`, :meth:`set`,
+    :meth:`invalidate` and :meth:`clear`.
+    """
+
+    @staticmethod
+    def digest(key):
+        """Make digest of the key (for storing outside process)
+
+        :param key: Key of the fragment
+        :type key: tuple
+        :return: Hexadecimal digest
+        :rtype: str
+        """
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def get(self, scope, key):
+        """Get cached fragment
+
+        :param scope: Scope of the fragment
+        :type scope: str
+        :param key: Key of the fragment
+        :type key: tuple
+        :return: Cached fragment or None
+        :rtype: str or None
+        """
+        return None
+
+    def set(self, scope, key, content):
+        """Store fragment to the cache
+
+        :param scope: Scope of the fragment
+        :type scope: str
+        :param key: Key of the fragment
+        :type key: tuple
+        :param content: Rendered fragment
+        :type content: str
+        """
+        pass
+
+    def invalidate(self, scope):
+        """Remove all fragments within scope
+
+        :param scope: Scope of fragments
+        :type scope: str
+        """
+        pass
+
+    def clear(self):
+        """Remove all the fragments from the cache"""
+        pass
+
+    def fetch(self, scope, key, render):
+        """Get cached fragment or render and store it
+
+        :param scope: Scope of the fragment
+        :type scope: str
+        :param key: Key of the fragment
+        :type key: tuple
+        :param render: Function rendering the fragment
+        :type render: callable
+        :return: Rendered fragment
+        :rtype: str
+        """
+        content = self.get(scope, key)
+        if content is None:
+            content = str(render())
+            self.set(scope, key, content)
+        return content
+
+
+class InMemoryFragmentCache(FragmentCache):
+    """In-process LRU cache of fragments with TTL
+
+    :ivar size: Maximal number of fragments
+    :ivar ttl: Seconds after which fragments expire (0 for no expiration)
+    :ivar entries: Cached entries (expiration, content) in LRU order
+    """
+
+    def __init__(self, size=1000, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, scope, key):
+        with self.lock:
+            entry = self.entries.get((scope, key), None)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.monotonic():
+                del self.entries[(scope, key)]
+                return None
+            self.entries.move_to_end((scope, key))
+            return entry[1]
+
+    def set(self, scope, key, content):
+        expiration = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self.lock:
+            self.entries[(scope, key)] = (expiration, content)
+            self.entries.move_to_end((scope, key))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, scope):
+        with self.lock:
+            for entry_key in [k for k in self.entries if k[0] == scope]:
+                del self.entries[entry_key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileSystemFragmentCache(FragmentCache):
+    """On-disk cache of fragments (directory per scope) with TTL
+
+    Directory can be shared by all web workers on the host, size
+    of the cache is not limited (expired files are replaced).
+
+    :ivar path: Path to the cache directory
+    :ivar ttl: Seconds after which fragments expire (0 for no expiration)
+    """
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(path, exist_ok=True)
+
+    def _scope_dir(self, scope):
+        return os.path.join(self.path, self.digest(scope))
+
+    def get(self, scope, key):
+        filename = os.path.join(self._scope_dir(scope), self.digest(key))
+        try:
+            if self.ttl > 0 and \
+                    os.path.getmtime(filename) + self.ttl < time.time():
+                return None
+            with open(filename, encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, scope, key, content):
+        directory = self._scope_dir(scope)
+        filename = os.path.join(directory, self.digest(key))
+        tmp_filename = '{}.{}.tmp'.format(filename, threading.get_ident())
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_filename, filename)
+        except OSError:
+            pass
+
+    def invalidate(self, scope):
+        shutil.rmtree(self._scope_dir(scope), ignore_errors=True)
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+class SQLiteFragmentCache(FragmentCache):
+    """Cache of fragments in SQLite database shared by processes
+
+    :ivar path: Path to SQLite database file
+    :ivar size: Maximal number of fragments
+    :ivar ttl: Seconds after which fragments expire (0 for no expiration)
+    """
+
+    #: SQL for creating the cache table
+    CREATE_SQL = 'CREATE TABLE IF NOT EXISTS fragment_cache (' \
+                 'scope TEXT, key TEXT, content TEXT, expires REAL, ' \
+                 'used REAL, PRIMARY KEY (scope, key))'
+
+    def __init__(self, path, size=10000, ttl=300):
+        self.path = path
+        self.size = size
+        self.ttl = ttl
+        with self._connect() as conn:
+            conn.execute(self.CREATE_SQL)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, scope, key):
+        digest = self.digest(key)
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT content FROM fragment_cache WHERE scope = ? '
+                'AND key = ? AND (expires IS NULL OR expires >= ?)',
+                (scope, digest, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE fragment_cache SET used = ? '
+                         'WHERE scope = ? AND key = ?',
+                         (time.time(), scope, digest))
+        return row[0]
+
+    def set(self, scope, key, content):
+        now = time.time()
+        expires = now + self.ttl if self.ttl > 0 else None
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO fragment_cache VALUES (?, ?, ?, ?, ?)',
+                (scope, self.digest(key), content, expires, now)
+            )
+            conn.execute(
+                'DELETE FROM fragment_cache WHERE rowid NOT IN ('
+                'SELECT rowid FROM fragment_cache ORDER BY used DESC '
+                'LIMIT ?)', (self.size,)
+            )
+
+    def invalidate(self, scope):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM fragment_cache WHERE scope = ?',
+                         (scope,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM fragment_cache')
+
+
+def make_fragment_cache(backend, size=1000, ttl=300):
+    """Create fragment cache from config specification
+
+    :param backend: ``memory``, ``fs:<dir>``, ``sqlite:<path>`` or ``none``
+    :type backend: str
+    :param size: Maximal number of fragments (memory and sqlite)
+    :type size: int
+    :param ttl: Seconds after which fragments expire
+    :type ttl: int
+    :return: Fragment cache (generic one if cache is disabled)
+    :rtype: ``repocribro.fragment_cache.FragmentCache``
+    :raises ValueError: If backend is unknown
+    """
+    backend = backend.strip()
+    if backend.lower() in ('', 'none'):
+        return FragmentCache()
+    if backend.lower() == 'memory':
+        return InMemoryFragmentCache(size, ttl)
+    if backend.lower().startswith('fs:'):
+        return FileSystemFragmentCache(backend[len('fs:'):], ttl)
+    if backend.lower().startswith('sqlite:'):
+        return SQLiteFragmentCache(backend[len('sqlite:'):], size, ttl)
+    raise ValueError('Unknown fragment cache backend: {}'.format(backend))
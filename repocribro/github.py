@@ -1,14 +1,405 @@
+import collections
+import concurrent.futures
+import flask
 import hashlib
 import hmac
 import json
+import random
 import requests
+import sqlite3
+import threading
+import time
+
+
+class GitHubResponseCache:
+    """Generic cache of GitHub responses for conditional requests
+
+    Cache stores the entries (dict with ``etag``, ``last_modified``,
+    ``url``, ``headers`` and ``content``) under key made of URI and
+    token scope. Subclasses can implement any backend (in-process,
+    on-disk, shared store) by overriding :meth:`get` and :meth:`set`.
+    """
+
+    def get(self, key):
+        """Get cached entry
+
+        :param key: Key of the entry
+        :type key: str
+        :return: Cached entry or None
+        :rtype: dict or None
+        """
+        return None
+
+    def set(self, key, entry):
+        """Store entry to the cache
+
+        :param key: Key of the entry
+        :type key: str
+        :param entry: Entry to be stored
+        :type entry: dict
+        """
+        pass
+
+    def clear(self):
+        """Remove all the entries from the cache"""
+        pass
+
+
+class InMemoryCache(GitHubResponseCache):
+    """In-process LRU cache of GitHub responses
+
+    :ivar size: Maximal number of entries
+    :ivar entries: Cached entries in LRU order
+    """
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteCache(GitHubResponseCache):
+    """On-disk cache of GitHub responses in SQLite database
+
+    Single file can be shared by multiple processes (web workers
+    and CLI commands).
+
+    :ivar path: Path to SQLite database file
+    :ivar size: Maximal number of entries
+    """
+
+    #: SQL for creating the cache table
+    CREATE_SQL = 'CREATE TABLE IF NOT EXISTS gh_cache (' \
+                 'key TEXT PRIMARY KEY, entry TEXT, used REAL)'
+
+    def __init__(self, path, size=10000):
+        self.path = path
+        self.size = size
+        with self._connect() as conn:
+            conn.execute(self.CREATE_SQL)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT entry FROM gh_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE gh_cache SET used = ? WHERE key = ?',
+                         (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key, entry):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO gh_cache VALUES (?, ?, ?)',
+                (key, json.dumps(entry), time.time())
+            )
+            conn.execute(
+                'DELETE FROM gh_cache WHERE key NOT IN ('
+                'SELECT key FROM gh_cache ORDER BY used DESC LIMIT ?)',
+                (self.size,)
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM gh_cache')
+
+
+def make_response_cache(backend, size=1000):
+    """Create GitHub response cache from config specification
+
+    :param backend: ``memory``, ``sqlite:<path>`` or ``none``
+    :type backend: str
+    :param size: Maximal number of entries
+    :type size: int
+    :return: Cache or None if cache is disabled
+    :rtype: ``repocribro.github.GitHubResponseCache``
+    :raises ValueError: If backend is unknown
+    """
+    backend = backend.strip()
+    if backend.lower() in ('', 'none'):
+        return None
+    if backend.lower() == 'memory':
+        return InMemoryCache(size)
+    if backend.lower().startswith('sqlite:'):
+        return SQLiteCache(backend[len('sqlite:'):], size)
+    raise ValueError('Unknown GitHub cache backend: {}'.format(backend))
+
+
+class RateLimitExceeded(Exception):
+    """Request would have to wait for rate limit longer than allowed
+
+    :ivar delay: Seconds until the request could be performed
+    """
+
+    def __init__(self, delay):
+        super().__init__(
+            'GitHub rate limit exceeded, retry in {:.0f}s'.format(delay)
+        )
+        self.delay = delay
+
+
+class RateLimiter:
+    """Rate-limit-aware scheduler of GitHub API requests
+
+    Scheduler tracks remaining quota of each token (scope) from
+    ``X-RateLimit-*`` headers. When the remaining quota drops below
+    ``pace_below`` fraction of limit, requests are paced so they are
+    spread across the rest of reset window. When quota is exhausted,
+    requests wait for the reset. Requests rejected due to (secondary)
+    rate limit (403/429) or server errors (5xx) are retried with
+    exponential backoff and jitter (only idempotent ones).
+
+    Within web request, no request waits longer than ``max_wait``,
+    it fails fast with :class:`RateLimitExceeded` instead (so worker
+    threads are not blocked until the reset). Only the most recently
+    used ``max_scopes`` tokens are tracked.
+
+    :ivar scopes: Tracked state of tokens (scopes)
+    """
+
+    #: Statuses of server errors which are retried
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pace_below=0.2, max_retries=3, backoff=1.0,
+                 max_backoff=60.0, max_wait=5.0, max_scopes=1000,
+                 clock=time.time, sleep=time.sleep):
+        self.pace_below = pace_below
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.max_scopes = max_scopes
+        self.clock = clock
+        self.sleep = sleep
+        self.scopes = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def _scope(self, key):
+        if key in self.scopes:
+            self.scopes.move_to_end(key)
+            return self.scopes[key]
+        self.scopes[key] = {
+            'remaining': None, 'limit': None, 'reset': None,
+            'queued': 0, 'next_at': 0.0
+        }
+        if len(self.scopes) > self.max_scopes:
+            for old_key in list(self.scopes.keys())[:-1]:
+                if self.scopes[old_key]['queued'] == 0:
+                    del self.scopes[old_key]
+                if len(self.scopes) <= self.max_scopes:
+                    break
+        return self.scopes[key]
+
+    def _max_wait(self):
+        """Get maximal wait for actual caller
+
+        :return: Seconds (None if caller can wait for the reset)
+        :rtype: float
+        """
+        if flask.has_request_context():
+            return self.max_wait
+        return None
+
+    def _reserve(self, key, max_wait=None):
+        """Reserve slot for request and compute how long to wait
+
+        :param key: Scope (token) of the request
+        :type key: str
+        :param max_wait: Maximal seconds to wait (None for unlimited)
+        :type max_wait: float
+        :return: Seconds to wait before request
+        :rtype: float
+        :raises RateLimitExceeded: If it should wait longer than allowed
+        """
+        with self.lock:
+            scope = self._scope(key)
+            now = self.clock()
+            if scope['remaining'] is None or scope['reset'] is None:
+                return 0.0
+            if now >= scope['reset']:
+                scope['remaining'] = None
+                return 0.0
+            if scope['remaining'] <= 0:
+                delay = scope['reset'] - now
+                if max_wait is not None and delay > max_wait:
+                    raise RateLimitExceeded(delay)
+                return delay
+            threshold = (scope['limit'] or 0) * self.pace_below
+            delay = 0.0
+            if scope['remaining'] <= threshold:
+                interval = (scope['reset'] - now) / scope['remaining']
+                start = max(now, scope['next_at'])
+                delay = start - now
+                if max_wait is not None and delay > max_wait:
+                    raise RateLimitExceeded(delay)
+                scope['next_at'] = start + interval
+            scope['remaining'] -= 1
+            return delay
+
+    def _wait(self, key, delay):
+        """Wait (as queued request) for given time
+
+        :param key: Scope (token) of the request
+        :type key: str
+        :param delay: Seconds to wait
+        :type delay: float
+        """
+        if delay <= 0:
+            return
+        with self.lock:
+            self._scope(key)['queued'] += 1
+        try:
+            self.sleep(delay)
+        finally:
+            with self.lock:
+                self._scope(key)['queued'] -= 1
+
+    def update(self, key, response):
+        """Update tracked quota from response headers
+
+        :param key: Scope (token) of the request
+        :type key: str
+        :param response: Response from GitHub
+        :type response: ``requests.Response``
+        """
+        headers = response.headers
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        with self.lock:
+            scope = self._scope(key)
+            scope['remaining'] = int(headers['X-RateLimit-Remaining'])
+            scope['limit'] = int(headers.get('X-RateLimit-Limit', 0)) or None
+            scope['reset'] = float(headers.get('X-RateLimit-Reset', 0))
+
+    def retry_delay(self, response, attempt):
+        """Compute backoff before retrying the request
+
+        :param response: Response from GitHub
+        :type response: ``requests.Response``
+        :param attempt: Number of already done retries
+        :type attempt: int
+        :return: Seconds to wait or None if it should not be retried
+        :rtype: float or None
+        """
+        headers = response.headers
+        limited = response.status_code == 403 and (
+            'Retry-After' in headers or
+            headers.get('X-RateLimit-Remaining', None) == '0'
+        )
+        if not limited and response.status_code not in self.RETRY_STATUSES:
+            return None
+        if attempt >= self.max_retries:
+            return None
+        if 'Retry-After' in headers:
+            delay = float(headers['Retry-After'])
+        elif headers.get('X-RateLimit-Remaining', None) == '0':
+            reset = float(headers.get('X-RateLimit-Reset', 0))
+            delay = max(reset - self.clock(), 0.0)
+        else:
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay + random.uniform(0, self.backoff)
+
+    def execute(self, key, request, retry=True):
+        """Perform request within rate limit (with retries)
+
+        :param key: Scope (token) of the request
+        :type key: str
+        :param request: Callable performing the request
+        :type request: callable
+        :param retry: If request can be retried (is idempotent)
+        :type retry: bool
+        :return: Response from GitHub
+        :rtype: ``requests.Response``
+        :raises RateLimitExceeded: If it should wait longer than allowed
+        """
+        max_wait = self._max_wait()
+        attempt = 0
+        while True:
+            self._wait(key, self._reserve(key, max_wait))
+            response = request()
+            self.update(key, response)
+            if not retry:
+                return response
+            delay = self.retry_delay(response, attempt)
+            if delay is None or (max_wait is not None and delay > max_wait):
+                return response
+            self._wait(key, delay)
+            attempt += 1
+
+    def budget_delay(self, key, reserve):
+        """Compute how long background work should wait for quota
+
+        Background jobs should leave ``reserve`` fraction of the quota
+        for interactive use, so when remaining quota is not above it
+        they should wait until the reset.
+
+        :param key: Scope (token) of the requests
+        :type key: str
+        :param reserve: Fraction of quota left for others
+        :type reserve: float
+        :return: Seconds to wait (0 if quota is available)
+        :rtype: float
+        """
+        with self.lock:
+            scope = self._scope(key)
+            if scope['remaining'] is None or scope['reset'] is None:
+                return 0.0
+            now = self.clock()
+            if now >= scope['reset']:
+                return 0.0
+            if scope['remaining'] > (scope['limit'] or 0) * reserve:
+                return 0.0
+            return scope['reset'] - now
+
+    def state(self):
+        """State of tracked scopes (for CLI and administration)
+
+        :return: Remaining, limit, reset and queued requests of scopes
+        :rtype: dict of str: dict
+        """
+        with self.lock:
+            return {
+                key[:8]: {
+                    'remaining': scope['remaining'],
+                    'limit': scope['limit'],
+                    'reset': scope['reset'],
+                    'queued': scope['queued'],
+                } for key, scope in self.scopes.items()
+            }
 
 
 class GitHubResponse:
-    """Wrapper for GET request response from GitHub"""
+    """Wrapper for GET request response from GitHub
+
+    :ivar from_cache: If the response was served from cache (304)
+    """
 
-    def __init__(self, response):
+    def __init__(self, response, from_cache=False):
         self.response = response
+        self.from_cache = from_cache
 
     @property
     def is_ok(self):
@@ -19,6 +410,15 @@ class GitHubResponse:
         """
         return self.response.status_code < 300
 
+    @property
+    def not_modified(self):
+        """Check if resource has not changed since ETag sent by caller
+
+        :return: if it was not modified (304 without cached data)
+        :rtype: bool
+        """
+        return self.response.status_code == 304
+
     @property
     def data(self):
         """Response data as dict/list
@@ -135,15 +535,21 @@ class GitHubAPI:
     WEBHOOK_CONTROLLER = 'webhooks.gh_webhook'
     #: URL for checking connections within GitHub
     CONNECTIONS_URL = 'https://github.com/settings/connections/applications/{}'
+    #: HTTP methods which can be safely retried
+    IDEMPOTENT_METHODS = ('get', 'head', 'delete')
 
     def __init__(self, client_id, client_secret, webhooks_secret,
-                 session=None, token=None):
+                 session=None, token=None, cache=None, rate_limiter=None,
+                 instrumentation=None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.webhooks_secret = webhooks_secret
         self.session = session or requests.Session()
         self.token = token
         self.scope = []
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.instrumentation = instrumentation
 
     def _get_headers(self):
         """Prepare auth header fields (empty if no token provided)
@@ -207,10 +613,215 @@ class GitHubAPI:
         uri = self.API_URL + what
         if page > 0:
             uri += '?page={}'.format(page)
-        return GitHubResponse(self.session.get(
-            uri,
-            headers=self._get_headers()
-        ))
+        return self.get_url(uri)
+
+    def get_url(self, uri, etag=None):
+        """Perform GET request on absolute GitHub API URL
+
+        This is used also for following links from ``Link`` header.
+        If caller already has some version of the resource, its ETag
+        can be sent and then ``not_modified`` response (without data)
+        is returned if it has not changed.
+
+        :param uri: URL of requested resource
+        :type uri: str
+        :param etag: ETag of the version known by caller
+        :type etag: str
+        :return: Response from the GitHub
+        :rtype: ``repocribro.github.GitHubResponse``
+        """
+        if self.cache is None:
+            headers = self._get_headers()
+            if etag is not None:
+                headers['If-None-Match'] = etag
+            response = self._request('get', uri, headers=headers)
+            return GitHubResponse(response, response.status_code == 304)
+
+        key = self._cache_key(uri)
+        entry = self.cache.get(key)
+        headers = self._get_headers()
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        response = self._request('get', uri, headers=headers)
+        if response.status_code == 304 and etag is not None:
+            return GitHubResponse(response, True)
+        if response.status_code == 304 and entry is not None:
+            return GitHubResponse(self._cached_response(entry), True)
+        if response.status_code == 200:
+            etag = response.headers.get('ETag', None)
+            last_modified = response.headers.get('Last-Modified', None)
+            if etag is not None or last_modified is not None:
+                self.cache.set(key, {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'url': response.url,
+                    'headers': dict(response.headers),
+                    'content': response.content.decode('utf-8'),
+                })
+        return GitHubResponse(response)
+
+    def iter_pages(self, what, per_page=100, prefetch=False, etag=None):
+        """Iterate over all pages of resource by following ``rel=next``
+
+        With prefetch, next page is requested on worker thread while
+        the actual page is processed by consumer. Iteration stops after
+        unsuccessful or not modified response (which is yielded too) or
+        when consumer stops iterating.
+
+        :param what: URI of requested resource
+        :type what: str
+        :param per_page: Number of items per page
+        :type per_page: int
+        :param prefetch: If next page should be prefetched
+        :type prefetch: bool
+        :param etag: ETag of the first page known by caller
+        :type etag: str
+        :return: Generator of responses (pages)
+        :rtype: generator of ``repocribro.github.GitHubResponse``
+        """
+        uri = '{}{}{}per_page={}'.format(
+            self.API_URL, what, '&' if '?' in what else '?', per_page
+        )
+        if not prefetch:
+            while uri is not None:
+                response = self.get_url(uri, etag)
+                etag = None
+                yield response
+                uri = self._next_url(response)
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.get_url, uri, etag)
+        try:
+            while future is not None:
+                response = future.result()
+                uri = self._next_url(response)
+                future = None
+                if uri is not None:
+                    future = executor.submit(self.get_url, uri)
+                yield response
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def iter_items(self, what, per_page=100, prefetch=False):
+        """Iterate over all items of paginated (list) resource
+
+        Items are yielded while pages are being fetched, iteration
+        silently ends on unsuccessful response (use :meth:`iter_pages`
+        when you need to check it).
+
+        :param what: URI of requested resource
+        :type what: str
+        :param per_page: Number of items per page
+        :type per_page: int
+        :param prefetch: If next page should be prefetched
+        :type prefetch: bool
+        :return: Generator of items
+        :rtype: generator of dict
+        """
+        pages = self.iter_pages(what, per_page, prefetch)
+        try:
+            for response in pages:
+                if not response.is_ok:
+                    return
+                yield from response.data
+        finally:
+            pages.close()
+
+    @staticmethod
+    def _next_url(response):
+        """Get URL of the next page (if any)
+
+        :param response: Response with page of data
+        :type response: ``repocribro.github.GitHubResponse``
+        :return: URL of next page or None
+        :rtype: str
+        """
+        if not response.is_ok:
+            return None
+        return response.links.get('next', {}).get('url', None)
+
+    def _request(self, method, uri, **kwargs):
+        """Perform HTTP request via session (within rate limit)
+
+        :param method: Name of HTTP method (session method)
+        :type method: str
+        :param uri: Requested URI
+        :type uri: str
+        :param kwargs: Keyword arguments for the session method
+        :return: Response from the GitHub
+        :rtype: ``requests.Response``
+        """
+        def request():
+            if self.instrumentation is None:
+                return getattr(self.session, method)(uri, **kwargs)
+            with self.instrumentation.timed('github', method.upper()):
+                return getattr(self.session, method)(uri, **kwargs)
+
+        if self.rate_limiter is None:
+            return request()
+        return self.rate_limiter.execute(self._token_scope(), request,
+                                         method in self.IDEMPOTENT_METHODS)
+
+    def rate_budget_delay(self, reserve=0.0):
+        """Seconds to wait until rate limit quota of the token allows
+        background requests (see :meth:`RateLimiter.budget_delay`)
+
+        :param reserve: Fraction of quota left for others
+        :type reserve: float
+        :return: Seconds to wait (0 if quota is available)
+        :rtype: float
+        """
+        if self.rate_limiter is None:
+            return 0.0
+        return self.rate_limiter.budget_delay(self._token_scope(), reserve)
+
+    def _token_scope(self):
+        """Make scope identifier of current token
+
+        Token is hashed so it is not stored in cache or shown anywhere.
+
+        :return: Hash of the token
+        :rtype: str
+        """
+        token = '' if self.token is None else self.token
+        return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+    def _cache_key(self, uri):
+        """Make cache key for URI and scope of current token
+
+        :param uri: Requested URI
+        :type uri: str
+        :return: Key for the response cache
+        :rtype: str
+        """
+        return '{}:{}'.format(self._token_scope(), uri)
+
+    @staticmethod
+    def _cached_response(entry):
+        """Rebuild response object from the cache entry
+
+        :param entry: Cached entry
+        :type entry: dict
+        :return: Response as it was originally received
+        :rtype: ``requests.Response``
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.headers = requests.structures.CaseInsensitiveDict(
+            entry['headers']
+        )
+        response.encoding = 'utf-8'
+        response._content = entry['content'].encode('utf-8')
+        return response
 
     def webhook_get(self, full_name, hook_id):
         """Perform GET request for repo's webhook
@@ -258,8 +869,8 @@ class GitHubAPI:
                 'secret': self.webhooks_secret
             }
         }
-        response = self.session.post(
-            self.API_URL + '/repos/{}/hooks'.format(full_name),
+        response = self._request(
+            'post', self.API_URL + '/repos/{}/hooks'.format(full_name),
             data=json.dumps(data),
             headers=self._get_headers()
         )
@@ -277,8 +888,8 @@ class GitHubAPI:
         :return: If request was successful
         :rtype: bool
         """
-        response = self.session.delete(
-            self.API_URL + '/repos/{}/hooks/{}/tests'.format(
+        response = self._request(
+            'delete', self.API_URL + '/repos/{}/hooks/{}/tests'.format(
                 full_name, hook_id
             ),
             headers=self._get_headers()
@@ -295,8 +906,8 @@ class GitHubAPI:
         :return: If request was successful
         :rtype: bool
         """
-        response = self.session.delete(
-            self.API_URL + '/repos/{}/hooks/{}'.format(
+        response = self._request(
+            'delete', self.API_URL + '/repos/{}/hooks/{}'.format(
                 full_name, hook_id
             ),
             headers=self._get_headers()
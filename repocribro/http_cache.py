@@ -0,0 +1,109 @@
+import flask
+import flask_login
+import hashlib
+import sqlalchemy
+
+
+def make_etag(*validators):
+    """Make strong entity tag from validators of the representation
+
+    :param validators: Values which change when representation changes
+    :return: Entity tag (without quotes)
+    :rtype: str
+    """
+    return hashlib.sha1(repr(validators).encode('utf-8')).hexdigest()
+
+
+def owner_validators(db, owner):
+    """Get validators of owner (user/org) and their repositories
+
+    :param db: Database with the data
+    :type db: ``flask_sqlalchemy.SQLAlchemy``
+    :param owner: Owner of repositories
+    :type owner: ``repocribro.models.RepositoryOwner``
+    :return: Validators and last modification (or None)
+    :rtype: (tuple, ``datetime.datetime``)
+    """
+    from .models import Repository
+    count, max_id, revisions, last_event = db.session.query(
+        sqlalchemy.func.count(Repository.id),
+        sqlalchemy.func.max(Repository.id),
+        sqlalchemy.func.sum(Repository.revision),
+        sqlalchemy.func.max(Repository.last_event),
+    ).filter(Repository.owner_id == owner.id).one()
+    validators = (owner.id, owner.revision, count, max_id, revisions,
+                  str(last_event))
+    return validators, last_event
+
+
+def set_cache_control(response, public=True):
+    """Set ``Cache-Control`` of response for current user
+
+    Pages for anonymous users can be stored by shared caches
+    (reverse proxy) for ``HTTP_CACHE_MAX_AGE`` seconds, others
+    must be revalidated by the browser.
+
+    :param response: Response to be updated
+    :type response: ``flask.Response``
+    :param public: If representation can be stored by shared caches
+    :type public: bool
+    """
+    config = flask.current_app.container.get('config')
+    max_age = config.getint('repocribro-core', 'http_cache_max_age',
+                            fallback=60)
+    if public and flask_login.current_user.is_anonymous:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+
+
+def conditional_response(view, validators, last_modified=None, public=True):
+    """Make conditional response (304 if client has current version)
+
+    Entity tag is made from validators, current user and application
+    release, so view is not called (and nothing rendered) when
+    ``If-None-Match`` (or ``If-Modified-Since``) of the request matches.
+
+    :param view: Function making the full response
+    :type view: callable
+    :param validators: Values which change when representation changes
+    :type validators: tuple
+    :param last_modified: Time of last modification (if known)
+    :type last_modified: ``datetime.datetime``
+    :param public: If representation can be stored by shared caches
+    :type public: bool
+    :return: Response (full or 304)
+    :rtype: ``flask.Response``
+    """
+    if '_flashes' in flask.session:
+        response = flask.make_response(view())
+        set_cache_control(response, public=False)
+        return response
+
+    config = flask.current_app.container.get('config')
+    etag = make_etag(
+        config.get('flask', 'release', fallback=''),
+        flask_login.current_user.get_id(), *validators
+    )
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0)
+
+    request = flask.request
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = last_modified is not None and \
+            request.if_modified_since is not None and \
+            last_modified <= request.if_modified_since
+    if not_modified:
+        response = flask.Response(status=304)
+    else:
+        response = flask.make_response(view())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    set_cache_control(response, public)
+    return response
@@ -0,0 +1,232 @@
+import collections
+import contextlib
+import flask
+import sqlalchemy
+import threading
+import time
+
+
+#: Components measured within requests (name, description)
+COMPONENTS = collections.OrderedDict([
+    ('db', 'SQL statements'),
+    ('github', 'GitHub API calls'),
+    ('template', 'Template rendering'),
+    ('hook', 'Extension hooks'),
+])
+
+
+def format_labels(labels):
+    """Format labels of sample in Prometheus text format
+
+    :param labels: Pairs of label name and value
+    :type labels: iterable of tuple
+    :return: Labels (without braces)
+    :rtype: str
+    """
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\')
+                                   .replace('"', '\\"'))
+        for k, v in labels
+    )
+
+
+class Instrumentation:
+    """Collector of timings of requests and their components
+
+    Each measured operation is added to the aggregated metrics
+    (labelled by endpoint of the current request) and, within request,
+    also to timings of the request (``flask.g.timings``) which are
+    sent in ``Server-Timing`` header. When disabled, nothing is
+    measured at all.
+
+    :ivar enabled: If operations are measured
+    :ivar metrics: Aggregated (count, seconds) by (metric, labels)
+    :ivar collectors: Other sources of exported metrics
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.metrics = collections.OrderedDict()
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register_collector(self, collector):
+        """Register other source of metrics (e.g. state of some queue)
+
+        :param collector: Object with ``prometheus(prefix)`` method
+        :type collector: object
+        """
+        self.collectors.append(collector)
+
+    @staticmethod
+    def _endpoint():
+        if flask.has_request_context():
+            return flask.request.endpoint or ''
+        return ''
+
+    def observe(self, metric, duration, **labels):
+        """Add single observation to the aggregated metrics
+
+        :param metric: Name of the metric
+        :type metric: str
+        :param duration: Measured time in seconds
+        :type duration: float
+        :param labels: Labels of the observation
+        """
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            count, total = self.metrics.get(key, (0, 0.0))
+            self.metrics[key] = (count + 1, total + duration)
+
+    def record(self, component, duration, name=None):
+        """Record operation of component (e.g. SQL statement)
+
+        :param component: Measured component (see ``COMPONENTS``)
+        :type component: str
+        :param duration: Measured time in seconds
+        :type duration: float
+        :param name: Name of operation (e.g. hook name) for metrics
+        :type name: str
+        """
+        if not self.enabled:
+            return
+        labels = {'endpoint': self._endpoint()}
+        if name is not None:
+            labels['name'] = name
+        self.observe(component, duration, **labels)
+        if flask.has_request_context():
+            timings = flask.g.setdefault('timings', {})
+            count, total = timings.get(component, (0, 0.0))
+            timings[component] = (count + 1, total + duration)
+
+    @contextlib.contextmanager
+    def timed(self, component, name=None):
+        """Measure operation within the ``with`` block
+
+        :param component: Measured component (see ``COMPONENTS``)
+        :type component: str
+        :param name: Name of operation (e.g. hook name) for metrics
+        :type name: str
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(component, time.perf_counter() - start, name)
+
+    def server_timing(self, total):
+        """Make ``Server-Timing`` header value for current request
+
+        :param total: Duration of the whole request in seconds
+        :type total: float
+        :return: Header value
+        :rtype: str
+        """
+        timings = flask.g.get('timings', {})
+        parts = []
+        for component, description in COMPONENTS.items():
+            count, duration = timings.get(component, (0, 0.0))
+            if count > 0:
+                parts.append('{};dur={:.2f};desc="{} ({}x)"'.format(
+                    component, duration * 1000, description, count
+                ))
+        parts.append('total;dur={:.2f}'.format(total * 1000))
+        return ', '.join(parts)
+
+    def prometheus(self, prefix='repocribro'):
+        """Export aggregated metrics in Prometheus text format
+
+        Every metric is exported as summary (``_count`` and ``_sum``
+        of seconds), followed by metrics of registered collectors.
+
+        :param prefix: Prefix of metric names
+        :type prefix: str
+        :return: Metrics in Prometheus exposition format
+        :rtype: str
+        """
+        with self.lock:
+            metrics = list(self.metrics.items())
+        by_metric = collections.OrderedDict()
+        for (metric, labels), values in sorted(metrics):
+            by_metric.setdefault(metric, []).append((labels, values))
+        lines = []
+        for metric, samples in by_metric.items():
+            name = '{}_{}_seconds'.format(prefix, metric)
+            lines.append('# TYPE {} summary'.format(name))
+            for labels, (count, total) in samples:
+                labels_str = format_labels(labels)
+                lines.append('{}_count{{{}}} {}'.format(
+                    name, labels_str, count
+                ))
+                lines.append('{}_sum{{{}}} {:.6f}'.format(
+                    name, labels_str, total
+                ))
+        exported = '\n'.join(lines) + '\n'
+        for collector in self.collectors:
+            exported += collector.prometheus(prefix)
+        return exported
+
+
+def init_instrumentation(app, engine, instrumentation):
+    """Measure requests, SQL statements and templates of the app
+
+    :param app: Application which requests are measured
+    :type app: ``repocribro.repocribro.Repocribro``
+    :param engine: Engine which statements are measured
+    :type engine: ``sqlalchemy.engine.Engine``
+    :param instrumentation: Collector of the timings
+    :type instrumentation: ``repocribro.instrumentation.Instrumentation``
+    """
+    if not instrumentation.enabled:
+        return
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, *args):
+        start = conn.info['query_start'].pop()
+        instrumentation.record('db', time.perf_counter() - start)
+
+    sqlalchemy.event.listen(engine, 'before_cursor_execute',
+                            before_cursor_execute)
+    sqlalchemy.event.listen(engine, 'after_cursor_execute',
+                            after_cursor_execute)
+
+    def before_render_template(sender, template, context, **extra):
+        starts = flask.g.setdefault('template_start', [])
+        starts.append(time.perf_counter())
+
+    def template_rendered(sender, template, context, **extra):
+        starts = flask.g.get('template_start', [])
+        if not starts:
+            return
+        start = starts.pop()
+        if not starts:
+            # only the outermost template (nested are included)
+            instrumentation.record('template', time.perf_counter() - start)
+
+    flask.before_render_template.connect(before_render_template, app,
+                                         weak=False)
+    flask.template_rendered.connect(template_rendered, app, weak=False)
+
+    @app.before_request
+    def start_request_timing():
+        flask.g.timings = {}
+        flask.g.template_start = []
+        flask.g.request_start = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        start = flask.g.get('request_start', None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        instrumentation.observe('request', total,
+                                endpoint=flask.request.endpoint or '',
+                                status=response.status_code)
+        response.headers['Server-Timing'] = \
+            instrumentation.server_timing(total)
+        return response
@@ -1,11 +1,15 @@
+import collections
 import flask_sqlalchemy
 import sqlalchemy
 import flask_login
 import datetime
 import fnmatch
+import functools
+import itertools
 import re
 
 from .database import db
+from .search import SearchBackend, SearchResultsCache
 
 Base = flask_sqlalchemy.declarative_base()
 
@@ -26,10 +30,76 @@ class SerializableMixin:
 
 
 class SearchableMixin:
-    """Mixin for models that support fulltext query"""
+    """Mixin for models that support fulltext query
+
+    Query is processed by search backend (``repocribro.search``) which
+    is kept up to date by mapper events on insert, update and delete.
+    Cache of search results is invalidated on flush and commit when
+    searchable objects are inserted or deleted or when their searchable
+    (or filtering) attributes are changed.
+    """
 
     #: List of names of string/text attributes used for fulltext
     __searchable__ = []
+    #: List of names of other attributes deciding what can be found
+    __search_filters__ = []
+    #: Backend of fulltext search (set by the app)
+    search_backend = SearchBackend()
+    #: Cache of search results (set by the app)
+    search_cache = SearchResultsCache(size=0)
+
+    @classmethod
+    def searchable_columns(cls):
+        """Get names of searchable columns (without duplicates)
+
+        :return: Names of searchable columns
+        :rtype: list of str
+        """
+        return list(collections.OrderedDict.fromkeys(cls.__searchable__))
+
+    @classmethod
+    def search_changed(cls, target):
+        """Check if update of the object affects search results
+
+        :param target: Object of searchable model
+        :type target: ``repocribro.models.SearchableMixin``
+        :return: If searchable or filtering attribute was changed
+        :rtype: bool
+        """
+        state = sqlalchemy.inspect(target)
+        return any(state.attrs[col].history.has_changes()
+                   for col in cls.searchable_columns() +
+                   list(cls.__search_filters__))
+
+    @classmethod
+    def search_row(cls, target):
+        """Get searchable values of the object for search index
+
+        :param target: Object of searchable model
+        :type target: ``repocribro.models.SearchableMixin``
+        :return: ID and searchable values
+        :rtype: dict
+        """
+        row = {col: getattr(target, col) for col in cls.searchable_columns()}
+        row['id'] = target.id
+        return row
+
+    @classmethod
+    def search_index_where(cls, session, whereclause):
+        """Index rows which bypassed the ORM (e.g. bulk inserts)
+
+        :param session: Database session
+        :type session: ``sqlalchemy.orm.Session``
+        :param whereclause: Condition for rows to be indexed
+        :type whereclause: ``sqlalchemy.sql.ClauseElement``
+        :return: Number of indexed rows
+        :rtype: int
+        """
+        _search_changed(session)
+        _search_touched(session, cls)
+        return SearchableMixin.search_backend.index_where(
+            session.connection(clause=cls.__table__), cls, whereclause
+        )
 
     @classmethod
     def fulltext_query(cls, query_str, db_query):
@@ -39,14 +109,119 @@ class SearchableMixin:
         :type query_str: str
         :param db_query: Database query object
         :type db_query: ``sqlalchemy.orm.query.Query``
-        :return: Query with fulltext filter added
+        :return: Query with fulltext filter added (ordered by relevance)
         :rtype: ``sqlalchemy.orm.query.Query``
         """
-        query_str = '%{}%'.format(query_str)
-        condition = sqlalchemy.or_(
-            *[getattr(cls, col).like(query_str) for col in cls.__searchable__]
+        return SearchableMixin.search_backend.filter_query(
+            cls, db_query, query_str
+        )
+
+
+def _search_touched(session, model, row_id=None):
+    touched = session.info.setdefault('search_touched', {})
+    if row_id is None:
+        touched[model] = None
+    elif touched.get(model, ()) is not None:
+        touched.setdefault(model, set()).add(row_id)
+
+
+@sqlalchemy.event.listens_for(SearchableMixin, 'after_insert', propagate=True)
+def _search_after_insert(mapper, connection, target):
+    if len(target.__searchable__) > 0:
+        _search_touched(sqlalchemy.orm.object_session(target),
+                        type(target), target.id)
+        SearchableMixin.search_backend.index(
+            connection, type(target), [target.search_row(target)]
+        )
+
+
+@sqlalchemy.event.listens_for(SearchableMixin, 'after_update', propagate=True)
+def _search_after_update(mapper, connection, target):
+    state = sqlalchemy.inspect(target)
+    changed = [col for col in target.searchable_columns()
+               if state.attrs[col].history.has_changes()]
+    if len(changed) > 0:
+        _search_touched(sqlalchemy.orm.object_session(target),
+                        type(target), target.id)
+        SearchableMixin.search_backend.index(
+            connection, type(target), [target.search_row(target)]
+        )
+
+
+@sqlalchemy.event.listens_for(SearchableMixin, 'after_delete', propagate=True)
+def _search_after_delete(mapper, connection, target):
+    if len(target.__searchable__) > 0:
+        _search_touched(sqlalchemy.orm.object_session(target),
+                        type(target), target.id)
+        SearchableMixin.search_backend.remove(
+            connection, type(target), [target.id]
         )
-        return db_query.filter(condition)
+
+
+def _search_changed(session):
+    SearchableMixin.search_cache.invalidate()
+    session.info['search_changed'] = True
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, 'after_flush')
+def _search_after_flush(session, flush_context):
+    changed = itertools.chain(session.new, session.deleted)
+    if any(isinstance(obj, SearchableMixin) for obj in changed) or \
+            any(isinstance(obj, SearchableMixin) and obj.search_changed(obj)
+                for obj in session.dirty):
+        _search_changed(session)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, 'after_commit')
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, 'after_rollback')
+def _search_after_transaction(session):
+    if session.info.pop('search_changed', False):
+        SearchableMixin.search_cache.invalidate()
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, 'after_commit')
+def _search_after_commit(session):
+    session.info.pop('search_touched', None)
+
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, 'after_rollback')
+def _search_after_rollback(session):
+    touched = session.info.pop('search_touched', None)
+    if touched:
+        SearchableMixin.search_backend.rollback(touched)
+
+
+class RevisionMixin:
+    """Mixin for models with revision number of the row
+
+    Revision is incremented with each update of the row, so it can
+    be used (together with ID) as validator of cached representations.
+    """
+
+    #: Number of updates of the row
+    revision = sqlalchemy.Column(sqlalchemy.Integer, default=0,
+                                 server_default='0', nullable=False)
+
+
+@sqlalchemy.event.listens_for(RevisionMixin, 'before_update', propagate=True)
+def _revision_before_update(mapper, connection, target):
+    session = sqlalchemy.orm.object_session(target)
+    if session.is_modified(target, include_collections=False):
+        target.revision = (target.revision or 0) + 1
+
+
+@functools.lru_cache(maxsize=256)
+def compile_privileges(privileges):
+    """Compile privileges of role to single regular expression
+
+    :param privileges: Patterns of privileges separated by ``:``
+    :type privileges: str
+    :return: Expression matching privileges permitted by any pattern
+    :rtype: ``re.Pattern``
+    """
+    return re.compile('|'.join(
+        fnmatch.translate(priv) for priv in privileges.split(':')
+    ))
 
 
 class RoleMixin:
@@ -91,13 +266,21 @@ class RoleMixin:
         :return: if it is permitted
         :rtype: bool
         """
-        privileges = self.privileges.split(':')
-        if privilege in privileges:
-            return True
-        for priv in privileges:
-            if fnmatch.fnmatch(privilege, priv):
-                return True
-        return False
+        return self.privileges_matcher.match(privilege) is not None
+
+    @property
+    def privileges_matcher(self):
+        """Compiled privileges (recompiled when privileges are changed)
+
+        :return: Expression matching permitted privileges
+        :rtype: ``re.Pattern``
+        """
+        privileges = self.privileges or ''
+        cached = getattr(self, '_privileges_matcher', None)
+        if cached is None or cached[0] != privileges:
+            cached = (privileges, compile_privileges(privileges))
+            self._privileges_matcher = cached
+        return cached[1]
 
     def valid_privileges(self):
         """Checks if privileges string is valid
@@ -166,6 +349,23 @@ class UserMixin(flask_login.UserMixin):
         visible = repo.is_public or (has_secret and repo.is_hidden)
         return visible or self.has_role('admin') or self.owns_repo(repo)
 
+    def sees_repos_filter(self):
+        """Get DB condition for repositories that user can see
+
+        Same as :py:meth:`sees_repo` but without secret URL (for listings)
+
+        :return: Condition for repositories query
+        :rtype: ``sqlalchemy.sql.ClauseElement``
+        """
+        if self.has_role('admin'):
+            return sqlalchemy.true()
+        public = Repository.visibility_type == Repository.VISIBILITY_PUBLIC
+        if self.github_user is None:
+            return public
+        return sqlalchemy.or_(
+            public, Repository.owner_id == self.github_user.id
+        )
+
     def privileges(self, all_privileges=frozenset()):
         """Filter given privileges if are applicable for the user
 
@@ -250,6 +450,16 @@ class Anonymous(flask_login.AnonymousUserMixin, UserMixin):
         visible = repo.is_public or (has_secret and repo.is_hidden)
         return visible
 
+    def sees_repos_filter(self):
+        """Get DB condition for repositories that user can see
+
+        Anonymous can see only public repos
+
+        :return: Condition for repositories query
+        :rtype: ``sqlalchemy.sql.ClauseElement``
+        """
+        return Repository.visibility_type == Repository.VISIBILITY_PUBLIC
+
 
 #: Many-to-many relationship between user accounts and roles
 roles_users = db.Table(
@@ -277,6 +487,9 @@ class UserAccount(db.Model, UserMixin, SearchableMixin):
     )
     #: Flag if the account is active or banned
     active = sqlalchemy.Column(sqlalchemy.Boolean, default=True)
+    #: Number of changes of active flag, roles or their privileges
+    security_revision = sqlalchemy.Column(sqlalchemy.Integer, default=0,
+                                          server_default='0', nullable=False)
     #: Relation to the GitHub user connected to account
     github_user = sqlalchemy.orm.relationship(
         'User', back_populates='user_account',
@@ -341,7 +554,42 @@ class Role(db.Model, RoleMixin):
         )
 
 
-class RepositoryOwner(db.Model):
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session, 'before_flush')
+def _security_before_flush(session, flush_context, instances):
+    """Increment security revision of accounts with changed security data
+
+    Revision is checked when account is loaded, so cached security
+    data are refreshed also in other processes (see
+    ``repocribro.security.AccountCache``).
+    """
+    accounts, role_ids = set(), set()
+    for obj in session.dirty:
+        state = sqlalchemy.inspect(obj)
+        if isinstance(obj, UserAccount):
+            if state.attrs.active.history.has_changes() or \
+                    state.attrs.roles.history.has_changes():
+                accounts.add(obj)
+        elif isinstance(obj, Role):
+            history = state.attrs.user_accounts.history
+            accounts.update(history.added or ())
+            accounts.update(history.deleted or ())
+            if state.attrs.privileges.history.has_changes() or \
+                    state.attrs.name.history.has_changes():
+                role_ids.add(obj.id)
+    role_ids.update(obj.id for obj in session.deleted
+                    if isinstance(obj, Role))
+    for account in accounts:
+        if account.id is not None and account not in session.deleted:
+            account.security_revision = (account.security_revision or 0) + 1
+    if len(role_ids) > 0:
+        session.execute(UserAccount.__table__.update().where(
+            UserAccount.id.in_(sqlalchemy.select(
+                [roles_users.c.account_id]
+            ).where(roles_users.c.role_id.in_(role_ids)))
+        ).values(security_revision=UserAccount.security_revision + 1))
+
+
+class RepositoryOwner(db.Model, RevisionMixin):
     """RepositoryOwner (User or Organization) from GitHub"""
     __tablename__ = 'RepositoryOwner'
 
@@ -366,7 +614,7 @@ class RepositoryOwner(db.Model):
     #: URL to avatar (personal picture)
     avatar_url = sqlalchemy.Column(sqlalchemy.String(255))
     #: Type of owner ("User" or "Organization")
-    type = sqlalchemy.Column(sqlalchemy.String(30))
+    type = sqlalchemy.Column(sqlalchemy.String(30), index=True)
     #: Repositories owned by the org/user
     repositories = sqlalchemy.orm.relationship(
         'Repository', back_populates='owner', cascade='all, delete-orphan'
@@ -538,10 +786,12 @@ class Organization(RepositoryOwner, SearchableMixin, SerializableMixin):
     }
 
 
-class Repository(db.Model, SearchableMixin, SerializableMixin):
+class Repository(db.Model, SearchableMixin, SerializableMixin,
+                 RevisionMixin):
     """Repository from GitHub"""
     __tablename__ = 'Repository'
     __searchable__ = ['full_name', 'languages', 'description']
+    __search_filters__ = ['visibility_type']
     __serializable__ = ['id', 'github_id', 'parent_name', 'full_name',
                         'name', 'languages', 'url', 'description', 'private',
                         'visibility_type', 'last_event', 'owner_id']
@@ -565,19 +815,20 @@ class Repository(db.Model, SearchableMixin, SerializableMixin):
     # Topics (tags) of repo
     topics = sqlalchemy.Column(sqlalchemy.UnicodeText)
     # GitHub visibility
-    private = sqlalchemy.Column(sqlalchemy.Boolean)
+    private = sqlalchemy.Column(sqlalchemy.Boolean, index=True)
     # Internal visibility within app
-    visibility_type = sqlalchemy.Column(sqlalchemy.Integer)
+    visibility_type = sqlalchemy.Column(sqlalchemy.Integer, index=True)
     # Unique secret string for hidden URL (if any)
     secret = sqlalchemy.Column(sqlalchemy.String(255), unique=True)
     # Webhook ID for sending events
     webhook_id = sqlalchemy.Column(sqlalchemy.Integer)
-    # Webhook ID for sending events
+    # Time of last registered event (UTC)
     last_event = sqlalchemy.Column(sqlalchemy.DateTime,
-                                   default=datetime.datetime.now())
+                                   default=datetime.datetime.utcnow)
     # ID of the owner of repository
     owner_id = sqlalchemy.Column(
-        sqlalchemy.Integer, sqlalchemy.ForeignKey('RepositoryOwner.id')
+        sqlalchemy.Integer, sqlalchemy.ForeignKey('RepositoryOwner.id'),
+        index=True
     )
     #: Owner of repository
     owner = sqlalchemy.orm.relationship(
@@ -593,11 +844,24 @@ class Repository(db.Model, SearchableMixin, SerializableMixin):
         'Release', back_populates='repository',
         cascade='all, delete-orphan'
     )
+    #: Query of registered pushes (for counting and paginating)
+    pushes_query = sqlalchemy.orm.relationship(
+        'Push', lazy='dynamic', viewonly=True
+    )
+    #: Query of registered releases (for counting and paginating)
+    releases_query = sqlalchemy.orm.relationship(
+        'Release', lazy='dynamic', viewonly=True
+    )
     #: Members of org repo within app
     members = sqlalchemy.orm.relationship(
         'User', back_populates='org_repositories',
         secondary=repos_members,
     )
+    #: State of synchronization with GitHub events feed
+    sync_state = sqlalchemy.orm.relationship(
+        'RepositorySyncState', uselist=False,
+        cascade='all, delete-orphan', passive_deletes=True
+    )
 
     #: Constant representing public visibility within app
     VISIBILITY_PUBLIC = 0
@@ -714,6 +978,21 @@ class Repository(db.Model, SearchableMixin, SerializableMixin):
             return None
         return ' '.join(topics)
 
+    @staticmethod
+    def listing_options():
+        """Get loader options for listings of repositories
+
+        Owners are joined and counts of pushes and releases are loaded
+        by subqueries within the same statement (no query per row).
+
+        :return: Options for repositories query
+        :rtype: list of ``sqlalchemy.orm.strategy_options.Load``
+        """
+        return [
+            sqlalchemy.orm.joinedload(Repository.owner),
+            sqlalchemy.orm.undefer_group('counts'),
+        ]
+
     @property
     def owner_login(self):
         """Get owner login from full name of repository
@@ -747,12 +1026,15 @@ class Repository(db.Model, SearchableMixin, SerializableMixin):
         """Check if repository is hidden within app"""
         return self.visibility_type == self.VISIBILITY_HIDDEN
 
-    def events_updated(self):
+    def events_updated(self, at=None):
         """Set that now was performed last events update of repo
 
+        :param at: Time of the newest event (UTC, now if None)
+        :type at: ``datetime.datetime``
+
         .. todo:: How about some past events before adding to app?
         """
-        self.last_event = datetime.datetime.now()
+        self.last_event = at or datetime.datetime.utcnow()
 
     def __repr__(self):
         """Standard string representation of DB object
@@ -788,7 +1070,7 @@ class Push(db.Model, SearchableMixin, SerializableMixin):
     #: The number of distinct commits in the push.
     distinct_size = sqlalchemy.Column(sqlalchemy.Integer)
     #: Timestamp of push (when it was registered)
-    timestamp = sqlalchemy.Column(sqlalchemy.DateTime())
+    timestamp = sqlalchemy.Column(sqlalchemy.DateTime(), index=True)
     #: Login of the sender
     sender_login = sqlalchemy.Column(sqlalchemy.String(40))
     #: ID of the sender
@@ -806,6 +1088,10 @@ class Push(db.Model, SearchableMixin, SerializableMixin):
         'Commit', back_populates='push',
         cascade='all, delete-orphan'
     )
+    __table_args__ = (
+        sqlalchemy.Index('ix_Push_repository_id_timestamp',
+                         repository_id, timestamp.desc(), id.desc()),
+    )
 
     def __init__(self, github_id, ref, after, before, size, distinct_size,
                  timestamp, sender_login, sender_id, repository):
@@ -820,6 +1106,42 @@ class Push(db.Model, SearchableMixin, SerializableMixin):
         self.sender_id = sender_id
         self.repository = repository
 
+    @staticmethod
+    def values_from_dict(push_dict, sender_dict, timestamp=None):
+        """Get column values of push from GitHub and additional data
+
+        :param push_dict: GitHub data containing push
+        :type push_dict: dict
+        :param sender_dict: GitHub data containing sender
+        :type sender_dict: dict
+        :param timestamp: Timestamp of push (None for now)
+        :type timestamp: ``datetime.datetime``
+        :return: Column values of push (without repository)
+        :rtype: dict
+        """
+        after = push_dict.get('after', None)
+        if after is None:
+            after = push_dict.get('head', None)
+        commits = push_dict.get('commits', [])
+        size = push_dict.get('size', -1)
+        dist_size = push_dict.get('distinct_size', -1)
+        if size == -1:
+            size = len(commits)
+        if dist_size == -1:
+            dist_size = len([c for c in commits if c['distinct']])
+        return {
+            'github_id': push_dict['push_id'],
+            'ref': push_dict['ref'],
+            'after': after,
+            'before': push_dict['before'],
+            'size': size,
+            'distinct_size': dist_size,
+            'timestamp': datetime.datetime.now()
+            if timestamp is None else timestamp,
+            'sender_login': sender_dict['login'],
+            'sender_id': sender_dict['id'],
+        }
+
     @staticmethod
     def create_from_dict(push_dict, sender_dict, repo, timestamp=None):
         """Create new push from GitHub and additional data
@@ -835,34 +1157,54 @@ class Push(db.Model, SearchableMixin, SerializableMixin):
         :return: Created new push
         :rtype: ``repocribro.models.Push``
         """
-        after = push_dict.get('after', None)
-        if after is None:
-            after = push_dict.get('head', None)
-        size = push_dict.get('size', -1)
-        dist_size = push_dict.get('distinct_size', -1)
-        push = Push(
-            push_dict['push_id'],
-            push_dict['ref'],
-            after,
-            push_dict['before'],
-            size,
-            dist_size,
-            datetime.datetime.now() if timestamp is None else timestamp,
-            sender_dict['login'],
-            sender_dict['id'],
-            repo
-        )
-        dst = 0
+        values = Push.values_from_dict(push_dict, sender_dict, timestamp)
+        push = Push(repository=repo, **values)
         for commit_data in push_dict.get('commits', []):
-            c = Commit.create_from_dict(commit_data, push)
-            if c.distinct:
-                dst += 1
-        if size == -1:
-            push.size = len(push.commits)
-        if dist_size == -1:
-            push.distinct_size = dst
+            Commit.create_from_dict(commit_data, push)
         return push
 
+    @staticmethod
+    def bulk_create_from_dict(session, push_dict, sender_dict, repo,
+                              timestamp=None):
+        """Insert new push with its commits from GitHub data in bulk
+
+        Unlike :py:meth:`create_from_dict` it bypasses the ORM unit
+        of work: the push is inserted by single statement and all its
+        commits by single executemany statement. No ORM objects are
+        created, loaded pushes of the repository are expired and new
+        rows are added to the search index explicitly.
+
+        :param session: Database session
+        :type session: ``sqlalchemy.orm.Session``
+        :param push_dict: GitHub data containing push
+        :type push_dict: dict
+        :param sender_dict: GitHub data containing sender
+        :type sender_dict: dict
+        :param repo: Repository where this push belongs
+        :type repo: ``repocribro.models.Repository``
+        :param timestamp: Timestamp of push (None for now)
+        :type timestamp: ``datetime.datetime``
+        :return: ID of the inserted push
+        :rtype: int
+        """
+        if repo.id is None:
+            session.flush()
+        values = Push.values_from_dict(push_dict, sender_dict, timestamp)
+        values['repository_id'] = repo.id
+        result = session.execute(Push.__table__.insert(), values)
+        push_id = result.inserted_primary_key[0]
+        commits = [Commit.values_from_dict(commit_data)
+                   for commit_data in push_dict.get('commits', [])]
+        for commit_values in commits:
+            commit_values['push_id'] = push_id
+        if len(commits) > 0:
+            session.execute(Commit.__table__.insert(), commits)
+        Push.search_index_where(session, Push.id == push_id)
+        Commit.search_index_where(session, Commit.push_id == push_id)
+        if repo in session:
+            session.expire(repo, ['pushes'])
+        return push_id
+
     def __repr__(self):
         """Standard string representation of DB object
 
@@ -877,16 +1219,14 @@ class Push(db.Model, SearchableMixin, SerializableMixin):
 class Commit(db.Model, SearchableMixin, SerializableMixin):
     """Commit from GitHub"""
     __tablename__ = 'Commit'
-    __searchable__ = ['sha', 'message', 'tree_sha',
-                      'author_name', 'author_name', 'author_login',
-                      'committer_name', 'committer_email', 'committer_login']
+    __searchable__ = ['sha', 'message', 'author_name', 'author_email']
     __serializable__ = ['id', 'sha', 'message', 'author_name', 'author_email',
                         'distinct', 'push_id']
 
     #: Unique identifier of the commit
     id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
     #: The SHA of the commit.
-    sha = sqlalchemy.Column(sqlalchemy.String(40))
+    sha = sqlalchemy.Column(sqlalchemy.String(40), index=True)
     #: The commit message.
     message = sqlalchemy.Column(sqlalchemy.UnicodeText())
     #: The git author's name.
@@ -897,7 +1237,7 @@ class Commit(db.Model, SearchableMixin, SerializableMixin):
     distinct = sqlalchemy.Column(sqlalchemy.Boolean)
     #: ID of push where the commit belongs to
     push_id = sqlalchemy.Column(
-        sqlalchemy.Integer, sqlalchemy.ForeignKey('Push.id')
+        sqlalchemy.Integer, sqlalchemy.ForeignKey('Push.id'), index=True
     )
     #: Push where the commit belongs to
     push = sqlalchemy.orm.relationship('Push', back_populates='commits')
@@ -911,6 +1251,28 @@ class Commit(db.Model, SearchableMixin, SerializableMixin):
         self.distinct = distinct
         self.push = push
 
+    @staticmethod
+    def values_from_dict(commit_dict):
+        """Get column values of commit from GitHub data
+
+        :param commit_dict: GitHub data containing commit
+        :type commit_dict: dict
+        :return: Column values of commit (without push)
+        :rtype: dict
+
+        .. todo:: verify, there are some conflict in GitHub docs
+        """
+        sha = commit_dict.get('sha', None)
+        if sha is None:
+            sha = commit_dict.get('id', None)
+        return {
+            'sha': sha,
+            'message': commit_dict['message'],
+            'author_name': commit_dict['author']['name'],
+            'author_email': commit_dict['author']['email'],
+            'distinct': commit_dict['distinct'],
+        }
+
     @staticmethod
     def create_from_dict(commit_dict, push):
         """Create new commit from GitHub and additional data
@@ -921,20 +1283,8 @@ class Commit(db.Model, SearchableMixin, SerializableMixin):
         :type push: ``repocribro.models.Push``
         :return: Created new commit
         :rtype: ``repocribro.models.Commit``
-
-        .. todo:: verify, there are some conflict in GitHub docs
         """
-        sha = commit_dict.get('sha', None)
-        if sha is None:
-            sha = commit_dict.get('id', None)
-        return Commit(
-            sha,
-            commit_dict['message'],
-            commit_dict['author']['name'],
-            commit_dict['author']['email'],
-            commit_dict['distinct'],
-            push
-        )
+        return Commit(push=push, **Commit.values_from_dict(commit_dict))
 
     def __repr__(self):
         """Standard string representation of DB object
@@ -966,6 +1316,10 @@ class Release(db.Model, SearchableMixin, SerializableMixin):
     created_at = sqlalchemy.Column(sqlalchemy.String(60))
     #: Timestamp when the release was published
     published_at = sqlalchemy.Column(sqlalchemy.String(60))
+    #: Time for ordering releases (drafts are not published yet)
+    published_key = sqlalchemy.orm.column_property(
+        sqlalchemy.func.coalesce(published_at, created_at)
+    )
     #: URL to release page
     url = sqlalchemy.Column(sqlalchemy.UnicodeText())
     #: Flag if it's just a prerelease
@@ -992,6 +1346,13 @@ class Release(db.Model, SearchableMixin, SerializableMixin):
     repository = sqlalchemy.orm.relationship(
         'Repository', back_populates='releases'
     )
+    __table_args__ = (
+        sqlalchemy.Index('ix_Release_repository_id_published_key',
+                         repository_id,
+                         sqlalchemy.func.coalesce(published_at,
+                                                  created_at).desc(),
+                         id.desc()),
+    )
 
     def __init__(self, github_id, tag_name, created_at, published_at, url,
                  prerelease, draft, name, body, author_id, author_login,
@@ -1052,13 +1413,214 @@ class Release(db.Model, SearchableMixin, SerializableMixin):
         )
 
 
+#: Number of pushes of repository (deferred)
+Repository.pushes_count = sqlalchemy.orm.column_property(
+    sqlalchemy.select([sqlalchemy.func.count(Push.id)]).where(
+        Push.repository_id == Repository.id
+    ).correlate_except(Push).label('pushes_count'),
+    deferred=True, group='counts'
+)
+#: Number of releases of repository (deferred)
+Repository.releases_count = sqlalchemy.orm.column_property(
+    sqlalchemy.select([sqlalchemy.func.count(Release.id)]).where(
+        Release.repository_id == Repository.id
+    ).correlate_except(Release).label('releases_count'),
+    deferred=True, group='counts'
+)
+
+
+class WebhookDelivery(db.Model):
+    """Log of processed GitHub webhook deliveries (for idempotency)"""
+    __tablename__ = 'WebhookDelivery'
+
+    #: Unique identifier of the log record
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True)
+    #: GitHub delivery ID (X-GitHub-Delivery header)
+    delivery_id = sqlalchemy.Column(sqlalchemy.String(64), unique=True)
+    #: GitHub event name
+    event = sqlalchemy.Column(sqlalchemy.String(40))
+    #: Timestamp (UTC) when the delivery was received
+    received_at = sqlalchemy.Column(sqlalchemy.DateTime, index=True)
+
+    def __init__(self, delivery_id, event, received_at=None):
+        self.delivery_id = delivery_id
+        self.event = event
+        self.received_at = received_at or datetime.datetime.utcnow()
+
+    @staticmethod
+    def register(session, delivery_id, event):
+        """Register delivery if it was not registered before
+
+        Lookup uses unique index of delivery ID, concurrent duplicate
+        will fail on commit due to unique constraint.
+
+        :param session: Database session
+        :type session: ``sqlalchemy.orm.Session``
+        :param delivery_id: GitHub delivery ID
+        :type delivery_id: str
+        :param event: GitHub event name
+        :type event: str
+        :return: False if it is duplicate delivery, True otherwise
+        :rtype: bool
+        """
+        if not delivery_id:
+            return True
+        if WebhookDelivery.registered(session, delivery_id):
+            return False
+        session.add(WebhookDelivery(delivery_id, event))
+        return True
+
+    @staticmethod
+    def registered(session, delivery_id):
+        """Check if delivery is already registered (committed or pending)
+
+        :param session: Database session
+        :type session: ``sqlalchemy.orm.Session``
+        :param delivery_id: GitHub delivery ID
+        :type delivery_id: str
+        :return: If the delivery is in log
+        :rtype: bool
+        """
+        return session.query(WebhookDelivery.id).filter_by(
+            delivery_id=delivery_id
+        ).first() is not None
+
+    @staticmethod
+    def prune(session, retention_days):
+        """Delete log records older than retention period
+
+        :param session: Database session
+        :type session: ``sqlalchemy.orm.Session``
+        :param retention_days: Number of days to keep records
+        :type retention_days: int
+        :return: Number of deleted records
+        :rtype: int
+        """
+        limit = datetime.datetime.utcnow() - \
+            datetime.timedelta(days=retention_days)
+        return session.query(WebhookDelivery).filter(
+            WebhookDelivery.received_at < limit
+        ).delete(synchronize_session=False)
+
+    def __repr__(self):
+        """Standard string representation of DB object
+
+        :return: Unique string representation
+        :rtype: str
+        """
+        return '<GH Delivery {} (#{})>'.format(
+            self.delivery_id, self.id
+        )
+
+
+class RepositorySyncState(db.Model):
+    """State of synchronization of repository with GitHub events feed
+
+    Cursor (the newest processed event) is used to fetch only new events
+    and ETag of the feed to ask GitHub if anything changed at all. It is
+    kept apart from repository so sync does not change its revision.
+    """
+    __tablename__ = 'RepositorySyncState'
+
+    #: ID of the synchronized repository
+    repository_id = sqlalchemy.Column(
+        sqlalchemy.Integer,
+        sqlalchemy.ForeignKey('Repository.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    #: GitHub ID of the newest processed event
+    event_id = sqlalchemy.Column(sqlalchemy.String(40))
+    #: Time of the newest processed event (UTC)
+    event_at = sqlalchemy.Column(sqlalchemy.DateTime)
+    #: ETag of the first page of events feed
+    events_etag = sqlalchemy.Column(sqlalchemy.String(255))
+    #: Time when repository was last verified at GitHub (UTC)
+    metadata_at = sqlalchemy.Column(sqlalchemy.DateTime)
+    #: Time of the last synchronization (UTC)
+    synced_at = sqlalchemy.Column(sqlalchemy.DateTime)
+
+    def __init__(self, repository_id):
+        self.repository_id = repository_id
+
+    @staticmethod
+    def of(session, repo):
+        """Get sync state of repository (new one is added if missing)
+
+        :param session: Database session
+        :type session: ``sqlalchemy.orm.Session``
+        :param repo: Synchronized repository
+        :type repo: ``repocribro.models.Repository``
+        :return: Sync state of the repository
+        :rtype: ``repocribro.models.RepositorySyncState``
+        """
+        state = session.query(RepositorySyncState).get(repo.id)
+        if state is None:
+            state = RepositorySyncState(repo.id)
+            session.add(state)
+        return state
+
+    def metadata_fresh(self, ttl, now=None):
+        """Check if repository was verified at GitHub recently
+
+        :param ttl: Number of seconds the verification is valid
+        :type ttl: int
+        :param now: Actual time (UTC, now if None)
+        :type now: ``datetime.datetime``
+        :return: If verification is still valid
+        :rtype: bool
+        """
+        if self.metadata_at is None or ttl <= 0:
+            return False
+        now = now or datetime.datetime.utcnow()
+        return now - self.metadata_at < datetime.timedelta(seconds=ttl)
+
+    def advance(self, event_id=None, event_at=None, etag=None):
+        """Move the cursor after synchronization
+
+        :param event_id: GitHub ID of the newest event (None if no new)
+        :type event_id: str
+        :param event_at: Time of the newest event (UTC)
+        :type event_at: ``datetime.datetime``
+        :param etag: ETag of the events feed (None to keep)
+        :type etag: str
+        """
+        if event_id is not None:
+            self.event_id = str(event_id)
+            self.event_at = event_at
+        if etag is not None:
+            self.events_etag = etag
+        self.synced_at = datetime.datetime.utcnow()
+
+    def __repr__(self):
+        """Standard string representation of DB object
+
+        :return: Unique string representation
+        :rtype: str
+        """
+        return '<GH Sync State of #{} at {}>'.format(
+            self.repository_id, self.event_id
+        )
+
+
 #: List of all model classes for simple including
 all_models = [
     Commit,
     Push,
     Release,
     Repository,
+    RepositorySyncState,
     Role,
     User,
     UserAccount,
+    WebhookDelivery,
+]
+
+#: Models supporting fulltext search
+searchable_models = [
+    Repository,
+    User,
+    Organization,
+    Push,
+    Commit,
+    Release,
 ]
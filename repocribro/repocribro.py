@@ -139,6 +139,11 @@ def create_app(cfg_files=['DEFAULT']):
     ext_master.call('init_blueprints')
     ext_master.call('init_container')
 
+    from .events import EventRegistry
+    gh_events = EventRegistry(ext_master)
+    gh_events.reload()
+    app.container.set_singleton('gh_events', gh_events)
+
     if config.has_option('flask', 'application_root'):
         from werkzeug.serving import run_simple
         from werkzeug.wsgi import DispatcherMiddleware
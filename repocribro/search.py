@@ -0,0 +1,778 @@
+import bisect
+import collections
+import heapq
+import logging
+import math
+import re
+import sqlalchemy
+import sqlite3
+import threading
+import time
+
+
+#: Regex for splitting text to terms
+TOKEN_REGEX = re.compile(r'\w+', re.UNICODE)
+
+#: Logger of search backends (child of the app logger)
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text):
+    """Split text to lowercase terms
+
+    :param text: Text to be split
+    :type text: str
+    :return: Terms of the text
+    :rtype: list of str
+    """
+    return TOKEN_REGEX.findall((text or '').lower())
+
+
+class SearchBackend:
+    """Generic fulltext search backend of searchable models
+
+    Generic backend has no index and filters the query with ``LIKE``
+    across all searchable columns. Subclasses implement index (if any)
+    by overriding :meth:`setup`, :meth:`index`, :meth:`remove`
+    and :meth:`clear`, and ranked search by :meth:`filter_query`.
+    Index is kept up to date by SQLAlchemy mapper events, see
+    ``repocribro.models.SearchableMixin``. Indexes maintained by the
+    database itself (``MANAGED``) are created only by :meth:`reindex`
+    (``reindex`` command), at first use they are just verified (once
+    per process, missing index is not looked up again until reindex).
+
+    :ivar ready: Names of models with prepared index
+    :ivar preparing: Names of models with index being prepared
+    :ivar missing: Names of models with verified missing managed index
+    """
+
+    #: Name of the backend (used in config)
+    NAME = 'like'
+    #: Number of rows loaded at once while reindexing
+    BATCH_SIZE = 500
+    #: If index is maintained by the database (no DDL at first use)
+    MANAGED = False
+
+    def __init__(self):
+        self.ready = set()
+        self.preparing = set()
+        self.missing = set()
+        self.lock = threading.RLock()
+
+    def ensure(self, connection, model):
+        """Prepare index of model (if not prepared yet)
+
+        When index is created by this call, it is filled with
+        existing rows. Managed index is only verified, the result
+        is remembered so missing index is not verified again.
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: If index of model can be used
+        :rtype: bool
+        """
+        if model.__name__ in self.ready:
+            return True
+        with self.lock:
+            if model.__name__ in self.ready or \
+                    model.__name__ in self.preparing:
+                return True
+            if self.MANAGED:
+                if model.__name__ in self.missing:
+                    return False
+                if not self.verify(connection, model):
+                    self.missing.add(model.__name__)
+                    return False
+            else:
+                self.preparing.add(model.__name__)
+                try:
+                    if self.setup(connection, model):
+                        self.index_where(connection, model)
+                finally:
+                    self.preparing.discard(model.__name__)
+            self.ready.add(model.__name__)
+            return True
+
+    def verify(self, connection, model):
+        """Check if managed index of model exists
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: If index exists
+        :rtype: bool
+        """
+        return True
+
+    def setup(self, connection, model):
+        """Create index structures of model
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: If index was created (and should be filled)
+        :rtype: bool
+        """
+        return False
+
+    def index(self, connection, model, rows):
+        """Add or replace rows in index of model
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :param rows: Rows with ``id`` and searchable columns
+        :type rows: list of dict
+        """
+        pass
+
+    def remove(self, connection, model, ids):
+        """Remove rows from index of model
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :param ids: IDs of rows to be removed
+        :type ids: list of int
+        """
+        pass
+
+    def clear(self, connection, model):
+        """Remove all rows from index of model
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        """
+        pass
+
+    def rollback(self, touched):
+        """Revert changes of rolled back transaction in index
+
+        Only index outside the database has to revert changes, the
+        database rolls back the others itself.
+
+        :param touched: IDs of changed rows (None if unknown) by model
+        :type touched: dict of model: set of int
+        """
+        pass
+
+    @staticmethod
+    def query_connection(db_query, model):
+        """Get connection used by the DB query for model
+
+        :param db_query: Database query object
+        :type db_query: ``sqlalchemy.orm.query.Query``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: Connection to the database
+        :rtype: ``sqlalchemy.engine.Connection``
+        """
+        return db_query.session.connection(clause=model.__table__)
+
+    def index_where(self, connection, model, whereclause=None):
+        """Load rows of model from the database and index them
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :param whereclause: Condition for rows (None for all)
+        :type whereclause: ``sqlalchemy.sql.ClauseElement``
+        :return: Number of indexed rows
+        :rtype: int
+        """
+        columns = model.searchable_columns()
+        select = sqlalchemy.select(
+            [model.id] + [getattr(model, col) for col in columns]
+        )
+        mapper = sqlalchemy.inspect(model)
+        if mapper.inherits is not None and mapper.polymorphic_on is not None:
+            select = select.where(
+                mapper.polymorphic_on == mapper.polymorphic_identity
+            )
+        if whereclause is not None:
+            select = select.where(whereclause)
+        result = connection.execute(select)
+        count = 0
+        while True:
+            rows = result.fetchmany(self.BATCH_SIZE)
+            if len(rows) == 0:
+                break
+            self.index(connection, model, [
+                dict(zip(['id'] + columns, row)) for row in rows
+            ])
+            count += len(rows)
+        return count
+
+    def reindex(self, connection, model):
+        """Rebuild whole index of model
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: Number of indexed rows
+        :rtype: int
+        """
+        with self.lock:
+            self.preparing.add(model.__name__)
+            try:
+                self.setup(connection, model)
+                self.clear(connection, model)
+                count = self.index_where(connection, model)
+            finally:
+                self.preparing.discard(model.__name__)
+            self.missing.discard(model.__name__)
+            self.ready.add(model.__name__)
+            return count
+
+    def filter_query(self, model, db_query, query_str):
+        """Filter the DB query by fulltext query (ordered by relevance)
+
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :param db_query: Database query object
+        :type db_query: ``sqlalchemy.orm.query.Query``
+        :param query_str: String to be queried
+        :type query_str: str
+        :return: Query with fulltext filter added
+        :rtype: ``sqlalchemy.orm.query.Query``
+        """
+        query_str = '%{}%'.format(query_str)
+        condition = sqlalchemy.or_(
+            *[getattr(model, col).like(query_str)
+              for col in model.searchable_columns()]
+        )
+        return db_query.filter(condition)
+
+
+class InvertedIndex:
+    """In-process inverted index of single model
+
+    :ivar postings: Term frequencies in rows for each term
+    :ivar rows: Terms of each indexed row
+    :ivar terms: Sorted terms (for prefix lookup, None if outdated)
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.rows = {}
+        self.terms = None
+
+    def add(self, row_id, text):
+        """Add or replace row in the index
+
+        :param row_id: ID of the row
+        :type row_id: int
+        :param text: Searchable text of the row
+        :type text: str
+        """
+        self.remove(row_id)
+        counts = collections.Counter(tokenize(text))
+        for term, count in counts.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                self.terms = None
+            self.postings[term][row_id] = count
+        self.rows[row_id] = list(counts)
+
+    def remove(self, row_id):
+        """Remove row from the index
+
+        :param row_id: ID of the row
+        :type row_id: int
+        """
+        for term in self.rows.pop(row_id, []):
+            del self.postings[term][row_id]
+            if len(self.postings[term]) == 0:
+                del self.postings[term]
+                self.terms = None
+
+    def prefixed(self, prefix):
+        """Get indexed terms starting with prefix
+
+        :param prefix: Prefix of terms
+        :type prefix: str
+        :return: Matching terms
+        :rtype: list of str
+        """
+        if self.terms is None:
+            self.terms = sorted(self.postings)
+        result = []
+        i = bisect.bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            result.append(self.terms[i])
+            i += 1
+        return result
+
+    def search(self, terms, limit=None):
+        """Find rows matching all the terms (as prefixes)
+
+        Rows are scored by sum of TF-IDF of matched terms.
+
+        :param terms: Terms of the query
+        :type terms: list of str
+        :param limit: Maximal number of results (None for all)
+        :type limit: int
+        :return: IDs of matching rows (most relevant first)
+        :rtype: list of int
+        """
+        scores = None
+        for term in terms:
+            matches = {}
+            for indexed_term in self.prefixed(term):
+                postings = self.postings[indexed_term]
+                idf = math.log(1 + len(self.rows) / len(postings))
+                for row_id, count in postings.items():
+                    matches[row_id] = matches.get(row_id, 0) + count * idf
+            if scores is None:
+                scores = matches
+            else:
+                scores = {row_id: scores[row_id] + score
+                          for row_id, score in matches.items()
+                          if row_id in scores}
+        scores = scores or {}
+
+        def rank(row_id):
+            return -scores[row_id], row_id
+        if limit is not None and limit < len(scores):
+            return heapq.nsmallest(limit, scores, key=rank)
+        return sorted(scores, key=rank)
+
+
+class InvertedIndexBackend(SearchBackend):
+    """Pure-Python search backend with in-process inverted index
+
+    Index is built from the database at first use in each process
+    and it is not shared between processes, so changes made by other
+    processes are visible after :meth:`reindex` (or restart). Rows
+    changed by rolled back transaction are reloaded from the database
+    before the next query. Only ``max_results`` best rows are found,
+    cut off results are logged.
+
+    :ivar max_results: Maximal number of ranked results (None for all)
+    :ivar indexes: Inverted index of each model
+    :ivar stale: IDs of rows to be reloaded by model name
+    """
+
+    NAME = 'memory'
+    #: Default maximal number of ranked results of single query
+    MAX_RESULTS = 1000
+
+    def __init__(self, max_results=MAX_RESULTS):
+        super().__init__()
+        self.max_results = max_results
+        self.indexes = {}
+        self.stale = {}
+
+    def setup(self, connection, model):
+        with self.lock:
+            self.indexes[model.__name__] = InvertedIndex()
+        return True
+
+    def index(self, connection, model, rows):
+        self.ensure(connection, model)
+        columns = model.searchable_columns()
+        with self.lock:
+            index = self.indexes[model.__name__]
+            for row in rows:
+                index.add(row['id'], ' '.join(
+                    str(row[col]) for col in columns if row[col] is not None
+                ))
+
+    def remove(self, connection, model, ids):
+        with self.lock:
+            index = self.indexes.get(model.__name__, None)
+            if index is not None:
+                for row_id in ids:
+                    index.remove(row_id)
+
+    def clear(self, connection, model):
+        with self.lock:
+            self.indexes[model.__name__] = InvertedIndex()
+            self.stale.pop(model.__name__, None)
+
+    def rollback(self, touched):
+        with self.lock:
+            for model, ids in touched.items():
+                if ids is None:
+                    # unknown rows, whole index is rebuilt at next use
+                    self.ready.discard(model.__name__)
+                    self.stale.pop(model.__name__, None)
+                elif model.__name__ in self.ready:
+                    self.stale.setdefault(model.__name__, set()).update(ids)
+
+    def refresh(self, connection, model):
+        """Reload stale rows of model from the database
+
+        :param connection: Connection to the database
+        :type connection: ``sqlalchemy.engine.Connection``
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        """
+        with self.lock:
+            ids = sorted(self.stale.pop(model.__name__, ()))
+            for i in range(0, len(ids), self.BATCH_SIZE):
+                batch = ids[i:i + self.BATCH_SIZE]
+                self.remove(connection, model, batch)
+                self.index_where(connection, model, model.id.in_(batch))
+
+    def filter_query(self, model, db_query, query_str):
+        connection = self.query_connection(db_query, model)
+        self.ensure(connection, model)
+        self.refresh(connection, model)
+        limit = None
+        if self.max_results is not None:
+            # one more to find out if results are cut off
+            limit = self.max_results + 1
+        with self.lock:
+            ids = self.indexes[model.__name__].search(
+                tokenize(query_str), limit
+            )
+        if limit is not None and len(ids) == limit:
+            ids = ids[:self.max_results]
+            logger.warning('Search of {} for "{}" has more than {} results, '
+                           'only the best are used'.format(
+                               model.__name__, query_str, self.max_results
+                           ))
+        if len(ids) == 0:
+            return db_query.filter(sqlalchemy.false())
+        ranking = sqlalchemy.case(
+            {row_id: rank for rank, row_id in enumerate(ids)},
+            value=model.id
+        )
+        return db_query.filter(model.id.in_(ids)).order_by(ranking)
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Search backend using SQLite FTS5 virtual tables
+
+    Each model has its own FTS5 table with ``rowid`` same as
+    ID of the row, results are ranked by BM25. Tables are created
+    only by ``reindex`` command (not within flush of a session),
+    until then ``LIKE`` is used and changes are not indexed.
+    """
+
+    NAME = 'fts5'
+    MANAGED = True
+
+    @staticmethod
+    def table_name(model):
+        """Get name of FTS5 table for model
+
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: Name of the FTS5 table
+        :rtype: str
+        """
+        return '{}_fts'.format(model.__name__)
+
+    @staticmethod
+    def match_query(query_str):
+        """Make FTS5 query matching all terms as prefixes
+
+        :param query_str: String to be queried
+        :type query_str: str
+        :return: FTS5 query
+        :rtype: str
+        """
+        return ' '.join('"{}"*'.format(term) for term in tokenize(query_str))
+
+    def verify(self, connection, model):
+        return connection.execute(
+            'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+            ('table', self.table_name(model))
+        ).first() is not None
+
+    def setup(self, connection, model):
+        if not self.verify(connection, model):
+            connection.execute(
+                'CREATE VIRTUAL TABLE "{}" USING fts5({}, '
+                'prefix=\'2 3\')'.format(
+                    self.table_name(model),
+                    ', '.join(model.searchable_columns())
+                )
+            )
+        return False
+
+    def index(self, connection, model, rows):
+        if not self.ensure(connection, model) or len(rows) == 0:
+            return
+        self.remove(connection, model, [row['id'] for row in rows])
+        columns = model.searchable_columns()
+        connection.execute(
+            'INSERT INTO "{}" (rowid, {}) VALUES (?{})'.format(
+                self.table_name(model), ', '.join(columns),
+                ', ?' * len(columns)
+            ),
+            [tuple([row['id']] + [row[col] for col in columns])
+             for row in rows]
+        )
+
+    def remove(self, connection, model, ids):
+        if not self.ensure(connection, model) or len(ids) == 0:
+            return
+        connection.execute(
+            'DELETE FROM "{}" WHERE rowid = ?'.format(self.table_name(model)),
+            [(row_id,) for row_id in ids]
+        )
+
+    def clear(self, connection, model):
+        connection.execute('DELETE FROM "{}"'.format(self.table_name(model)))
+
+    def filter_query(self, model, db_query, query_str):
+        if not self.ensure(self.query_connection(db_query, model), model):
+            return super().filter_query(model, db_query, query_str)
+        match = self.match_query(query_str)
+        if match == '':
+            return db_query.filter(sqlalchemy.false())
+        name = self.table_name(model)
+        fts = sqlalchemy.table(name, sqlalchemy.column('rowid'),
+                               sqlalchemy.column('rank'))
+        return db_query.join(fts, fts.c.rowid == model.id).filter(
+            sqlalchemy.text('"{}" MATCH :fts_query'.format(name))
+        ).params(fts_query=match).order_by(fts.c.rank)
+
+
+class MySQLFulltextBackend(SearchBackend):
+    """Search backend using MySQL FULLTEXT indexes
+
+    Index is maintained by the database itself, results are ranked
+    by relevance from ``MATCH ... AGAINST`` in boolean mode. Until
+    the index is created by ``reindex`` command, ``LIKE`` is used.
+    """
+
+    NAME = 'mysql'
+    MANAGED = True
+
+    @staticmethod
+    def index_name(model):
+        """Get name of FULLTEXT index for model
+
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: Name of the index
+        :rtype: str
+        """
+        return 'ft_{}'.format(model.__name__)
+
+    def verify(self, connection, model):
+        return connection.execute(
+            'SELECT 1 FROM information_schema.statistics '
+            'WHERE table_schema = DATABASE() AND table_name = %s '
+            'AND index_name = %s',
+            (model.__tablename__, self.index_name(model))
+        ).first() is not None
+
+    def setup(self, connection, model):
+        if not self.verify(connection, model):
+            columns = ', '.join(
+                '`{}`'.format(col) for col in model.searchable_columns()
+            )
+            connection.execute(
+                'CREATE FULLTEXT INDEX `{}` ON `{}` ({})'.format(
+                    self.index_name(model), model.__tablename__, columns
+                )
+            )
+        return False
+
+    def filter_query(self, model, db_query, query_str):
+        if not self.ensure(self.query_connection(db_query, model), model):
+            return super().filter_query(model, db_query, query_str)
+        terms = tokenize(query_str)
+        if len(terms) == 0:
+            return db_query.filter(sqlalchemy.false())
+        match = sqlalchemy.text(
+            'MATCH ({}) AGAINST (:ft_query IN BOOLEAN MODE)'.format(', '.join(
+                '`{}`.`{}`'.format(model.__tablename__, col)
+                for col in model.searchable_columns()
+            ))
+        )
+        return db_query.filter(match).order_by(match.desc()).params(
+            ft_query=' '.join('+{}*'.format(term) for term in terms)
+        )
+
+
+class PostgreSQLBackend(SearchBackend):
+    """Search backend using PostgreSQL ``tsvector`` with GIN index
+
+    Index is expression index maintained by the database itself,
+    results are ranked by ``ts_rank``. Until the index is created by
+    ``reindex`` command, ``LIKE`` is used.
+    """
+
+    NAME = 'postgresql'
+    MANAGED = True
+    #: Text search configuration
+    CONFIG = 'simple'
+
+    def vector(self, model):
+        """Get SQL expression of ``tsvector`` for model
+
+        :param model: Searchable model
+        :type model: ``repocribro.models.SearchableMixin``
+        :return: SQL expression
+        :rtype: str
+        """
+        columns = ' || \' \' || '.join(
+            'coalesce("{}"."{}", \'\')'.format(model.__tablename__, col)
+            for col in model.searchable_columns()
+        )
+        return 'to_tsvector(\'{}\', {})'.format(self.CONFIG, columns)
+
+    def verify(self, connection, model):
+        return connection.execute(
+            'SELECT 1 FROM pg_indexes WHERE tablename = %s '
+            'AND indexname = %s',
+            (model.__tablename__, 'ft_{}'.format(model.__name__))
+        ).first() is not None
+
+    def setup(self, connection, model):
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS "ft_{}" ON "{}" USING gin ({})'.format(
+                model.__name__, model.__tablename__, self.vector(model)
+            )
+        )
+        return False
+
+    def filter_query(self, model, db_query, query_str):
+        if not self.ensure(self.query_connection(db_query, model), model):
+            return super().filter_query(model, db_query, query_str)
+        terms = tokenize(query_str)
+        if len(terms) == 0:
+            return db_query.filter(sqlalchemy.false())
+        tsquery = 'to_tsquery(\'{}\', :ts_query)'.format(self.CONFIG)
+        condition = sqlalchemy.text('{} @@ {}'.format(
+            self.vector(model), tsquery
+        ))
+        rank = sqlalchemy.text('ts_rank({}, {})'.format(
+            self.vector(model), tsquery
+        ))
+        return db_query.filter(condition).order_by(rank.desc()).params(
+            ts_query=' & '.join('{}:*'.format(term) for term in terms)
+        )
+
+
+class SearchResultsCache:
+    """In-process LRU cache of search results
+
+    Entries are invalidated as whole when searchable data are changed
+    (see ``repocribro.models.SearchableMixin``) and expire after TTL
+    (for changes made by other processes). Results computed while
+    data were changing (generation changed) are not stored.
+
+    :ivar size: Maximal number of entries (0 disables the cache)
+    :ivar ttl: Seconds after which entries expire (0 for no expiration)
+    :ivar entries: Cached entries (expiration, value) in LRU order
+    :ivar generation: Counter of invalidations
+    """
+
+    def __init__(self, size=1000, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Get cached value
+
+        :param key: Key of the entry (e.g. query, filters and page)
+        :type key: tuple
+        :return: Cached value or None
+        """
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                return None
+            if entry[0] is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, generation):
+        """Store value to the cache
+
+        :param key: Key of the entry (e.g. query, filters and page)
+        :type key: tuple
+        :param value: Value to be stored
+        :param generation: Generation read before computing the value
+        :type generation: int
+        """
+        expiration = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self.lock:
+            if self.size <= 0 or generation != self.generation:
+                return
+            self.entries[key] = (expiration, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Remove all the entries from the cache"""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+#: Available search backends by name
+SEARCH_BACKENDS = {
+    backend.NAME: backend for backend in (
+        SearchBackend, InvertedIndexBackend, SQLiteFTS5Backend,
+        MySQLFulltextBackend, PostgreSQLBackend
+    )
+}
+
+
+def sqlite_has_fts5():
+    """Check if SQLite library supports FTS5
+
+    :return: If FTS5 virtual tables can be created
+    :rtype: bool
+    """
+    try:
+        sqlite3.connect(':memory:').execute(
+            'CREATE VIRTUAL TABLE fts5_check USING fts5(content)'
+        )
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def make_search_backend(name, db_uri,
+                        max_results=InvertedIndexBackend.MAX_RESULTS):
+    """Create search backend from config specification
+
+    :param name: Name of backend or ``auto`` (by database dialect)
+    :type name: str
+    :param db_uri: URI of the database
+    :type db_uri: str
+    :param max_results: Maximal number of results ranked in process
+    :type max_results: int
+    :return: Search backend
+    :rtype: ``repocribro.search.SearchBackend``
+    :raises ValueError: If backend is unknown
+    """
+    name = name.strip().lower()
+    if name == 'auto':
+        dialect = sqlalchemy.engine.url.make_url(db_uri).get_backend_name()
+        if dialect == 'sqlite':
+            name = 'fts5' if sqlite_has_fts5() else 'memory'
+        elif dialect in ('mysql', 'postgresql'):
+            name = dialect
+        else:
+            name = 'memory'
+    if name not in SEARCH_BACKENDS:
+        raise ValueError('Unknown search backend: {}'.format(name))
+    if name == InvertedIndexBackend.NAME:
+        return InvertedIndexBackend(max_results)
+    return SEARCH_BACKENDS[name]()
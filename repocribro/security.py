@@ -1,13 +1,118 @@
+import collections
 import flask
 import flask_login
 import flask_principal
+import sqlalchemy
+import threading
+import time
 
 from .models import UserAccount, Anonymous, Role
 
+#: Security data of user account stored in cache
+AccountEntry = collections.namedtuple(
+    'AccountEntry', ['active', 'role_ids', 'rolenames', 'privileges',
+                     'revision']
+)
+
+
+class AccountCache:
+    """Short-lived cache of security data of user accounts
+
+    Entries contain active flag, roles and resolved privileges of
+    account, so identity is loaded without querying roles. Entries
+    should be invalidated when account or its roles are changed, other
+    processes find the change by security revision of the account
+    (checked when account is loaded) and drop the stale entry.
+
+    :ivar size: Maximal number of accounts (0 turns cache off)
+    :ivar ttl: Seconds after which entries expire
+    :ivar entries: Cached entries (expiration, entry) in LRU order
+    """
+
+    def __init__(self, size=1000, ttl=30):
+        self.size = size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, account_id):
+        """Get cached entry of account
+
+        :param account_id: ID of user account
+        :type account_id: int
+        :return: Cached entry or None
+        :rtype: ``repocribro.security.AccountEntry``
+        """
+        with self.lock:
+            item = self.entries.get(account_id, None)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self.entries[account_id]
+                return None
+            self.entries.move_to_end(account_id)
+            return item[1]
+
+    def store(self, account):
+        """Make entry of account and store it to the cache
+
+        :param account: User account (with loaded roles)
+        :type account: ``repocribro.models.UserAccount``
+        :return: Entry of the account
+        :rtype: ``repocribro.security.AccountEntry``
+        """
+        roles = list(account.roles)
+        entry = AccountEntry(
+            account.active,
+            frozenset(role.id for role in roles),
+            tuple(role.name for role in roles),
+            permissions.resolve_privileges(roles),
+            account.security_revision
+        )
+        if self.size <= 0:
+            return entry
+        with self.lock:
+            self.entries[account.id] = (time.monotonic() + self.ttl, entry)
+            self.entries.move_to_end(account.id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, account_id):
+        """Remove entry of the account
+
+        :param account_id: ID of user account
+        :type account_id: int
+        """
+        with self.lock:
+            self.entries.pop(account_id, None)
+
+    def invalidate_role(self, role_id):
+        """Remove entries of all accounts with the role
+
+        :param role_id: ID of role
+        :type role_id: int
+        """
+        with self.lock:
+            for account_id in [account_id for account_id, item
+                               in self.entries.items()
+                               if role_id in item[1].role_ids]:
+                del self.entries[account_id]
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self.lock:
+            self.entries.clear()
+
 
 def init_login_manager(db):
     """Init security extensions (login manager and principal)
 
+    Accounts are loaded with their roles by single query, security data
+    are then kept in ``account_cache`` service (if configured) until
+    security revision of account is changed (e.g. by other process).
+    Inactive (banned) accounts are not loaded.
+
     :param db: Database which stores user accounts and roles
     :type db: ``flask_sqlalchemy.SQLAlchemy``
     :return: Login manager and principal extensions
@@ -23,7 +128,25 @@ def init_login_manager(db):
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.query(UserAccount).get(int(user_id))
+        account_id = int(user_id)
+        cache = flask.current_app.container.get('account_cache')
+        entry = None if cache is None else cache.get(account_id)
+        query = db.session.query(UserAccount)
+        if entry is None:
+            query = query.options(
+                sqlalchemy.orm.joinedload(UserAccount.roles)
+            )
+        account = query.get(account_id)
+        if account is None or not account.active:
+            return None
+        if entry is not None and \
+                entry.revision != account.security_revision:
+            cache.invalidate(account.id)
+            entry = None
+        if entry is None and cache is not None:
+            entry = cache.store(account)
+        flask.g.account_entry = (account.id, entry)
+        return account
 
     @principals.identity_loader
     def identity_loader():
@@ -33,22 +156,102 @@ def init_login_manager(db):
 
 
 class PermissionsContainer:
-    """Container for permission to be used for decorators"""
+    """Container for permission to be used for decorators
+
+    Permission of each name is created just once (interned) and always
+    requires the need of its name, so it can be used in decorators
+    before the name is registered (e.g. extension modules imported
+    before ``init_security``).
+
+    :ivar x_name: Name of the container
+    :ivar x_need: Type of needs (e.g. ``flask_principal.ActionNeed``)
+    :ivar x_dict: Needs of registered names
+    :ivar x_permissions: Interned permissions by name
+    :ivar x_needs: Memoized sets of needs for bulk checks
+    """
 
-    def __init__(self, name):
+    def __init__(self, name, need=flask_principal.ActionNeed):
         self.x_name = name
+        self.x_need = need
         self.x_dict = dict()
+        self.x_permissions = dict()
+        self.x_needs = dict()
 
     def __getattr__(self, key):
-        return flask_principal.Permission(*self.x_dict.get(key, []))
+        if key.startswith('x_') or key.startswith('__'):
+            raise AttributeError(key)
+        permission = flask_principal.Permission(self.x_need(key))
+        self.x_permissions[key] = permission
+        # next access is plain attribute lookup
+        setattr(self, key, permission)
+        return permission
+
+    def x_register(self, key):
+        """Register name within the container
+
+        :param key: Name to register
+        :type key: str
+        """
+        self.x_dict[key] = (self.x_need(key),)
+
+    def x_allowed(self, keys, identity=None):
+        """Filter names which are permitted for the identity
+
+        :param keys: Names to be checked
+        :type keys: iterable of str
+        :param identity: Identity (current one by default)
+        :type identity: ``flask_principal.Identity``
+        :return: Permitted names
+        :rtype: set of str
+        """
+        if identity is None:
+            identity = flask.g.get('identity', None)
+        if identity is None:
+            return set()
+        provides = identity.provides
+        return {key for key in keys if self.x_need(key) in provides}
+
+    def x_any_of(self, keys, identity=None):
+        """Check if identity is permitted for any of the names
+
+        Single check for all the names (e.g. whether to show menu)
+        instead of evaluating permission of each of them.
+
+        :param keys: Names to be checked
+        :type keys: iterable of str
+        :param identity: Identity (current one by default)
+        :type identity: ``flask_principal.Identity``
+        :return: If any of names is permitted
+        :rtype: bool
+        """
+        if identity is None:
+            identity = flask.g.get('identity', None)
+        if identity is None:
+            return False
+        keys = tuple(keys)
+        needs = self.x_needs.get(keys, None)
+        if needs is None:
+            needs = frozenset(self.x_need(key) for key in keys)
+            self.x_needs[keys] = needs
+        return not needs.isdisjoint(identity.provides)
 
 
 class Permissions:
-    """Class for prividing various permissions"""
+    """Class for prividing various permissions
+
+    :ivar version: Version of registry (changed by registrations)
+    :ivar resolved: Memoized privileges by roles and version
+    """
+
+    #: Maximal number of memoized sets of privileges
+    RESOLVED_SIZE = 1024
 
     def __init__(self):
-        self.roles = PermissionsContainer('roles')
-        self.actions = PermissionsContainer('actions')
+        self.roles = PermissionsContainer('roles', flask_principal.RoleNeed)
+        self.actions = PermissionsContainer('actions',
+                                            flask_principal.ActionNeed)
+        self.version = 0
+        self.resolved = {}
 
     def register_role(self, role_name):
         """Register new role by name
@@ -56,8 +259,8 @@ class Permissions:
         :param role_name: name of role to register
         :type role_name: str
         """
-        self.roles.x_dict[role_name] = \
-            (flask_principal.RoleNeed(role_name),)
+        self.roles.x_register(role_name)
+        self.version += 1
 
     def register_action(self, priv_name):
         """Register new action privilege by name
@@ -65,8 +268,69 @@ class Permissions:
         :param priv_name: name of action privilege to register
         :type priv_name: str
         """
-        self.actions.x_dict[priv_name] = \
-            (flask_principal.ActionNeed(priv_name),)
+        self.actions.x_register(priv_name)
+        self.version += 1
+
+    def allowed_actions(self, *names, identity=None):
+        """Filter actions which are permitted for the identity
+
+        :param names: Names of actions to be checked
+        :type names: str
+        :param identity: Identity (current one by default)
+        :type identity: ``flask_principal.Identity``
+        :return: Permitted actions
+        :rtype: set of str
+        """
+        return self.actions.x_allowed(names, identity)
+
+    def any_action(self, *names, identity=None):
+        """Check if any of the actions is permitted (e.g. for menus)
+
+        :param names: Names of actions to be checked
+        :type names: str
+        :param identity: Identity (current one by default)
+        :type identity: ``flask_principal.Identity``
+        :return: If any of actions is permitted
+        :rtype: bool
+        """
+        return self.actions.x_any_of(names, identity)
+
+    def any_role(self, *names, identity=None):
+        """Check if identity has any of the roles
+
+        :param names: Names of roles to be checked
+        :type names: str
+        :param identity: Identity (current one by default)
+        :type identity: ``flask_principal.Identity``
+        :return: If identity has any of roles
+        :rtype: bool
+        """
+        return self.roles.x_any_of(names, identity)
+
+    def resolve_privileges(self, roles):
+        """Get action privileges permitted by any of the roles
+
+        Result is memoized for the set of roles (names and privileges)
+        and version of registry, so it is computed only once until
+        roles are edited or new action is registered.
+
+        :param roles: Roles of the user
+        :type roles: list of ``repocribro.models.RoleMixin``
+        :return: Names of permitted actions
+        :rtype: frozenset of str
+        """
+        key = (frozenset((role.name, role.privileges) for role in roles),
+               self.version)
+        privileges = self.resolved.get(key, None)
+        if privileges is None:
+            privileges = frozenset(
+                action for action in self.actions.x_dict
+                if any(role.permits(action) for role in roles)
+            )
+            if len(self.resolved) >= self.RESOLVED_SIZE:
+                self.resolved.clear()
+            self.resolved[key] = privileges
+        return privileges
 
     @property
     def all_roles(self):
@@ -95,6 +359,7 @@ def login(user_account):
     :param user_account: User account to be logged in
     :type user_account: ``repocribro.models.UserAccount``
     """
+    invalidate_account(user_account)
     flask_login.login_user(user_account)
     flask_principal.identity_changed.send(
         flask_principal.current_app._get_current_object(),
@@ -104,6 +369,8 @@ def login(user_account):
 
 def logout():
     """Logout the current user from the app"""
+    invalidate_account(flask_login.current_user)
+    flask.g.pop('account_entry', None)
     flask_login.logout_user()
     clear_session('identity.name', 'identity.auth_type')
     flask_principal.identity_changed.send(
@@ -112,6 +379,26 @@ def logout():
     )
 
 
+def invalidate_account(account=None, role=None):
+    """Invalidate cached security data of the account(s)
+
+    Must be called when account is banned, deleted or its roles are
+    changed, so change takes effect immediately.
+
+    :param account: Changed user account
+    :type account: ``repocribro.models.UserAccount``
+    :param role: Changed role (all its accounts are invalidated)
+    :type role: ``repocribro.models.Role``
+    """
+    cache = flask.current_app.container.get('account_cache')
+    if cache is None:
+        return
+    if account is not None and getattr(account, 'id', None) is not None:
+        cache.invalidate(account.id)
+    if role is not None and role.id is not None:
+        cache.invalidate_role(role.id)
+
+
 def clear_session(*args):
     """Simple helper for clearing variables from session
 
@@ -198,12 +485,15 @@ def on_identity_loaded(sender, identity):
             flask_principal.UserNeed(flask_login.current_user.id)
         )
 
-    if hasattr(user, 'roles'):
-        for role in user.roles:
-            identity.provides.add(
-                flask_principal.RoleNeed(role.name)
-            )
-        for priviledge in user.privileges(permissions.all_actions):
-            identity.provides.add(
-                flask_principal.ActionNeed(priviledge)
-            )
+    account_id, entry = flask.g.get('account_entry', (None, None))
+    if entry is not None and account_id == getattr(user, 'id', None):
+        rolenames, privileges = entry.rolenames, entry.privileges
+    elif hasattr(user, 'roles'):
+        rolenames = [role.name for role in user.roles]
+        privileges = permissions.resolve_privileges(user.roles)
+    else:
+        return
+    for rolename in rolenames:
+        identity.provides.add(flask_principal.RoleNeed(rolename))
+    for priviledge in privileges:
+        identity.provides.add(flask_principal.ActionNeed(priviledge))
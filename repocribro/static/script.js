@@ -1 +1,16 @@
-
+$(function () {
+    // load content of lazy tabs when shown for the first time
+    $('a[data-toggle="tab"]').on('shown.bs.tab', function (event) {
+        var pane = $($(event.target).attr('href'));
+        var url = pane.data('fragment-url');
+        if (!url || pane.data('fragment-loaded')) {
+            return;
+        }
+        pane.data('fragment-loaded', true);
+        fetch(url, {credentials: 'same-origin'}).then(function (response) {
+            return response.text();
+        }).then(function (html) {
+            pane.html(html);
+        });
+    });
+});
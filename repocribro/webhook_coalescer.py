@@ -0,0 +1,207 @@
+import collections
+import threading
+import time
+
+
+class WebhookCoalescer:
+    """Coalescing stage of incoming webhook deliveries
+
+    Verified deliveries are grouped by repository for ``window``
+    seconds and then each group is processed at once (within single
+    transaction) by background thread, so burst of deliveries for the
+    same repository (e.g. mass rebase or CI bot) updates it just once.
+    When the group fails, its deliveries are retried one by one, so
+    single broken delivery does not discard the others. Deliveries log
+    is pruned by the same thread after each ``prune_every`` transactions.
+    Number of pending deliveries is bounded, when the limit is reached
+    new deliveries are rejected and the web application should shed
+    them with 503 and ``Retry-After``.
+
+    :ivar process: Function processing deliveries of single repository
+    :ivar window: Seconds to collect deliveries before processing
+    :ivar max_pending: Maximal number of pending deliveries
+    :ivar retry_after: Seconds GitHub should wait when rejected
+    :ivar prune: Function pruning deliveries log (optional)
+    :ivar prune_every: Number of transactions between prunings
+    :ivar groups: Pending deliveries by repository (GitHub ID)
+    """
+
+    def __init__(self, process, window=0.5, max_pending=1000,
+                 retry_after=5, background=True, prune=None,
+                 prune_every=100):
+        self.process = process
+        self.window = window
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.background = background
+        self.prune = prune
+        self.prune_every = prune_every
+        self.pruned_at = 0
+        self.groups = collections.OrderedDict()
+        self.pending = 0
+        self.deliveries = 0
+        self.transactions = 0
+        self.errors = 0
+        self.shed = 0
+        self.stopping = False
+        self.thread = None
+        self.lock = threading.Condition()
+        self.flush_lock = threading.Lock()
+
+    def __len__(self):
+        return self.pending
+
+    def push(self, repo_id, delivery_id, event, data):
+        """Add verified delivery to group of its repository
+
+        :param repo_id: GitHub ID of repository of the delivery
+        :type repo_id: int
+        :param delivery_id: GitHub delivery ID
+        :type delivery_id: str
+        :param event: GitHub event name
+        :type event: str
+        :param data: Payload of the delivery
+        :type data: dict
+        :return: False if delivery was rejected due to overload
+        :rtype: bool
+        """
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.shed += 1
+                return False
+            self.groups.setdefault(repo_id, []).append(
+                (delivery_id, event, data)
+            )
+            self.pending += 1
+            if self.background:
+                self._start()
+                self.lock.notify()
+        return True
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(
+                target=self._run, name='webhook-coalescer', daemon=True
+            )
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.groups and not self.stopping:
+                    self.lock.wait()
+                if self.stopping:
+                    return
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        """Process all pending deliveries (group by group)
+
+        Failing group does not stop others, its deliveries are then
+        processed one by one and each failing delivery is counted as
+        error. Processing function is responsible for rollback.
+
+        :return: Number of processed groups
+        :rtype: int
+        """
+        with self.flush_lock:
+            with self.lock:
+                groups = self.groups
+                self.groups = collections.OrderedDict()
+            for repo_id, deliveries in groups.items():
+                transactions, failed = 1, 0
+                try:
+                    self.process(repo_id, deliveries)
+                except Exception:
+                    if len(deliveries) == 1:
+                        failed = 1
+                    else:
+                        transactions, failed = self._process_each(
+                            repo_id, deliveries
+                        )
+                        transactions += 1
+                with self.lock:
+                    self.pending -= len(deliveries)
+                    self.deliveries += len(deliveries)
+                    self.transactions += transactions
+                    self.errors += failed
+            self._prune()
+            return len(groups)
+
+    def _process_each(self, repo_id, deliveries):
+        """Process deliveries of failed group separately
+
+        :param repo_id: GitHub ID of repository of the deliveries
+        :type repo_id: int
+        :param deliveries: Deliveries (delivery ID, event, payload)
+        :type deliveries: list of tuple
+        :return: Number of transactions and failed deliveries
+        :rtype: tuple of int
+        """
+        failed = 0
+        for delivery in deliveries:
+            try:
+                self.process(repo_id, [delivery])
+            except Exception:
+                failed += 1
+        return len(deliveries), failed
+
+    def _prune(self):
+        """Prune deliveries log if enough transactions passed"""
+        if self.prune is None:
+            return
+        with self.lock:
+            if self.transactions - self.pruned_at < self.prune_every:
+                return
+            self.pruned_at = self.transactions
+        try:
+            self.prune()
+        except Exception:
+            pass  # pruning function is responsible for reporting
+
+    def stop(self):
+        """Stop background thread and process what is pending"""
+        with self.lock:
+            self.stopping = True
+            self.lock.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    @property
+    def ratio(self):
+        """Average number of deliveries processed in one transaction
+
+        :return: Coalescing ratio (0 if nothing was processed)
+        :rtype: float
+        """
+        with self.lock:
+            if self.transactions == 0:
+                return 0.0
+            return self.deliveries / self.transactions
+
+    def prometheus(self, prefix='repocribro'):
+        """Export state of the stage in Prometheus text format
+
+        :param prefix: Prefix of metric names
+        :type prefix: str
+        :return: Metrics in Prometheus exposition format
+        :rtype: str
+        """
+        ratio = self.ratio
+        with self.lock:
+            metrics = [
+                ('webhook_queue_depth', 'gauge', self.pending),
+                ('webhook_deliveries_total', 'counter', self.deliveries),
+                ('webhook_transactions_total', 'counter', self.transactions),
+                ('webhook_errors_total', 'counter', self.errors),
+                ('webhook_shed_total', 'counter', self.shed),
+                ('webhook_coalescing_ratio', 'gauge', ratio),
+            ]
+        lines = []
+        for name, kind, value in metrics:
+            name = '{}_{}'.format(prefix, name)
+            lines.append('# TYPE {} {}'.format(name, kind))
+            lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,146 @@
+import sqlite3
+import time
+
+
+class WebhookQueue:
+    """Durable local queue (SQLite journal) of incoming webhook deliveries
+
+    Deliveries are stored by the web application right after signature
+    verification and processed later in batches by a worker. Delivery
+    stays in the queue until it is acknowledged, so processing is done
+    at least once even if the worker crashes. Delivery which repeatedly
+    fails to be processed is moved to the dead-letter table after
+    ``max_attempts`` so it does not block the queue.
+
+    :ivar path: Path to SQLite database file with the queue
+    :ivar max_attempts: Number of failed attempts before dead-lettering
+    """
+
+    #: SQL for creating the queue table
+    CREATE_SQL = 'CREATE TABLE IF NOT EXISTS webhook_queue (' \
+                 'id INTEGER PRIMARY KEY AUTOINCREMENT, ' \
+                 'delivery_id TEXT, event TEXT, payload BLOB, received REAL, ' \
+                 'attempts INTEGER NOT NULL DEFAULT 0)'
+    #: SQL for creating the dead-letter table
+    CREATE_DEAD_SQL = 'CREATE TABLE IF NOT EXISTS webhook_dead_letter (' \
+                      'id INTEGER PRIMARY KEY, delivery_id TEXT, ' \
+                      'event TEXT, payload BLOB, received REAL, ' \
+                      'attempts INTEGER, failed REAL, error TEXT)'
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute(self.CREATE_SQL)
+            conn.execute(self.CREATE_DEAD_SQL)
+            columns = [row[1] for row in conn.execute(
+                'PRAGMA table_info(webhook_queue)'
+            )]
+            if 'attempts' not in columns:
+                # queue created by older version
+                conn.execute('ALTER TABLE webhook_queue ADD COLUMN '
+                             'attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def push(self, delivery_id, event, payload):
+        """Append delivery to the queue
+
+        :param delivery_id: GitHub delivery ID (X-GitHub-Delivery)
+        :type delivery_id: str
+        :param event: GitHub event name (X-GitHub-Event)
+        :type event: str
+        :param payload: Raw (verified) payload of the delivery
+        :type payload: bytes
+        """
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO webhook_queue '
+                '(delivery_id, event, payload, received) VALUES (?, ?, ?, ?)',
+                (delivery_id, event, payload, time.time())
+            )
+
+    def peek(self, limit=100):
+        """Get oldest deliveries from the queue (without removing)
+
+        :param limit: Maximal number of deliveries
+        :type limit: int
+        :return: Tuples of queue ID, delivery ID, event and payload
+        :rtype: list of tuple
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT id, delivery_id, event, payload FROM webhook_queue '
+                'ORDER BY id LIMIT ?', (limit,)
+            ).fetchall()
+
+    def ack(self, ids):
+        """Remove processed deliveries from the queue
+
+        :param ids: Queue IDs of processed deliveries
+        :type ids: list of int
+        """
+        with self._connect() as conn:
+            conn.executemany('DELETE FROM webhook_queue WHERE id = ?',
+                             [(i,) for i in ids])
+
+    def fail(self, failures):
+        """Record failed attempts of processing deliveries
+
+        Failed deliveries stay in the queue to be retried, those which
+        reached ``max_attempts`` are moved to the dead-letter table.
+
+        :param failures: Queue IDs of failed deliveries with error messages
+        :type failures: dict of int: str
+        :return: Number of deliveries moved to the dead-letter table
+        :rtype: int
+        """
+        if len(failures) == 0:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE webhook_queue SET attempts = attempts + 1 '
+                'WHERE id = ?', [(i,) for i in failures]
+            )
+            dead = conn.execute(
+                'SELECT id FROM webhook_queue WHERE attempts >= ? '
+                'AND id IN ({})'.format(','.join('?' * len(failures))),
+                [self.max_attempts] + list(failures)
+            ).fetchall()
+            now = time.time()
+            for (i,) in dead:
+                conn.execute(
+                    'INSERT INTO webhook_dead_letter (id, delivery_id, '
+                    'event, payload, received, attempts, failed, error) '
+                    'SELECT id, delivery_id, event, payload, received, '
+                    'attempts, ?, ? FROM webhook_queue WHERE id = ?',
+                    (now, failures[i], i)
+                )
+                conn.execute('DELETE FROM webhook_queue WHERE id = ?', (i,))
+            return len(dead)
+
+    def dead_letters(self, limit=100):
+        """Get deliveries moved to the dead-letter table
+
+        :param limit: Maximal number of deliveries
+        :type limit: int
+        :return: Tuples of queue ID, delivery ID, event, attempts and error
+        :rtype: list of tuple
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT id, delivery_id, event, attempts, error '
+                'FROM webhook_dead_letter ORDER BY id LIMIT ?', (limit,)
+            ).fetchall()
+
+    def __len__(self):
+        """Depth of the queue
+
+        :return: Number of waiting deliveries
+        :rtype: int
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM webhook_queue'
+            ).fetchone()[0]
@@ -48,6 +48,10 @@ setup(
             'db_create=repocribro.commands:db_create',
             'check_config=repocribro.commands:check_config',
             'repocheck=repocribro.commands:repocheck',
+            'webhook_worker=repocribro.commands:webhook_worker',
+            'reindex=repocribro.commands:reindex',
+            'hook_profiles=repocribro.commands:hook_profiles',
+            'sync_daemon=repocribro.commands:sync_daemon',
         ],
     },
     install_requires=[
@@ -1,15 +1,17 @@
 import betamax
+import contextlib
 import pytest
 import flask
 import os
 import json
 
 from repocribro import create_app
-from repocribro.database import db as _db
+from repocribro.database import db as _db, QueryCounter
 from repocribro.github import GitHubAPI, GitHubResponse
 
 ABS_PATH = os.path.abspath(os.path.dirname(__file__))
 FLASK_CONFIG_FILE = ABS_PATH + '/fixtures/config.cfg'
+INSTRUMENTATION_CONFIG_FILE = ABS_PATH + '/fixtures/config_instrumentation.cfg'
 TESTDB_PATH = '/tmp/repocribro_test.db'
 FIXTURES_PATH = ABS_PATH + '/fixtures'
 GITHUB_DATA = FIXTURES_PATH + '/github_data/{}.json'
@@ -48,6 +50,12 @@ def error_invoker(err_code):
     flask.abort(err_code)
 
 
+@test.route('/rate-limit')
+def rate_limit_invoker():
+    from repocribro.github import RateLimitExceeded
+    raise RateLimitExceeded(41.5)
+
+
 @test.route('/login/<username>')
 def fake_login(username):
     from repocribro.security import login
@@ -104,6 +112,37 @@ def app_client(app):
     return app.test_client()
 
 
+@pytest.fixture(scope='session')
+def instrumented_app(app):
+    """Application with instrumentation enabled (sharing test database)"""
+    from repocribro.models import SearchableMixin
+    search_backend = SearchableMixin.search_backend
+    search_cache = SearchableMixin.search_cache
+    instrumented_app = create_app(INSTRUMENTATION_CONFIG_FILE)
+    # searchable models keep using services of the main app
+    SearchableMixin.search_backend = search_backend
+    SearchableMixin.search_cache = search_cache
+
+    # database is bound to the main app (see db fixture), requests of
+    # this app must use its own (instrumented) engine
+    @instrumented_app.before_request
+    def bind_session():
+        _db.session.remove()
+        _db.app = None
+
+    @instrumented_app.teardown_request
+    def unbind_session(exception):
+        _db.session.remove()
+        _db.app = app
+
+    return instrumented_app
+
+
+@pytest.fixture(scope='session')
+def instrumented_client(instrumented_app):
+    return instrumented_app.test_client()
+
+
 @pytest.fixture(scope='session')
 def db(app, request):
     """Session-wide test database."""
@@ -141,6 +180,40 @@ def session(db, request):
     return session
 
 
+@pytest.fixture(scope='function')
+def query_budget(app, db):
+    """Context manager failing when block executes too many statements"""
+    @contextlib.contextmanager
+    def budget(max_queries):
+        engine = db.get_engine(app)
+        with QueryCounter(engine, record=True) as counter:
+            yield counter
+        assert counter.count <= max_queries, \
+            '{} queries over budget {}:\n{}'.format(
+                counter.count, max_queries, '\n'.join(counter.statements)
+            )
+
+    return budget
+
+
+@pytest.fixture(scope='function')
+def many_repos_session(filled_db_session):
+    """Filled database with many public repositories (with pushes)"""
+    import datetime
+    from repocribro.models import Push, Repository, User
+    session = filled_db_session
+    user = session.query(User).filter_by(login='regular').first()
+    for i in range(12):
+        repo = Repository(1000 + i, None, 'regular/many{}'.format(i),
+                          'many{}'.format(i), 'Python', '', 'Many', '',
+                          False, None, user, Repository.VISIBILITY_PUBLIC)
+        session.add(repo)
+        session.add(Push(2000 + i, 'refs/heads/master', 'abc', 'def', 1, 1,
+                         datetime.datetime.now(), 'sender', 1, repo))
+    session.commit()
+    return session
+
+
 @pytest.fixture(scope='session')
 def github_data_loader():
     def get_github_data(name):
@@ -156,6 +229,9 @@ def empty_db_session(app, db):
     for table in reversed(meta.sorted_tables):
         db.session.execute(table.delete())
     db.session.commit()
+    app.container.get('search_cache').invalidate()
+    app.container.get('fragment_cache').clear()
+    app.container.get('account_cache').clear()
     app.ext_call('init_security')  # create default roles
     return db.session
 
@@ -403,6 +479,8 @@ class FakeGitHubAPI:
         self.session = session
         self.token = token
         self.scope = []
+        self.etags = {}
+        self.requested = []
 
     @staticmethod
     def _get_auth_header():
@@ -432,15 +510,30 @@ class FakeGitHubAPI:
         for key in ('github_token', 'github_scope'):
             flask.session.pop(key, None)
 
-    def get(self, what, page=0):
+    def get(self, what, page=0, etag=None):
+        self.requested.append(what)
         if what in self.DATA:
+            if etag is not None and self.etags.get(what) == etag:
+                return GitHubResponse(FakeResponse(304, None), True)
             return GitHubResponse(
-                FakeResponse(200, self.DATA[what])
+                FakeResponse(200, self.DATA[what],
+                             {'ETag': self.etags.get(what, '')})
             )
         return GitHubResponse(
             FakeResponse(404, {'message': 'Not Found'})
         )
 
+    def iter_pages(self, what, per_page=100, prefetch=False, etag=None):
+        yield self.get(what, etag=etag)
+
+    def iter_items(self, what, per_page=100, prefetch=False):
+        response = self.get(what)
+        if response.is_ok:
+            yield from response.data
+
+    def rate_budget_delay(self, reserve=0.0):
+        return 0.0
+
     def webhook_get(self, full_name, id):
         return GitHubResponse(
             FakeResponse(404, {'message': 'Not Found'})
@@ -463,9 +556,10 @@ class FakeGitHubAPI:
 
 
 class FakeResponse:
-    def __init__(self, status_code, data):
+    def __init__(self, status_code, data, headers=None):
         self.status_code = status_code
         self.data = data
+        self.headers = headers or {}
         self.url = ''
         self.links = {}
 
@@ -5,7 +5,11 @@ from sqlalchemy.exc import OperationalError
 from repocribro.commands.assign_role import _assign_role
 from repocribro.commands.check_config import _check_config
 from repocribro.commands.db_create import _db_create
+from repocribro.commands.hook_profiles import _hook_profiles
+from repocribro.commands.reindex import _reindex
 from repocribro.commands.repocheck import _repocheck
+from repocribro.commands.sync_daemon import (SyncDaemonCommand,
+                                             SyncSchedule, _sync_daemon)
 from repocribro.models import User, Repository
 
 
@@ -103,8 +107,275 @@ def test_repocheck_push_all(filled_db_session, app_client):
     assert len(repo1.releases) == 2
 
 
+def test_repocheck_incremental(filled_db_session, app, app_client, capsys):
+    from repocribro.models import RepositorySyncState
+    app_client.get('/test/fake-github')
+    gh_api = app.container.get('gh_api')
+    events_uri = '/repos/regular/repo1/events'
+
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    repo1.last_event = datetime.datetime.strptime('1-1-2010', '%d-%m-%Y')
+    _repocheck('regular/repo1')
+    state = filled_db_session.query(RepositorySyncState).get(repo1.id)
+    assert state.event_id == '118818'
+    assert state.event_at == datetime.datetime(2017, 3, 4, 21, 8, 12)
+    assert state.metadata_at is not None
+    assert repo1.last_event == state.event_at
+    assert len(repo1.releases) == 2
+    # chronological order, the newest event wins
+    assert repo1.visibility_type == Repository.VISIBILITY_PUBLIC
+
+    # cursor reached at once, metadata are still fresh
+    gh_api.requested.clear()
+    gh_api.etags[events_uri] = '"events-v1"'
+    _repocheck('regular/repo1')
+    assert gh_api.requested == [events_uri]
+    assert len(repo1.releases) == 2
+    assert state.events_etag == '"events-v1"'
+
+    _repocheck('regular/repo1')
+    out, err = capsys.readouterr()
+    assert '1 not modified (304)' in out
+
+    new_release = dict(gh_api.DATA[events_uri][1])
+    new_release['id'] = 9999999
+    new_release['created_at'] = '2017-03-05T10:00:00Z'
+    new_release['payload'] = dict(new_release['payload'])
+    new_release['payload']['release'] = dict(
+        new_release['payload']['release'], id=8461517
+    )
+    gh_api.DATA = dict(gh_api.DATA)
+    gh_api.DATA[events_uri] = [new_release] + gh_api.DATA[events_uri]
+    gh_api.etags[events_uri] = '"events-v2"'
+    _repocheck('regular/repo1')
+    assert len(repo1.releases) == 3
+    assert state.event_id == '9999999'
+    assert state.events_etag == '"events-v2"'
+
+
+def test_sync_schedule():
+    schedule = SyncSchedule(min_interval=10, max_interval=40)
+    schedule.add(1, 100.0)
+    schedule.add(2, 50.0)
+    schedule.add(3, 200.0)
+    assert schedule.next_due() == 50.0
+    assert schedule.pop_due(99.0) == [2]
+    assert schedule.pop_due(150.0) == [1]
+    assert schedule.pop_due(150.0) == []
+
+    # dormant repository is backed off, active is polled sooner
+    assert schedule.reschedule(2, 150.0, 0) == 20
+    assert schedule.reschedule(1, 150.0, 3) == 10
+    assert schedule.next_due() == 160.0
+    assert schedule.reschedule(2, 150.0, None) is None  # not popped yet
+    schedule.pop_due(170.0)
+    assert schedule.reschedule(2, 170.0, 0) == 40
+    assert schedule.reschedule(1, 170.0, 0) == 20
+
+    schedule.remove(3)
+    assert 3 not in schedule
+    assert len(schedule) == 2
+    assert schedule.pop_due(1000.0, limit=1) == [1]
+
+
+def test_sync_daemon_once(filled_db_session, app_client, capsys):
+    from repocribro.models import RepositorySyncState
+    app_client.get('/test/fake-github')
+
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    repo1.last_event = datetime.datetime.strptime('1-1-2010', '%d-%m-%Y')
+    filled_db_session.commit()
+    _sync_daemon(once=True)
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 2
+    assert filled_db_session.query(RepositorySyncState).count() == 1
+    out, err = capsys.readouterr()
+    assert 'Sync daemon stopped after 3 checks (5 new events' in out
+
+    # repo1 was synced just now, others (without events) are not synced
+    _sync_daemon(once=True)
+    out, err = capsys.readouterr()
+    assert 'stopped after 2 checks (0 new events' in out
+
+
+def test_sync_daemon_sigterm(filled_db_session, app_client, capsys):
+    import os
+    import signal
+    import time
+    app_client.get('/test/fake-github')
+    clock_calls = []
+
+    def clock():
+        if not clock_calls:
+            os.kill(os.getpid(), signal.SIGTERM)
+        clock_calls.append(None)
+        return time.time()
+
+    handler = signal.getsignal(signal.SIGTERM)
+    cmd = SyncDaemonCommand(clock=clock)
+    cmd.run(workers=4)
+    assert signal.getsignal(signal.SIGTERM) == handler
+    out, err = capsys.readouterr()
+    assert 'Stopping sync daemon...' in out
+    # checks in progress are finished
+    assert 'Sync daemon stopped after 3 checks' in out
+
+
+def test_sync_daemon_interrupts_rate_limit(filled_db_session, app_client,
+                                           app):
+    import time
+    from repocribro.github import RateLimiter
+    app_client.get('/test/fake-github')
+    limiter = RateLimiter()
+    app.container.get('gh_api').rate_limiter = limiter
+    sleeps = []
+
+    def clock():
+        sleeps.append(limiter.sleep)
+        return time.time()
+
+    cmd = SyncDaemonCommand(clock=clock)
+    cmd.run(once=True)
+    assert sleeps[0] == cmd._sleep
+    assert limiter.sleep == time.sleep
+
+    cmd.stop()
+    start = time.time()
+    with pytest.raises(InterruptedError):
+        sleeps[0](3600)
+    assert time.time() - start < 1
+    del app.container.get('gh_api').rate_limiter
+
+
 def test_check_config(capsys):
     _check_config('triple')
     out, err = capsys.readouterr()
     assert 'flask server_name repocribro.test' in out.lower()
     assert 'github client_secret some_client_secret' in out.lower()
+
+
+def test_hook_profiles(capsys):
+    _hook_profiles(limit=3)
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert lines[0].startswith('Extension')
+    assert len(lines) == 4
+    assert lines[1].startswith('core')
+
+
+def test_hook_profiles_running_app(filled_db_session, instrumented_client,
+                                   capsys, monkeypatch):
+    import requests
+
+    def get(url, headers, timeout):
+        assert url == 'http://repocribro.test/metrics'
+        res = instrumented_client.get(url, headers=headers)
+        response = requests.Response()
+        response.status_code = res.status_code
+        response._content = res.data
+        return response
+
+    def profile(hook_name):
+        _hook_profiles(url='http://repocribro.test/metrics')
+        out, err = capsys.readouterr()
+        for line in out.splitlines()[1:]:
+            ext_name, name, count, total, p95 = line.split()
+            if name == hook_name:
+                assert ext_name == 'core'
+                assert float(total) >= float(p95)
+                return int(count)
+        return 0
+
+    monkeypatch.setattr(requests, 'get', get)
+    calls = profile('view_core_repo_detail_tabs')
+    for _ in range(3):
+        res = instrumented_client.get('/repo/regular/repo1')
+        assert res.status == '200 OK'
+    assert profile('view_core_repo_detail_tabs') == calls + 3
+
+
+def test_repocheck_concurrent(filled_db_session, app_client, capsys):
+    app_client.get('/test/fake-github')
+
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 1
+    assert len(repo1.releases) == 1
+    repo1.last_event = datetime.datetime.strptime('1-1-2010', '%d-%m-%Y')
+    _repocheck(workers=4)
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 2
+    out, err = capsys.readouterr()
+    assert 'Checked regular/repo1 in' in out
+    assert 'repos/s' in out
+
+
+def test_webhook_worker_batch(filled_db_session, app, tmpdir, capsys,
+                              github_data_loader):
+    import json
+    from repocribro.commands.webhook_worker import _webhook_worker
+    from repocribro.webhook_queue import WebhookQueue
+
+    with pytest.raises(SystemExit) as exodus:
+        _webhook_worker(once=True)
+    assert exodus.value.code == 1
+
+    queue = WebhookQueue(str(tmpdir.join('queue.db')), max_attempts=2)
+    app.container.set_singleton('webhook_queue', queue)
+    release = json.dumps(github_data_loader('webhooks/release'))
+    queue.push('d1', 'release', release.encode('utf-8'))
+    queue.push('d2', 'release', b'{"broken": "payload"}')
+    queue.push('d3', 'release', release.encode('utf-8'))
+    _webhook_worker(batch_size=2, once=True)
+    app.container.set_singleton('webhook_queue', None)
+
+    assert len(queue) == 0
+    dead = queue.dead_letters()
+    assert len(dead) == 1
+    assert dead[0][1:4] == ('d2', 'release', 2)
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.releases) == 3
+    out, err = capsys.readouterr()
+    assert out.count('Error while processing delivery d2') == 2
+    assert 'Moved 1 deliveries to dead-letter table' in out
+
+
+def test_webhook_queue_fail(tmpdir):
+    from repocribro.webhook_queue import WebhookQueue
+    queue = WebhookQueue(str(tmpdir.join('queue.db')), max_attempts=3)
+    queue.push('d1', 'push', b'{}')
+    queue.push('d2', 'push', b'{}')
+    (id1, *_), (id2, *_) = queue.peek()
+
+    assert queue.fail({id1: 'error'}) == 0
+    queue.ack([id2])
+    assert [item[0] for item in queue.peek()] == [id1]
+    assert queue.fail({id1: 'error'}) == 0
+    assert queue.fail({id1: 'last error'}) == 1
+    assert len(queue) == 0
+    assert queue.dead_letters() == [(id1, 'd1', 'push', 3, 'last error')]
+
+
+def test_reindex(filled_db_session, capsys):
+    _reindex('Repository')
+    out, err = capsys.readouterr()
+    assert 'Indexed 3 rows of Repository' in out
+
+    _reindex()
+    out, err = capsys.readouterr()
+    assert 'Indexed 3 rows of User' in out
+    assert 'Indexed 1 rows of Organization' in out
+
+    with pytest.raises(SystemExit):
+        _reindex('Role')
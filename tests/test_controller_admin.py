@@ -267,3 +267,71 @@ def test_repo_delete(filled_db_session, app_client):
 # TODO: learn how to teardown (its weird)
 def test_dummy_last(empty_db_session, app_client):
     app_client.get('/test/logout')
+
+
+def test_admin_index_query_budget(many_repos_session, app_client,
+                                  query_budget):
+    app_client.get('/test/login/admin')
+    try:
+        with query_budget(10):
+            res = app_client.get('/admin')
+    finally:
+        app_client.get('/test/logout')
+    assert res.status == '200 OK'
+    assert 'regular/many11' in res.data.decode('utf-8')
+
+
+def test_admin_hook_profiles(filled_db_session, app_client):
+    app_client.get('/test/login/admin')
+    try:
+        res = app_client.get('/admin?tab=extensions')
+    finally:
+        app_client.get('/test/logout')
+    html = res.data.decode('utf-8')
+    assert res.status == '200 OK'
+    assert '<code>view_admin_index_tabs</code>' in html
+
+
+def test_account_cache_revocation(filled_db_session, app):
+    url = '/manage/repository/regular/repo1'
+    user_client = app.test_client()
+    admin_client = app.test_client()
+    user_client.get('/test/login/regular')
+    admin_client.get('/test/login/admin')
+    try:
+        assert user_client.get(url).status == '200 OK'
+        admin_client.post('/admin/role/user/remove',
+                          data={'login': 'regular'})
+        assert user_client.get(url).status == '403 FORBIDDEN'
+        admin_client.post('/admin/role/user/add', data={'login': 'regular'})
+        assert user_client.get(url).status == '200 OK'
+        admin_client.post('/admin/account/regular/ban', data={'active': '0'})
+        assert user_client.get(url).status == '403 FORBIDDEN'
+    finally:
+        user_client.get('/test/logout')
+        admin_client.get('/test/logout')
+
+
+def test_account_cache_revision(filled_db_session, app_client, app):
+    from repocribro.commands.assign_role import _assign_role
+    from repocribro.models import Role, User
+    cache = app.container.get('account_cache')
+    app_client.get('/test/login/regular')
+    user = filled_db_session.query(User).filter_by(login='regular').first()
+    account_id = user.user_account.id
+    assert app_client.get('/admin').status_code == 404
+    revision = cache.get(account_id).revision
+
+    # changed by other process (without invalidation of the cache)
+    _assign_role('regular', 'admin')
+    assert cache.get(account_id).revision == revision
+    assert app_client.get('/admin').status_code == 200
+    assert cache.get(account_id).revision > revision
+
+    role = filled_db_session.query(Role).filter_by(name='admin').first()
+    role.privileges = 'login'
+    filled_db_session.commit()
+    assert cache.get(account_id).revision == revision + 1
+    app_client.get('/')
+    assert cache.get(account_id).revision == revision + 2
+    app_client.get('/test/logout')
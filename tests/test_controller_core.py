@@ -1,3 +1,6 @@
+import pytest
+
+
 
 
 def test_landing(filled_db_session, app_client):
@@ -17,6 +20,26 @@ def test_search(filled_db_session, app_client):
     assert 'yolo' in res.data.decode('utf-8')
 
 
+def test_search_pagination(filled_db_session, app_client, app):
+    config = app.container.get('config')
+    if not config.has_section('repocribro-core'):
+        config.add_section('repocribro-core')
+    config.set('repocribro-core', 'page_size', '1')
+    try:
+        res = app_client.get('/search?tab=users&page=2')
+    finally:
+        config.remove_option('repocribro-core', 'page_size')
+    html = res.data.decode('utf-8')
+    assert res.status == '200 OK'
+    assert 'card-title">regular<' in html
+    assert 'card-title">banned<' not in html
+    assert '<span class="badge badge-secondary">3</span>' in html
+    # anonymous sees only the public repository (counted, not rendered)
+    assert '<span class="badge badge-secondary">1</span>' in html
+    assert 'regular/repo1' not in html
+    assert 'page=3' in html and 'tab=users' in html
+
+
 def test_user_detail(filled_db_session, app_client):
     res = app_client.get('/user/regular')
     assert res.status == '200 OK'
@@ -62,6 +85,95 @@ def test_repo_detail(filled_db_session, app_client):
     assert res.status == '404 NOT FOUND'
 
 
+def test_repo_detail_not_modified(filled_db_session, app_client):
+    from repocribro.models import Repository
+    app_client.get('/test/logout')
+    res = app_client.get('/repo/regular/repo1')
+    assert res.status == '200 OK'
+    assert 'public' in res.headers['Cache-Control']
+    etag = res.headers['ETag']
+
+    res = app_client.get('/repo/regular/repo1',
+                         headers={'If-None-Match': etag})
+    assert res.status == '304 NOT MODIFIED'
+    assert res.data == b''
+
+    repo = filled_db_session.query(Repository).get(1)
+    revision = repo.revision
+    repo.description = 'Changed description'
+    filled_db_session.commit()
+    assert repo.revision == revision + 1
+    res = app_client.get('/repo/regular/repo1',
+                         headers={'If-None-Match': etag})
+    assert res.status == '200 OK'
+    assert 'Changed description' in res.data.decode('utf-8')
+    assert res.headers['ETag'] != etag
+
+    app_client.get('/test/login/regular')
+    res = app_client.get('/repo/regular/repo1',
+                         headers={'If-None-Match': etag})
+    assert res.status == '200 OK'
+    assert 'private' in res.headers['Cache-Control']
+    app_client.get('/test/logout')
+
+
+def test_repo_detail_lazy_tabs(filled_db_session, app_client):
+    app_client.get('/test/logout')
+    html = app_client.get('/repo/regular/repo1').data.decode('utf-8')
+    assert 'data-fragment-url="/repo/regular/repo1?tab=releases' in html
+    assert 'First release' not in html
+
+    res = app_client.get('/repo/regular/repo1?tab=releases&fragment=1')
+    html = res.data.decode('utf-8')
+    assert 'First release' in html
+    assert '<html' not in html
+    res = app_client.get('/repo/regular/repo1?tab=nope&fragment=1')
+    assert res.status == '404 NOT FOUND'
+
+
+def test_repo_detail_updates_pages(filled_db_session, app_client, app):
+    import datetime
+    import re
+    from repocribro.models import Repository, Push, Commit
+    repo = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    start = datetime.datetime(2017, 1, 1)
+    for i in range(3):
+        push = Push(500 + i, 'refs/heads/master', 'after{}'.format(i),
+                    'before{}'.format(i), 1, 1,
+                    start + datetime.timedelta(days=i), 'sender', 1, repo)
+        Commit('sha{}'.format(i), 'Message #{}'.format(i), 'author',
+               'author@example.com', True, push)
+        filled_db_session.add(push)
+    filled_db_session.commit()
+
+    config = app.container.get('config')
+    if not config.has_section('repocribro-core'):
+        config.add_section('repocribro-core')
+    config.set('repocribro-core', 'page_size', '2')
+    try:
+        res = app_client.get('/repo/regular/repo1?tab=updates')
+        html = res.data.decode('utf-8')
+        assert '<span class="badge badge-secondary">4</span>' in html
+        assert 'Dummy commit' in html and 'Message #2' in html
+        assert 'Message #1' not in html
+        after = re.search(r'after=([\w=-]+)', html).group(1)
+
+        res = app_client.get(
+            '/repo/regular/repo1?tab=updates&after={}'.format(after)
+        )
+        html = res.data.decode('utf-8')
+        assert 'Message #1' in html and 'Message #0' in html
+        assert 'Message #2' not in html
+        assert 'after=' not in html
+
+        res = app_client.get('/repo/regular/repo1?tab=updates&after=nope')
+        assert 'Dummy commit' in res.data.decode('utf-8')
+    finally:
+        config.remove_option('repocribro-core', 'page_size')
+
+
 def test_repo_own(filled_db_session, app_client):
     app_client.get('/test/login/admin')
 
@@ -87,3 +199,19 @@ def test_repo_hidden(filled_db_session, app_client):
 # TODO: learn how to teardown (its weird)
 def test_dummy_last(empty_db_session, app_client):
     app_client.get('/test/logout')
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/search?tab=repositories', 8),
+    ('/user/regular?tab=repositories&fragment=1', 8),
+])
+def test_listing_query_budget(many_repos_session, app_client,
+                              query_budget, url, budget):
+    app_client.get('/test/login/admin')
+    try:
+        with query_budget(budget):
+            res = app_client.get(url)
+    finally:
+        app_client.get('/test/logout')
+    assert res.status == '200 OK'
+    assert 'many11' in res.data.decode('utf-8')
@@ -35,6 +35,18 @@ def test_get_repo(filled_db_session, app_client):
     assert res.status == '404 NOT FOUND'
 
 
+def test_get_repo_not_modified(filled_db_session, app_client):
+    res = app_client.get('/api/repo/1')
+    etag, last_modified = res.headers['ETag'], res.headers['Last-Modified']
+    res = app_client.get('/api/repo/1', headers={'If-None-Match': etag})
+    assert res.status == '304 NOT MODIFIED'
+    res = app_client.get('/api/repo/1',
+                         headers={'If-Modified-Since': last_modified})
+    assert res.status == '304 NOT MODIFIED'
+    res = app_client.get('/api/push/1', headers={'If-None-Match': etag})
+    assert res.status == '200 OK'
+
+
 def test_get_repo_by_id(filled_db_session, app_client):
     res = app_client.get('/api/repo/666')
     assert res.status == '404 NOT FOUND'
@@ -81,3 +93,133 @@ def test_get_release(filled_db_session, app_client):
     assert data['github_id'] == 666
     assert data['tag_name'] == 'v1.0'
     assert data['repository_id'] == 1
+
+
+def test_get_repos(filled_db_session, app_client):
+    res = app_client.get('/api/repos')
+    assert res.status == '200 OK'
+    data = json.loads(res.data.decode('utf-8'))
+    assert [repo['full_name'] for repo in data] == ['regular/repo1']
+    assert res.headers['Link'].endswith('/api/repos?per_page=20>; rel="first"')
+
+
+def test_get_repo_pushes_pages(filled_db_session, app_client):
+    import datetime
+    from repocribro.models import Repository, Push
+    repo = filled_db_session.query(Repository).get(1)
+    start = datetime.datetime(2017, 1, 1)
+    for i in range(3):
+        filled_db_session.add(Push(
+            500 + i, 'refs/heads/master', 'after{}'.format(i),
+            'before{}'.format(i), 1, 1, start + datetime.timedelta(days=i),
+            'sender', 1, repo
+        ))
+    filled_db_session.commit()
+
+    github_ids = []
+    url = '/api/repo/1/pushes?per_page=3'
+    while url is not None:
+        res = app_client.get(url)
+        assert res.status == '200 OK'
+        data = json.loads(res.data.decode('utf-8'))
+        github_ids.extend(push['github_id'] for push in data)
+        links = dict(
+            (rel.split('"')[1], link.strip(' <>'))
+            for link, rel in (
+                part.split(';') for part in res.headers['Link'].split(',')
+            )
+        )
+        url = links.get('next')
+    assert github_ids == [484, 502, 501, 500]
+
+    res = app_client.get('/api/repo/1/pushes',
+                         headers={'Accept': 'application/x-ndjson'})
+    assert res.mimetype == 'application/x-ndjson'
+    lines = res.data.decode('utf-8').splitlines()
+    assert [json.loads(line)['github_id'] for line in lines] == \
+        [484, 502, 501, 500]
+
+    assert app_client.get('/api/repo/2/pushes').status == '404 NOT FOUND'
+
+
+def test_get_repo_releases(filled_db_session, app_client):
+    res = app_client.get('/api/repo/1/releases')
+    data = json.loads(res.data.decode('utf-8'))
+    assert [release['tag_name'] for release in data] == ['v1.0']
+    assert app_client.get('/api/repo/3/releases').status == '404 NOT FOUND'
+
+
+def test_get_repo_releases_drafts(filled_db_session, app_client):
+    from repocribro.models import Repository, Release
+    repo = filled_db_session.query(Repository).get(1)
+    for i, published_at in enumerate(['2017-01-02T10:00:00Z', None,
+                                      '2017-01-04T10:00:00Z', None]):
+        filled_db_session.add(Release(
+            700 + i, 'v2.{}'.format(i), '2017-01-0{}T09:00:00Z'.format(i + 1),
+            published_at, '', False, published_at is None, '', '',
+            1, 'author', 'sender', 1, repo
+        ))
+    filled_db_session.commit()
+
+    tags = []
+    url = '/api/repo/1/releases?per_page=2'
+    while url is not None:
+        res = app_client.get(url)
+        tags.extend(release['tag_name']
+                    for release in json.loads(res.data.decode('utf-8')))
+        url = None
+        for part in res.headers.get('Link', '').split(','):
+            if 'rel="next"' in part:
+                url = part.split(';')[0].strip(' <>')
+    # drafts are ordered by creation and none is lost after page 1
+    assert tags == ['v2.2', 'v2.3', 'v2.0', 'v2.1', 'v1.0']
+
+
+def test_get_push_commits(filled_db_session, app_client):
+    res = app_client.get('/api/push/1/commits')
+    data = json.loads(res.data.decode('utf-8'))
+    assert [commit['sha'] for commit in data] == ['def']
+    assert app_client.get('/api/push/666/commits').status == '404 NOT FOUND'
+
+
+def test_search(filled_db_session, app_client, app):
+    from repocribro.models import Repository
+    assert app_client.get('/api/search').status == '400 BAD REQUEST'
+    res = app_client.get('/api/search/regular?type=repo,nope')
+    assert res.status == '400 BAD REQUEST'
+
+    res = app_client.get('/api/search/regular')
+    assert res.status == '200 OK'
+    data = json.loads(res.data.decode('utf-8'))
+    assert [item['type'] for item in data] == ['repo', 'user']
+    assert data[0]['full_name'] == 'regular/repo1'
+    assert data[1]['login'] == 'regular'
+
+    res = app_client.get('/api/search/dummy?type=push,commit,release')
+    data = json.loads(res.data.decode('utf-8'))
+    assert [(item['type'], item['sha']) for item in data] == \
+        [('commit', 'def')]
+
+    res = app_client.get('/api/search?q=regular&type=repo&limit=1')
+    data = json.loads(res.data.decode('utf-8'))
+    assert [item['full_name'] for item in data] == ['regular/repo1']
+    assert 'rel="next"' not in res.headers['Link']
+
+    cache = app.container.get('search_cache')
+    assert cache.get(('regular', ('repo',), 0, 1)) is not None
+    repo = filled_db_session.query(Repository).get(1)
+    repo.events_updated()
+    filled_db_session.commit()
+    assert cache.get(('regular', ('repo',), 0, 1)) is not None
+    res = app_client.get('/api/search?q=regular&type=repo&limit=1')
+    data = json.loads(res.data.decode('utf-8'))
+    assert data[0]['last_event'] is not None
+    repo = filled_db_session.query(Repository).get(2)
+    repo.visibility_type = Repository.VISIBILITY_PUBLIC
+    filled_db_session.commit()
+    assert cache.get(('regular', ('repo',), 0, 1)) is None
+
+    res = app_client.get('/api/search?q=regular&type=repo&limit=1')
+    data = json.loads(res.data.decode('utf-8'))
+    assert len(data) == 1
+    assert 'rel="next"' in res.headers['Link']
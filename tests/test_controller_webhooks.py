@@ -1,6 +1,7 @@
 import json
 import pytest
 
+from repocribro.instrumentation import Instrumentation
 from repocribro.models import Repository
 
 
@@ -91,6 +92,9 @@ def test_webhook_push(filled_db_session, app_client, github_data_loader, app):
         full_name='regular/repo1'
     ).first()
     assert len(repo1.pushes) == 1
+    fragment_cache = app.container.get('fragment_cache')
+    app_client.get('/repo/regular/repo1')
+    assert any(scope == 'Repository:1' for scope, _ in fragment_cache.entries)
 
     app_client.post(
         '/webhook/github',
@@ -107,6 +111,7 @@ def test_webhook_push(filled_db_session, app_client, github_data_loader, app):
         full_name='regular/repo1'
     ).first()
     assert len(repo1.pushes) == 2
+    assert all(scope != 'Repository:1' for scope, _ in fragment_cache.entries)
 
 
 def test_webhook_release(filled_db_session, app_client,
@@ -168,3 +173,258 @@ def test_webhook_repository(filled_db_session, app_client, github_data_loader,
         full_name='regular/repo1'
     ).first()
     assert repo1.visibility_type == visibility
+
+
+def test_webhook_queue(filled_db_session, app_client, github_data_loader,
+                       app, tmpdir):
+    from repocribro.commands.webhook_worker import _webhook_worker
+    from repocribro.webhook_queue import WebhookQueue
+    push_payload = json.dumps(github_data_loader('webhooks/push'))
+    secret = app.container.get('gh_api').webhooks_secret
+    queue = WebhookQueue(str(tmpdir.join('queue.db')))
+    app.container.set_singleton('webhook_queue', queue)
+
+    res = app_client.post(
+        '/webhook/github',
+        content_type='application/json',
+        data=push_payload,
+        headers={
+            'User-Agent': 'GitHub-Hookshot/test',
+            'X-Github-Delivery': '72d3162e-cc78-11e3-81ab-4c9367dc0958',
+            'X-GitHub-Event': 'push',
+            'X-GitHub-Signature': compute_signature(push_payload, secret)
+        }
+    )
+    assert res.status == '202 ACCEPTED'
+    assert len(queue) == 1
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 1
+
+    _webhook_worker(once=True)
+    app.container.set_singleton('webhook_queue', None)
+    assert len(queue) == 0
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 2
+
+
+def test_webhook_redelivery(filled_db_session, app_client,
+                            github_data_loader, app):
+    push_payload = json.dumps(github_data_loader('webhooks/push'))
+    secret = app.container.get('gh_api').webhooks_secret
+
+    for _ in range(2):
+        res = app_client.post(
+            '/webhook/github',
+            content_type='application/json',
+            data=push_payload,
+            headers={
+                'User-Agent': 'GitHub-Hookshot/test',
+                'X-Github-Delivery': '72d3162e-cc78-11e3-81ab-4c9367dc0958',
+                'X-GitHub-Event': 'push',
+                'X-GitHub-Signature': compute_signature(push_payload, secret)
+            }
+        )
+        assert res.status == '200 OK'
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 2
+
+
+def test_webhook_concurrent_redelivery(filled_db_session, app_client,
+                                       github_data_loader, app,
+                                       monkeypatch):
+    from repocribro.models import WebhookDelivery
+    push_payload = json.dumps(github_data_loader('webhooks/push'))
+    secret = app.container.get('gh_api').webhooks_secret
+    delivery_id = '72d3162e-cc78-11e3-81ab-4c9367dc0959'
+    filled_db_session.add(WebhookDelivery(delivery_id, 'push'))
+    filled_db_session.commit()
+
+    def register(session, delivery_id, event):
+        # duplicate not visible yet (registered by other worker)
+        session.add(WebhookDelivery(delivery_id, event))
+        return True
+    monkeypatch.setattr(WebhookDelivery, 'register', staticmethod(register))
+
+    res = app_client.post(
+        '/webhook/github',
+        content_type='application/json',
+        data=push_payload,
+        headers={
+            'User-Agent': 'GitHub-Hookshot/test',
+            'X-Github-Delivery': delivery_id,
+            'X-GitHub-Event': 'push',
+            'X-GitHub-Signature': compute_signature(push_payload, secret)
+        }
+    )
+    assert res.status == '200 OK'
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 1
+
+
+def test_webhook_processor_integrity_error(filled_db_session, app_client,
+                                           github_data_loader, app,
+                                           monkeypatch):
+    import sqlalchemy.exc
+    import sys
+    from repocribro.models import WebhookDelivery
+    webhooks = sys.modules['repocribro.controllers.webhooks']
+    push_payload = json.dumps(github_data_loader('webhooks/push'))
+    secret = app.container.get('gh_api').webhooks_secret
+
+    def process(db, hooks, event, data, delivery_id):
+        raise sqlalchemy.exc.IntegrityError('INSERT', {}, Exception('other'))
+    monkeypatch.setattr(webhooks, 'process_gh_webhook', process)
+
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        app_client.post(
+            '/webhook/github',
+            content_type='application/json',
+            data=push_payload,
+            headers={
+                'User-Agent': 'GitHub-Hookshot/test',
+                'X-Github-Delivery': 'not-a-duplicate',
+                'X-GitHub-Event': 'push',
+                'X-GitHub-Signature': compute_signature(push_payload, secret)
+            }
+        )
+    # not logged, so GitHub can redeliver it
+    assert not WebhookDelivery.registered(filled_db_session,
+                                          'not-a-duplicate')
+
+
+def test_webhook_coalescing(filled_db_session, app_client,
+                            github_data_loader, app):
+    from repocribro.controllers.webhooks import make_group_processor
+    from repocribro.webhook_coalescer import WebhookCoalescer
+    secret = app.container.get('gh_api').webhooks_secret
+    coalescer = WebhookCoalescer(make_group_processor(app), max_pending=3,
+                                 retry_after=7, background=False)
+    instrumentation = app.container.get('instrumentation')
+    app.container.set_singleton('webhook_coalescer', coalescer)
+    app.container.set_singleton('instrumentation',
+                                Instrumentation(enabled=True))
+    app.container.get('instrumentation').register_collector(coalescer)
+
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    revision = repo1.revision
+    deliveries = [
+        ('push', 'webhooks/push', 'd-push'),
+        ('release', 'webhooks/release', 'd-release'),
+        ('push', 'webhooks/push', 'd-push'),  # redelivery
+        ('push', 'webhooks/push', 'd-shed'),
+    ]
+    statuses = []
+    try:
+        for event, data, delivery_id in deliveries:
+            payload = json.dumps(github_data_loader(data))
+            res = app_client.post(
+                '/webhook/github',
+                content_type='application/json',
+                data=payload,
+                headers={
+                    'User-Agent': 'GitHub-Hookshot/test',
+                    'X-Github-Delivery': delivery_id,
+                    'X-GitHub-Event': event,
+                    'X-GitHub-Signature': compute_signature(payload, secret)
+                }
+            )
+            statuses.append(res.status_code)
+        assert res.headers['Retry-After'] == '7'
+        assert len(coalescer) == 3
+        assert len(repo1.pushes) == 1
+
+        assert coalescer.flush() == 1
+        metrics = app_client.get('/metrics').data.decode('utf-8')
+    finally:
+        app.container.set_singleton('webhook_coalescer', None)
+        app.container.set_singleton('instrumentation', instrumentation)
+    assert statuses == [202, 202, 202, 503]
+    repo1 = filled_db_session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo1.pushes) == 2
+    assert len(repo1.releases) == 2
+    assert repo1.revision == revision + 1  # single update of repository
+    assert 'repocribro_webhook_queue_depth 0' in metrics
+    assert 'repocribro_webhook_transactions_total 1' in metrics
+    assert 'repocribro_webhook_shed_total 1' in metrics
+    assert 'repocribro_webhook_coalescing_ratio 3.0' in metrics
+
+
+def test_webhook_coalescer_background():
+    import threading
+    from repocribro.webhook_coalescer import WebhookCoalescer
+    groups = []
+    done = threading.Event()
+
+    def process(repo_id, deliveries):
+        groups.append((repo_id, [d[0] for d in deliveries]))
+        if len(groups) == 3:
+            done.set()
+        if repo_id == 'broken':
+            raise ValueError('broken')
+
+    coalescer = WebhookCoalescer(process, window=0.1)
+    for repo_id, delivery_id in [(1, 'a'), (2, 'b'), (1, 'c'),
+                                 ('broken', 'd')]:
+        assert coalescer.push(repo_id, delivery_id, 'push', {})
+    assert done.wait(5)
+    assert groups == [(1, ['a', 'c']), (2, ['b']), ('broken', ['d'])]
+    coalescer.push(3, 'e', 'push', {})
+    coalescer.stop()
+    assert groups[-1] == (3, ['e'])
+    assert len(coalescer) == 0
+    assert coalescer.errors == 1
+    assert coalescer.ratio == 1.25
+
+
+def test_webhook_coalescer_failed_group():
+    from repocribro.webhook_coalescer import WebhookCoalescer
+    committed = []
+    prunes = []
+
+    def process(repo_id, deliveries):
+        ids = [d[0] for d in deliveries]
+        if 'bad' in ids:
+            raise ValueError('bad delivery')
+        committed.extend(ids)
+
+    coalescer = WebhookCoalescer(process, background=False,
+                                 prune=lambda: prunes.append(None),
+                                 prune_every=4)
+    for delivery_id in ['a', 'bad', 'b']:
+        coalescer.push(1, delivery_id, 'push', {})
+    assert coalescer.flush() == 1
+    assert committed == ['a', 'b']
+    assert coalescer.errors == 1
+    assert coalescer.transactions == 4
+    assert len(prunes) == 1
+
+    coalescer.push(1, 'c', 'push', {})
+    coalescer.flush()
+    assert committed == ['a', 'b', 'c']
+    assert len(prunes) == 1  # not enough transactions since last one
+
+
+def test_delivery_pruner(empty_db_session, app):
+    import datetime
+    from repocribro.controllers.webhooks import make_delivery_pruner
+    from repocribro.models import WebhookDelivery
+    empty_db_session.add(WebhookDelivery(
+        'old', 'push',
+        datetime.datetime.utcnow() - datetime.timedelta(days=100)
+    ))
+    empty_db_session.add(WebhookDelivery('new', 'push'))
+    empty_db_session.commit()
+    assert make_delivery_pruner(app)() == 1
+    assert empty_db_session.query(WebhookDelivery).count() == 1
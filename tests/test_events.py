@@ -0,0 +1,75 @@
+import pytest
+
+from repocribro.events import EventRegistry
+from repocribro.extending import Extension
+
+
+def noop(**kwargs):
+    pass
+
+
+def first(**kwargs):
+    pass
+
+
+def test_registry_register():
+    registry = EventRegistry()
+    registry.register('webhook', 'push', noop, priority=10)
+    registry.register('webhook', 'push', first, priority=1)
+    registry.register('event', 'release', noop)
+    assert registry.processors('webhook', 'push') == (first, noop)
+    assert registry.processors('webhook') == {'push': (first, noop)}
+    assert registry.processors('event', 'push') == ()
+    with pytest.raises(ValueError):
+        registry.register('hook', 'push', noop)
+    with pytest.raises(TypeError):
+        registry.register('webhook', 'push', 'noop')
+    with pytest.raises(ValueError):
+        registry.processors('hook')
+
+
+def test_registry_register_invalidate(app):
+    registry = app.container.get('gh_events')
+    core_push = registry.processors('webhook', 'push')
+    registry.register('webhook', 'push', first, priority=-1)
+    registry.register('webhook', 'push', noop)
+    try:
+        registry.invalidate()
+        assert registry.processors('webhook', 'push') == \
+            (first,) + core_push + (noop,)
+        app.container.get('ext_master').build_dispatch()
+        assert registry.processors('webhook', 'push') == \
+            (first,) + core_push + (noop,)
+    finally:
+        registry.registered = []
+        registry.invalidate()
+    assert registry.processors('webhook', 'push') == core_push
+
+
+def test_registry_extensions(app):
+    ext_master = app.container.get('ext_master')
+    registry = app.container.get('gh_events')
+    core_push = registry.processors('webhook', 'push')
+    assert len(core_push) == 1
+    assert set(registry.processors('event')) == \
+        {'push', 'release', 'repository'}
+
+    class FirstExtension(Extension):
+        NAME = 'first'
+        PRIORITY = -1
+
+        @staticmethod
+        def get_gh_webhook_processors():
+            return {'push': [noop]}
+
+    ext = FirstExtension(ext_master, app, None)
+    ext_master.exts.insert(0, ext)
+    try:
+        assert registry.processors('webhook', 'push') == core_push
+        ext_master.build_dispatch()
+        assert registry.processors('webhook', 'push') == \
+            (noop,) + core_push
+    finally:
+        ext_master.exts.remove(ext)
+        ext_master.build_dispatch()
+    assert registry.processors('webhook', 'push') == core_push
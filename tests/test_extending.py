@@ -0,0 +1,73 @@
+import flask
+
+from repocribro.extending import Extension
+from repocribro.extending.extension_master import HookProfile
+
+
+def test_hook_profile():
+    profile = HookProfile()
+    assert profile.p95 == 0.0
+    for i in range(1, 101):
+        profile.record(i / 1000)
+    assert profile.count == 100
+    assert round(profile.total, 3) == 5.05
+    assert profile.p95 == 0.096
+
+
+def test_dispatch_table(app):
+    ext_master = app.container.get('ext_master')
+    assert 'view_core_repo_detail_tabs' in ext_master.dispatch
+    assert ext_master.call('introduce', 'unknown') == ['core']
+    assert ext_master.call('not_a_hook', 'missing') == ['missing']
+    assert 'not_a_hook' in ext_master.dispatch
+
+    class SlowExtension(Extension):
+        NAME = 'slow'
+
+        def not_a_hook(self):
+            return 'slow'
+
+    ext = SlowExtension(ext_master, app, None)
+    ext_master.exts.append(ext)
+    try:
+        ext_master.build_dispatch()
+        assert ext_master.call('not_a_hook', 'missing') == \
+            ['missing', 'slow']
+    finally:
+        ext_master.exts.remove(ext)
+        ext_master.build_dispatch()
+    profiles = {row[:2]: row for row in ext_master.hook_profiles()}
+    assert profiles[('slow', 'not_a_hook')][2] == 1
+    assert ('core', 'not_a_hook') not in profiles
+    assert profiles[('core', 'introduce')][2] >= 2
+
+
+def test_keyset_cursor_datetime():
+    import datetime
+    from repocribro.extending.helpers import KeysetPagination
+    from repocribro.models import Push
+    push = Push(1, 'ref', 'after', 'before', 1, 1,
+                datetime.datetime(2017, 3, 4, 21, 8, 12, 5), 'sender', 1, None)
+    push.id = 42
+    keys = [Push.timestamp, Push.id]
+    cursor = KeysetPagination.encode(keys, push)
+    assert KeysetPagination.decode(keys, cursor) == \
+        [datetime.datetime(2017, 3, 4, 21, 8, 12, 5), 42]
+    assert KeysetPagination.decode(keys, 'nope') is None
+
+
+def test_cached_fragment_endpoint(app):
+    from repocribro.models import Repository
+    ext_master = app.container.get('ext_master')
+    core = [ext for ext in ext_master.exts if ext.NAME == 'core'][0]
+    repo = Repository(100, None, 'regular/repo1', 'repo1', 'Python', '',
+                      '', '', False, None, None, Repository.VISIBILITY_PUBLIC)
+    repo.id = 1000
+    fragments = []
+    for url in ('/repo/regular/repo1', '/user/regular'):
+        with app.test_request_context(url):
+            fragments.append(core.cached_fragment(
+                repo, ('fragment', 0), lambda: flask.request.endpoint
+            ))
+    assert fragments == ['core.repo_detail', 'core.user_detail']
+    app.container.get('fragment_cache').invalidate('Repository:1000')
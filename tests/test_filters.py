@@ -29,6 +29,11 @@ def test_ext_link():
     assert ext_link(None) == ''
 
 
+def test_timestamp():
+    assert timestamp(0) == '1970-01-01 00:00:00 UTC'
+    assert timestamp(1500000000.5) == '2017-07-14 02:40:00 UTC'
+
+
 # @see http://getbootstrap.com/components/#alerts
 @pytest.mark.parametrize(
     ['category', 'css_class'],
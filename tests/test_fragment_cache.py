@@ -0,0 +1,60 @@
+import pytest
+import time
+
+from repocribro.fragment_cache import FragmentCache, InMemoryFragmentCache, \
+    FileSystemFragmentCache, SQLiteFragmentCache, make_fragment_cache
+
+
+@pytest.fixture(params=['memory', 'fs', 'sqlite'])
+def fragment_cache(request, tmpdir):
+    if request.param == 'memory':
+        return InMemoryFragmentCache(size=10, ttl=0)
+    if request.param == 'fs':
+        return FileSystemFragmentCache(str(tmpdir.join('fragments')), ttl=0)
+    return SQLiteFragmentCache(str(tmpdir.join('fragments.db')), ttl=0)
+
+
+def test_fragment_cache(fragment_cache):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return '<p>Fragment</p>'
+
+    key = ('template.html', 1, 0)
+    assert fragment_cache.fetch('Repository:1', key, render) == \
+        '<p>Fragment</p>'
+    assert fragment_cache.fetch('Repository:1', key, render) == \
+        '<p>Fragment</p>'
+    assert len(calls) == 1
+
+    fragment_cache.set('Repository:2', key, 'Other')
+    fragment_cache.invalidate('Repository:1')
+    assert fragment_cache.get('Repository:1', key) is None
+    assert fragment_cache.get('Repository:2', key) == 'Other'
+    fragment_cache.clear()
+    assert fragment_cache.get('Repository:2', key) is None
+
+
+def test_fragment_cache_lru_ttl():
+    cache = InMemoryFragmentCache(size=2, ttl=0)
+    cache.set('s', ('a',), 'A')
+    cache.set('s', ('b',), 'B')
+    cache.get('s', ('a',))
+    cache.set('s', ('c',), 'C')
+    assert cache.get('s', ('b',)) is None
+    assert cache.get('s', ('a',)) == 'A'
+
+    cache = InMemoryFragmentCache(size=2, ttl=1)
+    cache.set('s', ('a',), 'A')
+    cache.entries[('s', ('a',))] = (time.monotonic() - 1, 'A')
+    assert cache.get('s', ('a',)) is None
+
+
+def test_make_fragment_cache(tmpdir):
+    assert type(make_fragment_cache('none')) is FragmentCache
+    assert isinstance(make_fragment_cache('memory'), InMemoryFragmentCache)
+    assert isinstance(make_fragment_cache('fs:' + str(tmpdir)),
+                      FileSystemFragmentCache)
+    with pytest.raises(ValueError):
+        make_fragment_cache('redis://localhost')
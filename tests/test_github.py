@@ -1,5 +1,8 @@
+import json
 import pytest
 
+from repocribro.github import GitHubResponse
+
 REPOSITORY = 'MarekSuchanek/pyplayground'
 NOT_REPOSITORY = 'MarekSuchanek/pyplaygroundzzzz7'
 
@@ -94,3 +97,283 @@ def test_get_webhook_unverify(github_api, payload):
     assert not github_api.webhook_verify_signature(
         payload.encode('utf-8'), sig
     )
+
+
+class ConditionalSession:
+    """Fake requests session answering conditional requests"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers=None):
+        import requests
+        self.requests.append(headers or {})
+        response = requests.Response()
+        response.url = url
+        if (headers or {}).get('If-None-Match') == '"v1"':
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response.headers['ETag'] = '"v1"'
+            response._content = b'{"login": "octocat"}'
+        return response
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_get_conditional_cache(backend, tmpdir):
+    from repocribro.github import GitHubAPI, make_response_cache
+    if backend == 'sqlite':
+        backend = 'sqlite:' + str(tmpdir.join('gh_cache.db'))
+    cache = make_response_cache(backend, 10)
+    session = ConditionalSession()
+    api = GitHubAPI('id', 'secret', 'whs', session=session,
+                    token='t1', cache=cache)
+
+    res = api.get('/user')
+    assert res.is_ok and not res.from_cache
+    assert 'If-None-Match' not in session.requests[-1]
+    res = api.get('/user')
+    assert session.requests[-1]['If-None-Match'] == '"v1"'
+    assert res.is_ok and res.from_cache
+    assert res.data['login'] == 'octocat'
+
+    other = GitHubAPI('id', 'secret', 'whs', session=session,
+                      token='t2', cache=cache)
+    assert not other.get('/user').from_cache
+
+
+@pytest.mark.parametrize('backend', ['memory', 'none'])
+def test_get_url_known_etag(backend):
+    from repocribro.github import GitHubAPI, make_response_cache
+    session = ConditionalSession()
+    api = GitHubAPI('id', 'secret', 'whs', session=session, token='t1',
+                    cache=make_response_cache(backend, 10))
+    url = api.API_URL + '/user'
+
+    res = api.get_url(url, etag='"v0"')
+    assert res.is_ok and not res.not_modified
+    res = api.get_url(url, etag='"v1"')
+    assert session.requests[-1]['If-None-Match'] == '"v1"'
+    assert res.not_modified and res.from_cache
+    assert not res.is_ok
+
+
+def test_response_cache_lru():
+    from repocribro.github import InMemoryCache, make_response_cache
+    cache = InMemoryCache(2)
+    cache.set('a', {'etag': 'a'})
+    cache.set('b', {'etag': 'b'})
+    cache.get('a')
+    cache.set('c', {'etag': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'etag': 'a'}
+    assert make_response_cache('none') is None
+    with pytest.raises(ValueError):
+        make_response_cache('nosuchbackend')
+
+
+class PaginatedSession:
+    """Fake requests session serving numbered pages"""
+
+    PAGES = 3
+
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, headers=None):
+        import requests
+        self.urls.append(url)
+        page = GitHubResponse.parse_page_number(url)
+        response = requests.Response()
+        response.url = url
+        response.status_code = 200
+        response._content = json.dumps(
+            [page * 10 + i for i in range(2)]
+        ).encode('utf-8')
+        if page < self.PAGES:
+            response.headers['Link'] = \
+                '<https://api.github.com/items?page={}>; rel="next"'.format(
+                    page + 1
+                )
+        return response
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+def test_iter_items(prefetch):
+    from repocribro.github import GitHubAPI
+    session = PaginatedSession()
+    api = GitHubAPI('id', 'secret', 'whs', session=session)
+    items = list(api.iter_items('/items', per_page=2, prefetch=prefetch))
+    assert items == [10, 11, 20, 21, 30, 31]
+    assert 'per_page=2' in session.urls[0]
+    assert len(session.urls) == 3
+
+
+def test_iter_pages_stop():
+    from repocribro.github import GitHubAPI
+    session = PaginatedSession()
+    api = GitHubAPI('id', 'secret', 'whs', session=session)
+    pages = api.iter_pages('/items')
+    assert next(pages).actual_page == 1
+    pages.close()
+    assert len(session.urls) == 1
+
+
+@pytest.fixture
+def fake_github_server():
+    """Local fake GitHub server answering with scripted responses"""
+    import http.server
+    import threading
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        script = []
+        paths = []
+
+        def do_GET(self):
+            self.paths.append(self.path)
+            status, headers = self.script.pop(0) if self.script \
+                else (200, {})
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"message": "ok"}')
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = 'http://127.0.0.1:{}'.format(server.server_port)
+    server.handler = Handler
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_limited_api(server, **kwargs):
+    from repocribro.github import GitHubAPI, RateLimiter
+    sleeps = []
+    limiter = RateLimiter(sleep=sleeps.append, **kwargs)
+    api = GitHubAPI('id', 'secret', 'whs', token='t', rate_limiter=limiter)
+    api.API_URL = server.url
+    return api, sleeps
+
+
+def test_rate_limit_secondary_backoff(fake_github_server):
+    fake_github_server.handler.script = [
+        (403, {'Retry-After': '7'}),
+        (502, {}),
+        (200, {'X-RateLimit-Remaining': '4999',
+               'X-RateLimit-Limit': '5000',
+               'X-RateLimit-Reset': '4102444800'}),
+    ]
+    api, sleeps = make_limited_api(fake_github_server, backoff=0)
+    res = api.get('/user')
+    assert res.is_ok
+    assert len(fake_github_server.handler.paths) == 3
+    assert sleeps == [7.0]
+    state = list(api.rate_limiter.state().values())[0]
+    assert state['remaining'] == 4999
+    assert state['limit'] == 5000
+    assert state['queued'] == 0
+
+
+def test_rate_limit_gives_up(fake_github_server, monkeypatch):
+    monkeypatch.setattr('random.uniform', lambda a, b: 0.5)
+    fake_github_server.handler.script = [(503, {})] * 3 + [(403, {})]
+    api, sleeps = make_limited_api(fake_github_server, max_retries=2)
+    assert api.get('/user').response.status_code == 503
+    assert len(fake_github_server.handler.paths) == 3
+    assert api.get('/user').response.status_code == 403  # not rate limit
+    assert sleeps == [1.5, 2.5]
+
+
+def test_rate_limit_no_retry_of_post(fake_github_server):
+    fake_github_server.handler.script = [(502, {}), (201, {})]
+    api, sleeps = make_limited_api(fake_github_server, backoff=0)
+    assert api.webhook_create('regular/repo1', 'http://hook') is None
+    assert len(fake_github_server.handler.paths) == 1
+    assert sleeps == []
+
+
+def test_rate_limit_max_wait(app, fake_github_server):
+    from repocribro.github import RateLimitExceeded
+    fake_github_server.handler.script = [
+        (403, {'X-RateLimit-Remaining': '0',
+               'X-RateLimit-Limit': '5000',
+               'X-RateLimit-Reset': '4102444800'}),
+    ]
+    api, sleeps = make_limited_api(fake_github_server, max_wait=5.0)
+    with app.test_request_context('/'):
+        # limited response is returned instead of waiting for reset
+        assert api.get('/user').response.status_code == 403
+        with pytest.raises(RateLimitExceeded) as exc:
+            api.get('/user')
+        assert exc.value.delay > 5.0
+    assert sleeps == []
+    assert len(fake_github_server.handler.paths) == 1
+
+    # outside of request (CLI, background) it waits for the reset
+    fake_github_server.handler.script = [(200, {})]
+    assert api.get('/user').is_ok
+    assert len(sleeps) == 1 and sleeps[0] > 5.0
+
+
+def test_rate_limit_scopes_bounded():
+    from repocribro.github import RateLimiter
+    limiter = RateLimiter(max_scopes=2)
+    for key in ('a', 'b', 'a', 'c'):
+        limiter._reserve(key)
+    assert list(limiter.scopes) == ['a', 'c']
+
+
+def test_rate_limit_error_page(app_client):
+    res = app_client.get('/test/rate-limit')
+    assert res.status_code == 503
+    assert res.headers['Retry-After'] == '42'
+    assert 'Service Unavailable' in res.data.decode('utf-8')
+
+
+def test_rate_limit_pacing():
+    from repocribro.github import RateLimiter
+
+    class Response:
+        def __init__(self, remaining):
+            self.headers = {'X-RateLimit-Remaining': str(remaining),
+                            'X-RateLimit-Limit': '100',
+                            'X-RateLimit-Reset': '1010'}
+
+    limiter = RateLimiter(pace_below=0.2, clock=lambda: 1000.0)
+    limiter.update('k', Response(50))
+    assert limiter._reserve('k') == 0.0
+    limiter.update('k', Response(2))
+    assert limiter._reserve('k') == 0.0
+    assert limiter._reserve('k') == 5.0
+    assert limiter._reserve('k') == 10.0  # quota exhausted, wait for reset
+    assert limiter.state()['k']['remaining'] == 0
+
+
+def test_rate_budget_delay():
+    from repocribro.github import RateLimiter
+
+    class Response:
+        def __init__(self, remaining):
+            self.headers = {'X-RateLimit-Remaining': str(remaining),
+                            'X-RateLimit-Limit': '100',
+                            'X-RateLimit-Reset': '1010'}
+
+    limiter = RateLimiter(clock=lambda: 1000.0)
+    assert limiter.budget_delay('k', 0.5) == 0.0
+    limiter.update('k', Response(60))
+    assert limiter.budget_delay('k', 0.5) == 0.0
+    limiter.update('k', Response(50))
+    assert limiter.budget_delay('k', 0.5) == 10.0
+    assert limiter.budget_delay('k', 0.0) == 0.0
@@ -0,0 +1,85 @@
+import flask
+
+from repocribro.instrumentation import Instrumentation
+
+
+def test_instrumentation_disabled(app):
+    instrumentation = Instrumentation(enabled=False)
+    with app.app_context(), app.test_request_context('/nothing'):
+        with instrumentation.timed('db'):
+            pass
+        assert 'timings' not in flask.g
+    assert instrumentation.metrics == {}
+
+
+def test_instrumentation_record(app):
+    instrumentation = Instrumentation(enabled=True)
+    with app.app_context(), app.test_request_context('/nothing'):
+        instrumentation.record('db', 0.002)
+        instrumentation.record('db', 0.003)
+        instrumentation.record('hook', 0.001, 'view_core_user_tabs')
+        assert flask.g.timings['db'] == (2, 0.005)
+        header = instrumentation.server_timing(0.01)
+    assert header.startswith('db;dur=5.00;desc="SQL statements (2x)"')
+    assert 'github' not in header
+    assert header.endswith('total;dur=10.00')
+
+    metrics = instrumentation.prometheus()
+    assert '# TYPE repocribro_db_seconds summary' in metrics
+    assert 'repocribro_db_seconds_count{endpoint=""} 2' in metrics
+    assert 'repocribro_hook_seconds_count{endpoint="",' \
+           'name="view_core_user_tabs"} 1' in metrics
+
+
+def instrumentation_listeners(app):
+    engine = app.container.get('db').get_engine(app)
+    return [listener for listener
+            in engine.dispatch.after_cursor_execute
+            if listener.__module__ == 'repocribro.instrumentation']
+
+
+def test_instrumentation_off(filled_db_session, app, app_client):
+    assert not app.container.get('instrumentation').enabled
+    assert app.container.get('ext_master').instrumentation is None
+    assert instrumentation_listeners(app) == []
+    res = app_client.get('/user/regular')
+    assert res.status == '200 OK'
+    assert 'Server-Timing' not in res.headers
+    assert app_client.get('/metrics').status_code == 404
+
+
+def test_server_timing_header(filled_db_session, instrumented_app,
+                              instrumented_client):
+    assert len(instrumentation_listeners(instrumented_app)) == 1
+    res = instrumented_client.get('/user/regular')
+    assert res.status == '200 OK'
+    timing = res.headers['Server-Timing']
+    assert 'db;dur=' in timing
+    assert 'template;dur=' in timing
+    assert 'hook;dur=' in timing
+    assert 'total;dur=' in timing
+
+
+def test_metrics(filled_db_session, instrumented_client):
+    instrumented_client.get('/user/regular')
+    res = instrumented_client.get('/metrics')
+    assert res.status == '200 OK'
+    assert res.headers['Content-Type'].startswith('text/plain')
+    metrics = res.data.decode('utf-8')
+    assert 'repocribro_request_seconds_count{endpoint="core.user_detail",' \
+           'status="200"}' in metrics
+    assert 'repocribro_db_seconds_sum{endpoint="core.user_detail"}' in metrics
+
+
+def test_metrics_token(instrumented_app, instrumented_client):
+    config = instrumented_app.container.get('config')
+    config.set('repocribro-core', 'metrics_token', 'secret')
+    try:
+        assert instrumented_client.get('/metrics').status_code == 401
+        res = instrumented_client.get(
+            '/metrics', headers={'Authorization': 'Bearer secret'}
+        )
+        assert res.status_code == 200
+    finally:
+        config.remove_option('repocribro-core', 'metrics_token')
+
@@ -1,3 +1,6 @@
+import datetime
+import pytest
+
 from repocribro.models import *
 
 
@@ -142,11 +145,78 @@ def test_repo_push(session, github_data_loader):
     assert 'Push' in repr(push)
     assert str(push.commits[0].id) in repr(push.commits[0])
     assert 'Commit' in repr(push.commits[0])
-    before = datetime.datetime.now()
+    before = datetime.datetime.utcnow()
     repo.events_updated()
-    act = datetime.datetime.now()
+    act = datetime.datetime.utcnow()
     delta = act - before
-    assert (datetime.datetime.now() - repo.last_event) < delta
+    assert (datetime.datetime.utcnow() - repo.last_event) < delta
+
+
+def test_repo_push_bulk(filled_db_session, github_data_loader):
+    session = filled_db_session
+    push_data = github_data_loader('push')
+    sender_data = github_data_loader('sender')
+    repo = session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    assert len(repo.pushes) == 1
+    push_id = Push.bulk_create_from_dict(session, push_data, sender_data, repo)
+    session.commit()
+    assert len(repo.pushes) == 2
+
+    push = session.query(Push).get(push_id)
+    assert push.repository.id == repo.id
+    assert push.size == len(push_data['commits'])
+    assert len(push.commits) == 1
+    assert push.commits[0].sha == push_data['commits'][0]['sha']
+
+
+@pytest.mark.parametrize(('make_query', 'index'), [
+    (lambda q: q(Push).order_by(Push.timestamp.desc()), 'ix_Push_timestamp'),
+    (lambda q: q(Commit).filter_by(push_id=1), 'ix_Commit_push_id'),
+    (lambda q: q(Commit).filter_by(sha='abc'), 'ix_Commit_sha'),
+    (lambda q: q(Repository).filter_by(private=False), 'ix_Repository_private'),
+    (lambda q: q(Repository).filter_by(
+        visibility_type=Repository.VISIBILITY_PUBLIC
+    ), 'ix_Repository_visibility_type'),
+    (lambda q: q(Repository).filter_by(owner_id=1), 'ix_Repository_owner_id'),
+    (lambda q: q(Organization).filter(Organization.name.like('a%')),
+     'ix_RepositoryOwner_type'),
+])
+def test_query_plan_index(session, make_query, index):
+    details = query_plan(session, make_query(session.query))
+    assert 'USING INDEX {}'.format(index) in details
+
+
+def query_plan(session, db_query):
+    statement = db_query.statement.compile(
+        dialect=session.bind.dialect,
+        compile_kwargs={'literal_binds': True}
+    )
+    plan = session.execute('EXPLAIN QUERY PLAN {}'.format(statement))
+    return ' '.join(row[-1] for row in plan)
+
+
+@pytest.mark.parametrize(('model', 'keys', 'last', 'index'), [
+    (Push, ['timestamp', 'id'],
+     {'timestamp': datetime.datetime(2017, 3, 4, 21, 8, 12), 'id': 42},
+     'ix_Push_repository_id_timestamp'),
+    (Release, ['published_key', 'id'],
+     {'published_key': '2017-03-04T21:08:12Z', 'id': 42},
+     'ix_Release_repository_id_published_key'),
+])
+def test_query_plan_keyset(session, model, keys, last, index):
+    import collections
+    from repocribro.extending.helpers import KeysetPagination
+    keys = [getattr(model, key) for key in keys]
+    item = collections.namedtuple('Item', list(last))(**last)
+    for cursor in (None, KeysetPagination.encode(keys, item)):
+        db_query = KeysetPagination.seek(
+            session.query(model).filter_by(repository_id=1), keys, cursor
+        ).limit(21)
+        details = query_plan(session, db_query)
+        assert 'USING INDEX {}'.format(index) in details
+        assert 'TEMP B-TREE' not in details
 
 
 def test_role_mixin():
@@ -165,6 +235,22 @@ def test_role_mixin():
     assert 'Role' in repr(roleA)
 
 
+def test_role_permits():
+    role = Role('user', 'search:logout:manage*:browse_?epo', '')
+    assert role.permits('search')
+    assert role.permits('manage_repo')
+    assert role.permits('browse_repo')
+    assert not role.permits('browse')
+    assert not role.permits('searching')
+    assert not role.permits('admin')
+    matcher = role.privileges_matcher
+    assert role.privileges_matcher is matcher
+    role.privileges = 'admin*'
+    assert role.permits('admin_index')
+    assert not role.permits('search')
+    assert role.privileges_matcher is not matcher
+
+
 def test_anonymous():
     anonym = Anonymous()
     assert not anonym.has_role('admin')
@@ -222,3 +308,53 @@ def test_user_mixin():
     assert account.sees_repo(repo)
     repo.visibility_type = Repository.VISIBILITY_HIDDEN
     assert account.sees_repo(repo)
+
+
+def test_webhook_delivery(empty_db_session):
+    import datetime
+    assert WebhookDelivery.register(empty_db_session, 'abc', 'push')
+    assert not WebhookDelivery.register(empty_db_session, 'abc', 'push')
+    assert WebhookDelivery.register(empty_db_session, '', 'push')
+    empty_db_session.add(WebhookDelivery(
+        'old', 'push',
+        datetime.datetime.utcnow() - datetime.timedelta(days=10)
+    ))
+    empty_db_session.commit()
+    assert WebhookDelivery.prune(empty_db_session, 7) == 1
+    assert empty_db_session.query(WebhookDelivery).count() == 1
+
+
+def test_repository_sync_state(filled_db_session):
+    import datetime
+    session = filled_db_session
+    repo = session.query(Repository).filter_by(
+        full_name='regular/repo1'
+    ).first()
+    revision = repo.revision
+    state = RepositorySyncState.of(session, repo)
+    assert state.event_id is None
+    assert not state.metadata_fresh(3600)
+
+    event_at = datetime.datetime(2017, 3, 4, 21, 8, 12)
+    state.advance(118818, event_at, '"abc"')
+    state.metadata_at = datetime.datetime.utcnow()
+    session.commit()
+    assert RepositorySyncState.of(session, repo) is state
+    assert repo.sync_state.event_id == '118818'
+    assert state.event_at == event_at
+    assert state.events_etag == '"abc"'
+    assert state.metadata_fresh(3600)
+    assert not state.metadata_fresh(0)
+    assert not state.metadata_fresh(
+        3600, datetime.datetime.utcnow() + datetime.timedelta(hours=2)
+    )
+    assert repo.revision == revision
+
+    state.advance(etag='"def"')
+    assert state.event_id == '118818'
+    assert state.events_etag == '"def"'
+    assert '118818' in repr(state)
+
+    session.delete(repo)
+    session.commit()
+    assert session.query(RepositorySyncState).count() == 0
@@ -0,0 +1,243 @@
+import pytest
+
+from repocribro.models import Repository, SearchableMixin, User
+from repocribro.search import InvertedIndex, SearchResultsCache, \
+    make_search_backend, tokenize
+
+
+def test_tokenize():
+    assert tokenize('Hello, World! repo_1') == ['hello', 'world', 'repo_1']
+    assert tokenize(None) == []
+
+
+def test_inverted_index():
+    index = InvertedIndex()
+    index.add(1, 'python testing python')
+    index.add(2, 'python haskell')
+    index.add(3, 'haskell')
+    assert index.search(['python']) == [1, 2]
+    assert index.search(['python', 'has'], limit=1) == [2]
+    assert index.search(['has'], limit=1) == [2]
+    assert index.search(['py', 'has']) == [2]
+    assert index.search(['java']) == []
+    index.remove(1)
+    assert index.search(['python']) == [2]
+    index.add(2, 'java')
+    assert index.search(['python']) == []
+    assert index.search(['haskell']) == [3]
+
+
+def test_make_search_backend():
+    assert make_search_backend('auto', 'sqlite://').NAME in ('fts5', 'memory')
+    assert make_search_backend('auto', 'mysql://u@h/d').NAME == 'mysql'
+    assert make_search_backend('auto', 'postgresql://u@h/d').NAME == \
+        'postgresql'
+    assert make_search_backend('memory', 'sqlite://').NAME == 'memory'
+    with pytest.raises(ValueError):
+        make_search_backend('elastic', 'sqlite://')
+
+
+@pytest.fixture(params=['like', 'memory', 'fts5'])
+def search_backend(request, app):
+    original = SearchableMixin.search_backend
+    backend = make_search_backend(request.param, 'sqlite://')
+    SearchableMixin.search_backend = backend
+
+    def teardown():
+        SearchableMixin.search_backend = original
+
+    request.addfinalizer(teardown)
+    return backend
+
+
+def search(session, model, query):
+    return [obj.id for obj in model.fulltext_query(
+        query, session.query(model)
+    ).all()]
+
+
+def test_search_backend(filled_db_session, search_backend):
+    session = filled_db_session
+    connection = session.connection(clause=Repository.__table__)
+    assert search_backend.reindex(connection, Repository) == 3
+    assert search_backend.reindex(connection, User) == 3
+
+    repo3 = session.query(Repository).filter_by(name='repo3').first()
+    assert search(session, Repository, 'haskell') == [repo3.id]
+    assert len(search(session, Repository, 'regular')) == 3
+    assert search(session, Repository, 'nothing') == []
+    assert len(search(session, User, 'Mister')) == 3
+    assert search(session, User, 'awesome') == []
+
+
+def test_search_incremental(filled_db_session, search_backend):
+    session = filled_db_session
+    connection = session.connection(clause=Repository.__table__)
+    search_backend.reindex(connection, Repository)
+    user = session.query(User).filter_by(login='regular').first()
+
+    repo = Repository(103, None, 'regular/search', 'search', 'Rust', '',
+                      'Fulltext engine', '', False, None, user,
+                      Repository.VISIBILITY_PUBLIC)
+    session.add(repo)
+    session.commit()
+    assert search(session, Repository, 'fulltext') == [repo.id]
+
+    repo.description = 'Inverted index'
+    session.commit()
+    assert search(session, Repository, 'fulltext') == []
+    assert search(session, Repository, 'inverted') == [repo.id]
+
+    session.delete(repo)
+    session.commit()
+    assert search(session, Repository, 'inverted') == []
+
+
+def test_search_rollback(filled_db_session, search_backend):
+    session = filled_db_session
+    connection = session.connection(clause=Repository.__table__)
+    search_backend.reindex(connection, Repository)
+    session.commit()
+    user = session.query(User).filter_by(login='regular').first()
+    repo3 = session.query(Repository).filter_by(name='repo3').first()
+
+    repo3.description = 'Rolled back'
+    session.add(Repository(103, None, 'regular/search', 'search', 'Rust', '',
+                           'Rolled back', '', False, None, user,
+                           Repository.VISIBILITY_PUBLIC))
+    session.flush()
+    assert len(search(session, Repository, 'rolled')) == 2
+    session.rollback()
+    assert search(session, Repository, 'rolled') == []
+    assert search(session, Repository, 'haskell') == [repo3.id]
+
+
+def test_search_setup_failure(filled_db_session):
+    from repocribro.search import InvertedIndexBackend
+
+    class BrokenBackend(InvertedIndexBackend):
+        fail = True
+
+        def setup(self, connection, model):
+            if self.fail:
+                raise RuntimeError('setup failed')
+            return super().setup(connection, model)
+
+    backend = BrokenBackend()
+    connection = filled_db_session.connection(clause=Repository.__table__)
+    with pytest.raises(RuntimeError):
+        backend.ensure(connection, Repository)
+    assert 'Repository' not in backend.ready
+    backend.fail = False
+    assert backend.ensure(connection, Repository)
+    assert 'Repository' in backend.ready
+    assert len(backend.indexes['Repository'].rows) == 3
+
+
+def test_search_managed_unverified(filled_db_session):
+    from repocribro.search import PostgreSQLBackend
+
+    class MissingIndexBackend(PostgreSQLBackend):
+        verified = 0
+
+        def verify(self, connection, model):
+            self.verified += 1
+            return False
+
+        def setup(self, connection, model):
+            raise AssertionError('DDL at first use')
+
+    backend = MissingIndexBackend()
+    session = filled_db_session
+    for _ in range(3):
+        query = backend.filter_query(Repository, session.query(Repository),
+                                     'haskell')
+        assert [repo.name for repo in query] == ['repo3']
+    assert 'Repository' not in backend.ready
+    assert backend.verified == 1
+
+
+def test_search_fts5_no_ddl(filled_db_session):
+    from repocribro.search import SQLiteFTS5Backend, sqlite_has_fts5
+    if not sqlite_has_fts5():
+        pytest.skip('SQLite without FTS5')
+    class FreshBackend(SQLiteFTS5Backend):
+        @staticmethod
+        def table_name(model):
+            return '{}_fts_fresh'.format(model.__name__)
+
+    backend = FreshBackend()
+    session = filled_db_session
+    original = SearchableMixin.search_backend
+    SearchableMixin.search_backend = backend
+    try:
+        user = session.query(User).filter_by(login='regular').first()
+        session.add(Repository(103, None, 'regular/search', 'search', 'Rust',
+                               '', 'Fulltext engine', '', False, None, user,
+                               Repository.VISIBILITY_PUBLIC))
+        session.commit()
+        connection = session.connection(clause=Repository.__table__)
+        assert not backend.verify(connection, Repository)
+        assert 'Repository' in backend.missing
+        assert len(search(session, Repository, 'fulltext')) == 1
+
+        assert backend.reindex(connection, Repository) == 4
+        assert 'Repository' not in backend.missing
+        assert len(search(session, Repository, 'fulltext')) == 1
+    finally:
+        SearchableMixin.search_backend = original
+
+
+def test_search_max_results(filled_db_session, caplog):
+    from repocribro.search import InvertedIndexBackend
+    backend = InvertedIndexBackend(max_results=2)
+    session = filled_db_session
+    query = backend.filter_query(Repository, session.query(Repository),
+                                 'regular')
+    assert query.count() == 2
+    assert 'more than 2 results' in caplog.text
+
+    caplog.clear()
+    query = backend.filter_query(Repository, session.query(Repository),
+                                 'haskell')
+    assert query.count() == 1
+    assert caplog.text == ''
+
+    backend.max_results = None
+    query = backend.filter_query(Repository, session.query(Repository),
+                                 'regular')
+    assert query.count() == 3
+
+
+def test_search_relevance(filled_db_session, search_backend):
+    if search_backend.NAME == 'like':
+        pytest.skip('LIKE search does not rank results')
+    session = filled_db_session
+    connection = session.connection(clause=Repository.__table__)
+    search_backend.reindex(connection, Repository)
+    user = session.query(User).filter_by(login='regular').first()
+    repo_a = Repository(103, None, 'regular/a', 'a', 'Rust', '',
+                        'Search with search index', '', False, None, user,
+                        Repository.VISIBILITY_PUBLIC)
+    repo_b = Repository(104, None, 'regular/b', 'b', 'Rust', '',
+                        'Search', '', False, None, user,
+                        Repository.VISIBILITY_PUBLIC)
+    session.add(repo_b)
+    session.add(repo_a)
+    session.commit()
+    assert search(session, Repository, 'search') == [repo_a.id, repo_b.id]
+
+
+def test_search_results_cache():
+    cache = SearchResultsCache(size=2, ttl=0)
+    generation = cache.generation
+    cache.set('a', 1, generation)
+    cache.set('b', 2, generation)
+    assert cache.get('a') == 1
+    cache.set('c', 3, generation)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    cache.invalidate()
+    assert cache.get('a') is None
+    cache.set('a', 1, generation)
+    assert cache.get('a') is None
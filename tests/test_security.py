@@ -1,9 +1,10 @@
 import flask_login
+import flask_principal
 import pytest
 from werkzeug.exceptions import Forbidden
 
 
-from repocribro.security import login, logout, permissions
+from repocribro.security import AccountCache, login, logout, permissions
 from repocribro.models import UserAccount, Role
 
 
@@ -36,3 +37,90 @@ def test_permission_admin(app, empty_db_session):
         empty_db_session.add(account)
         empty_db_session.commit()
         login(account)
+
+
+def test_resolve_privileges():
+    roles = [Role('a', 'search:browse*', ''), Role('b', 'manage_repo', '')]
+    privileges = permissions.resolve_privileges(roles)
+    assert {'search', 'browse', 'browse_repo', 'manage_repo'} <= privileges
+    assert 'manage_repos' not in privileges
+    assert 'login' not in privileges
+    assert permissions.resolve_privileges(list(reversed(roles))) is \
+        privileges
+
+    roles[1].privileges = 'manage*'
+    assert 'manage_repos' in permissions.resolve_privileges(roles)
+
+    permissions.register_action('browse_test_action')
+    try:
+        assert 'browse_test_action' in permissions.resolve_privileges(roles)
+    finally:
+        del permissions.actions.x_dict['browse_test_action']
+        permissions.version += 1
+
+
+def test_account_cache():
+    cache = AccountCache(size=2, ttl=30)
+    roles = [Role('a', 'search', ''), Role('b', 'browse*', '')]
+    roles[0].id, roles[1].id = 1, 2
+    accounts = []
+    for account_id, account_roles in ((10, roles), (11, roles[:1]),
+                                      (12, roles[1:])):
+        account = UserAccount()
+        account.id = account_id
+        account.active = True
+        account.roles.extend(account_roles)
+        accounts.append(account)
+
+    entry = cache.store(accounts[0])
+    assert entry.active
+    assert entry.role_ids == {1, 2}
+    assert entry.rolenames == ('a', 'b')
+    assert {'search', 'browse_repo'} <= entry.privileges
+    assert cache.get(10) is entry
+    cache.store(accounts[1])
+    cache.store(accounts[2])
+    assert cache.get(10) is None
+    cache.invalidate_role(1)
+    assert cache.get(11) is None
+    assert cache.get(12) is not None
+    cache.invalidate(12)
+    assert cache.get(12) is None
+
+    cache = AccountCache(size=10, ttl=-1)
+    cache.store(accounts[0])
+    assert cache.get(10) is None
+
+
+def test_permissions_interned_late_registration(app):
+    permission = permissions.actions.late_test_action
+    assert permissions.actions.late_test_action is permission
+    assert 'late_test_action' not in permissions.all_actions
+
+    identity = flask_principal.Identity(1)
+    assert not permission.allows(identity)
+    permissions.register_action('late_test_action')
+    try:
+        roles = [Role('late', 'late_*', '')]
+        for action in permissions.resolve_privileges(roles):
+            identity.provides.add(flask_principal.ActionNeed(action))
+        assert permission.allows(identity)
+    finally:
+        del permissions.actions.x_dict['late_test_action']
+        permissions.version += 1
+
+
+def test_permissions_bulk_check(app):
+    identity = flask_principal.Identity(1)
+    identity.provides.add(flask_principal.ActionNeed('search'))
+    identity.provides.add(flask_principal.RoleNeed('user'))
+    assert permissions.any_action('manage_repos', 'search',
+                                  identity=identity)
+    assert not permissions.any_action('manage_repos', 'login',
+                                      identity=identity)
+    assert permissions.allowed_actions('search', 'login',
+                                       identity=identity) == {'search'}
+    assert permissions.any_role('admin', 'user', identity=identity)
+    assert not permissions.any_role('admin', identity=identity)
+    with app.app_context(), app.test_request_context('/'):
+        assert not permissions.any_action('search')